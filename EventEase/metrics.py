@@ -0,0 +1,217 @@
+"""Per-request performance metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware times each request and, through the command listener in
+db_connection, counts the MongoDB commands it issued and the time spent in
+them. Totals live in this process only; with several workers, scrape each
+one (or aggregate them in Prometheus).
+"""
+import bisect
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from authentication.middleware import token_cache
+from db_connection import CommandTally, command_stats, current_tally
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': False,
+    'TOKEN': None,
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'COMMAND_BUCKETS': (0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+    'BYTES_BUCKETS': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+class Histogram:
+    """Cumulative histogram per label set, in Prometheus' le-bucket layout."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{format_labels(labels)} {value}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in pairs)
+    return '{' + body + '}'
+
+
+class Registry:
+    def __init__(self, config):
+        self.requests = Counter('eventease_requests_total', 'Requests served, by view, method and status.')
+        self.latency = Histogram('eventease_request_duration_seconds', 'Wall time of each request.',
+                                 config['LATENCY_BUCKETS'])
+        self.commands = Histogram('eventease_request_mongo_commands', 'MongoDB commands issued per request.',
+                                  config['COMMAND_BUCKETS'])
+        self.mongo_time = Histogram('eventease_request_mongo_seconds', 'Time spent in MongoDB commands per request.',
+                                    config['LATENCY_BUCKETS'])
+        self.response_bytes = Histogram('eventease_response_bytes', 'Size of each non-streaming response body.',
+                                        config['BYTES_BUCKETS'])
+
+    def record(self, view, method, status, seconds, tally, size):
+        labels = (('view', view), ('method', method))
+        self.requests.inc(labels + (('status', status),))
+        self.latency.observe(labels, seconds)
+        self.commands.observe(labels, tally.count)
+        self.mongo_time.observe(labels, tally.seconds)
+        if size is not None:
+            self.response_bytes.observe(labels, size)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.commands, self.mongo_time, self.response_bytes):
+            lines.extend(metric.render())
+        commands = sorted(command_stats.snapshot().items())
+        for index, (name, help) in enumerate((
+            ('eventease_mongo_commands_total', 'MongoDB commands by name, across all requests.'),
+            ('eventease_mongo_command_failures_total', 'Failed MongoDB commands by name.'),
+            ('eventease_mongo_command_seconds_total', 'Time spent in MongoDB commands by name.'),
+        )):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} counter')
+            for command, values in commands:
+                lines.append(f"{name}{format_labels((('command', command),))} {values[index]}")
+        jwt = token_cache.stats()
+        for name, type, help, value in (
+            ('eventease_jwt_cache_entries', 'gauge', 'Verified tokens held in the JWT cache.', jwt['entries']),
+            ('eventease_jwt_cache_hits_total', 'counter', 'Tokens served from the JWT cache.', jwt['hits']),
+            ('eventease_jwt_cache_hit_seconds_total', 'counter', 'Time spent serving JWT cache hits.',
+             jwt['hit_seconds']),
+            ('eventease_jwt_decodes_total', 'counter', 'Tokens verified by a full JWT decode.', jwt['decodes']),
+            ('eventease_jwt_decode_seconds_total', 'counter', 'Time spent in full JWT decodes.',
+             jwt['decode_seconds']),
+        ):
+            lines.extend((f'# HELP {name} {help}', f'# TYPE {name} {type}', f'{name} {value}'))
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in (self.requests, self.latency, self.commands, self.mongo_time, self.response_bytes):
+            metric.clear()
+        command_stats.reset()
+
+
+registry = Registry(get_config())
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Record timing, MongoDB round trips and response size for every request.
+
+    With METRICS['SERVER_TIMING'] on, the same numbers are also returned in a
+    Server-Timing header for browser dev tools.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_config()
+        self.enabled = config['ENABLED']
+        self.server_timing = config['SERVER_TIMING']
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        tally = CommandTally()
+        token = current_tally.set(tally)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_tally.reset(token)
+        return self.finish(request, response, start, tally)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        tally = CommandTally()
+        token = current_tally.set(tally)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_tally.reset(token)
+        return self.finish(request, response, start, tally)
+
+    def finish(self, request, response, start, tally):
+        seconds = time.perf_counter() - start
+        size = None if response.streaming else len(response.content)
+        registry.record(view_name(request), request.method, response.status_code, seconds, tally, size)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'mongo;dur={tally.seconds * 1000:.3f};desc="{tally.count} commands", '
+                f'total;dur={seconds * 1000:.3f}'
+            )
+        return response
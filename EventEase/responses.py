@@ -0,0 +1,67 @@
+"""JSON responses that understand BSON types.
+
+Views hand documents straight from pymongo/Motor to JsonResponse; ObjectId
+and Decimal128 become strings, datetimes ISO 8601. Encoding uses orjson when
+it is installed and the standard library otherwise. Both produce the same
+compact output, so clients cannot tell which one served them.
+"""
+import datetime
+import decimal
+import json
+
+from bson import Decimal128, ObjectId
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+class BSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, Decimal128):
+            return str(o.to_decimal())
+        # Keep full precision, as orjson does; DjangoJSONEncoder truncates to
+        # milliseconds.
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _orjson_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def dumps_stdlib(data):
+    return json.dumps(data, cls=BSONEncoder, separators=(',', ':')).encode()
+
+
+def dumps_orjson(data):
+    try:
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # Integers beyond 64 bits and other values orjson refuses.
+        return dumps_stdlib(data)
+
+
+dumps = dumps_orjson if orjson is not None else dumps_stdlib
+
+
+class JsonResponse(HttpResponse):
+    """Drop-in for django.http.JsonResponse that encodes with dumps()."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +53,9 @@ MIDDLEWARE = [
     # 'django.contrib.auth.middleware.AuthenticationMiddleware',
     # 'django.contrib.messages.middleware.MessageMiddleware',
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # First, so its timings cover the rest of the stack.
+    'EventEase.metrics.MetricsMiddleware',
+    'authentication.middleware.JWTAuthenticationMiddleware',
 ]
 
 ROOT_URLCONF = 'EventEase.urls'
@@ -84,6 +90,66 @@ WSGI_APPLICATION = 'EventEase.wsgi.application'
 # }
 
 
+# JWT authentication
+# Tokens issued by signin and verified by JWTAuthenticationMiddleware.
+
+JWT_SECRET_KEY = os.getenv('SECRET_KEY')
+
+JWT_ALGORITHM = os.getenv('SECRET_ALGORITHM')
+
+# Number of verified tokens kept so repeat requests skip signature checks.
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 4096))
+
+# Password hashing for signup/signin runs in a process pool of WORKERS
+# (0 hashes inline on the request thread). At most MAX_PENDING jobs may wait;
+# further requests get a 503. TIMEOUT is in seconds. ITERATIONS overrides the
+# PBKDF2 work factor (None keeps Django's default).
+PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv('PASSWORD_HASHING_WORKERS', 2)),
+    'MAX_PENDING': int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 32)),
+    'TIMEOUT': 10,
+    'ITERATIONS': int(os.getenv('PASSWORD_HASH_ITERATIONS', 0)) or None,
+}
+
+PASSWORD_HASHERS = [
+    'authentication.hashing.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Token buckets checked before any password work in signin/signup: BURST
+# attempts at once, refilled at PER_MINUTE, per email and per client IP.
+AUTH_RATE_LIMIT = {
+    'ENABLED': os.getenv('AUTH_RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    'EMAIL_BURST': 5,
+    'EMAIL_PER_MINUTE': 5,
+    'IP_BURST': int(os.getenv('AUTH_RATE_LIMIT_IP_BURST', 20)),
+    'IP_PER_MINUTE': int(os.getenv('AUTH_RATE_LIMIT_IP_PER_MINUTE', 60)),
+    'MAX_KEYS': 100000,
+}
+
+
+# MongoDB
+# Options for the shared MongoClient in db_connection.py. The client connects
+# on first use and is recreated in each forked worker.
+
+MONGO = {
+    'URI': os.getenv('DB_URI'),
+    'NAME': os.getenv('DB_NAME', 'event_management_system'),
+    'MAX_POOL_SIZE': int(os.getenv('MONGO_MAX_POOL_SIZE', 100)),
+    'MIN_POOL_SIZE': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+    'MAX_IDLE_TIME_MS': None,
+    'CONNECT_TIMEOUT_MS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'SERVER_SELECTION_TIMEOUT_MS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'SOCKET_TIMEOUT_MS': None,
+    'WAIT_QUEUE_TIMEOUT_MS': None,
+    'READ_PREFERENCE': os.getenv('MONGO_READ_PREFERENCE', 'primary'),  # e.g. 'secondaryPreferred'
+    'WRITE_CONCERN': {},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -124,3 +190,100 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Event listing
+# Page sizes for the keyset-paginated upcoming/past listing in display_events.
+
+EVENTS_PAGE_SIZE = int(os.getenv('EVENTS_PAGE_SIZE', 20))
+
+EVENTS_MAX_PAGE_SIZE = int(os.getenv('EVENTS_MAX_PAGE_SIZE', 100))
+
+# Documents fetched per cursor batch by the streaming events/export/ endpoint.
+EVENTS_EXPORT_BATCH_SIZE = int(os.getenv('EVENTS_EXPORT_BATCH_SIZE', 500))
+
+# Also create the MongoDB indexes the views rely on, in a background thread,
+# when the app starts. Off by default: deploys run `manage.py ensure_indexes`.
+MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'false').lower() == 'true'
+
+# Read-through cache in front of display_events. BACKEND is 'lru' for an
+# in-process LRU, or 'django' to use the CACHES alias named by ALIAS (e.g. a
+# locmem or file cache shared by several workers). TIMEOUT is in seconds.
+EVENTS_CACHE = {
+    'ENABLED': os.getenv('EVENTS_CACHE_ENABLED', 'true').lower() == 'true',
+    'BACKEND': os.getenv('EVENTS_CACHE_BACKEND', 'lru'),
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 30,
+}
+
+# Upper bound on the number of approvals one adminApproval/bulk/ call decides.
+ADMIN_BULK_APPROVAL_MAX_ITEMS = 500
+
+# Registrations that arrive once an event is at capacity join a FIFO waitlist
+# and are promoted as seats are cancelled. When false they are refused (409).
+EVENTS_WAITLIST_ENABLED = os.getenv('EVENTS_WAITLIST_ENABLED', 'true').lower() == 'true'
+
+# events/search/ pages by offset over relevance-ranked results; this caps how
+# deep a client can page so $skip stays cheap.
+EVENTS_SEARCH_MAX_RESULTS = int(os.getenv('EVENTS_SEARCH_MAX_RESULTS', 1000))
+
+# Request metrics served at /metrics/ in the Prometheus text format. With
+# SERVER_TIMING on, responses also carry a Server-Timing header. Scrapers send
+# TOKEN as a bearer token; without one, /metrics/ is only served when DEBUG is on.
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+    'SERVER_TIMING': os.getenv('METRICS_SERVER_TIMING', 'false').lower() == 'true',
+    'TOKEN': os.getenv('METRICS_TOKEN') or None,
+}
+
+# Server-Sent Events feed at async/live/. MODE is 'auto' (a change stream when
+# the deployment supports one), 'change_stream' or 'poll'. Polling rescans all
+# events every POLL_INTERVAL seconds, so 'auto' only falls back to it under
+# DEBUG or mongomock://; set 'poll' to force it.
+# QUEUE_SIZE bounds each client's backlog and REPLAY_SIZE the history kept for
+# Last-Event-ID resumes; HEARTBEAT is in seconds.
+EVENTS_LIVE = {
+    'MODE': os.getenv('EVENTS_LIVE_MODE', 'auto'),
+    'POLL_INTERVAL': float(os.getenv('EVENTS_LIVE_POLL_INTERVAL', 2)),
+    'QUEUE_SIZE': 100,
+    'REPLAY_SIZE': 1000,
+    'HEARTBEAT': 15,
+}
+
+# Write-behind mode for userevent approval requests: submissions are journaled
+# under DIRECTORY and answered 202 with a tracking id, then inserted in batches
+# of BATCH_SIZE at least every FLUSH_INTERVAL seconds. Past MAX_PENDING queued
+# requests, submissions are written synchronously again. FSYNC makes each
+# journal append survive power loss, not just a crashed worker.
+APPROVAL_QUEUE = {
+    'ENABLED': os.getenv('APPROVAL_QUEUE_ENABLED', 'false').lower() == 'true',
+    'DIRECTORY': os.getenv('APPROVAL_QUEUE_DIR') or BASE_DIR / 'var' / 'approval-queue',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_PENDING': 10000,
+    'FSYNC': os.getenv('APPROVAL_QUEUE_FSYNC', 'false').lower() == 'true',
+}
+
+# calendar/ serves per-day counts from event_day_buckets. Each bucket keeps
+# the TOP_EVENTS earliest events of its day; one request may span MAX_DAYS.
+# Run `manage.py rebuild_calendar` after changing TOP_EVENTS.
+EVENTS_CALENDAR = {
+    'TOP_EVENTS': int(os.getenv('EVENTS_CALENDAR_TOP_EVENTS', 5)),
+    'MAX_DAYS': 62,
+}
+
+# Events occupy their venue for `duration` minutes, DEFAULT_DURATION when a
+# request gives none. No event may run longer than MAX_DURATION, which bounds
+# the venue double-booking check; run `manage.py backfill_ends_at` after
+# changing DEFAULT_DURATION for events created without a duration.
+EVENTS_DEFAULT_DURATION = int(os.getenv('EVENTS_DEFAULT_DURATION', 120))
+EVENTS_MAX_DURATION = int(os.getenv('EVENTS_MAX_DURATION', 24 * 60))
+
+# Recurring events are expanded on demand. An upcoming or past listing page
+# without enough stored events looks HORIZON_DAYS ahead (or back) for
+# occurrences; MAX_COUNT caps the `count` of a recurrence rule.
+EVENTS_RECURRENCE = {
+    'HORIZON_DAYS': int(os.getenv('EVENTS_RECURRENCE_HORIZON_DAYS', 365)),
+    'MAX_COUNT': 1000,
+}
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+
+class MetricsTests(SimpleTestCase):
+    def scrape(self, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get('/metrics/', **headers)
+
+    def test_token_is_required(self):
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scrape'}):
+            self.assertEqual(self.scrape().status_code, 403)
+            self.assertEqual(self.scrape('wrong').status_code, 403)
+            response = self.scrape('scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE eventease_requests_total counter', response.content)
+
+    def test_no_token_is_only_served_in_debug(self):
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': None}):
+            with self.assertLogs('EventEase.views', 'WARNING'):
+                self.assertEqual(self.scrape().status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.scrape().status_code, 200)
@@ -16,9 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from .views import health, metrics
 
 urlpatterns = [
     # path('admin/', admin.site.urls),
+    path('health/', health, name='health'),
+    path('metrics/', metrics, name='metrics'),
     path('auth/',include('authentication.urls')),
+    # Motor-backed versions of the event views; serve them under ASGI.
+    path('async/',include('events.async_urls')),
     path('',include('events.urls'))
 ]
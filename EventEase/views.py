@@ -0,0 +1,29 @@
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed
+from db_connection import connections
+from .responses import JsonResponse
+from .metrics import get_config as metrics_config, registry
+
+logger = logging.getLogger(__name__)
+
+
+def health(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    ok, report = connections.health()
+    report['status'] = 'ok' if ok else 'unavailable'
+    return JsonResponse(report, status=200 if ok else 503)
+
+
+def metrics(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    token = metrics_config()['TOKEN']
+    if not token and not settings.DEBUG:
+        logger.warning('Refusing /metrics/: set METRICS_TOKEN to serve it with DEBUG off')
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
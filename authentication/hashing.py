@@ -0,0 +1,178 @@
+"""Password hashing off the request thread.
+
+PBKDF2 costs hundreds of milliseconds of CPU per call. Running it in the
+worker that serves requests holds the GIL and stalls every other endpoint, so
+signup and signin hand it to a small process pool instead. The pool admits a
+bounded number of pending jobs; past that, callers get HashingBusy and the
+view answers 503 rather than queueing without limit.
+"""
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'MAX_PENDING': 32,
+    'TIMEOUT': 10,
+    'ITERATIONS': None,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return config
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from PASSWORD_HASHING.
+
+    It keeps Django's algorithm name, so existing hashes still verify; each
+    hash records its own iteration count.
+    """
+
+    @property
+    def iterations(self):
+        return get_config()['ITERATIONS'] or PBKDF2PasswordHasher.iterations
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _init_worker(settings_module):
+    # Spawned workers only need settings for the hasher lookup; they never
+    # call django.setup(), so no app (or MongoDB connection) is loaded.
+    if settings_module:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+def _timed_hash():
+    """Seconds one PBKDF2 hash takes here; calibrates dummy_verify."""
+    start = time.perf_counter()
+    make_password(secrets.token_urlsafe(16))
+    return time.perf_counter() - start
+
+
+class HashingPool:
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Running average of a real verification, for dummy_verify.
+        self.verify_seconds = None
+        # The timing hash each new pool runs first, seeding verify_seconds.
+        self._calibration = None
+
+    @property
+    def executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=get_config()['WORKERS'],
+                        # Forking a threaded server process is unsafe.
+                        mp_context=get_context('spawn'),
+                        initializer=_init_worker,
+                        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),),
+                    )
+                    self._pid = os.getpid()
+                    self._calibration = self._executor.submit(_timed_hash)
+        return self._executor
+
+    def reset(self):
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._calibration = None
+
+    def run(self, fn, *args):
+        config = get_config()
+        if not config['WORKERS']:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= config['MAX_PENDING']:
+                raise HashingBusy('Too many password hashing requests in flight')
+            self._pending += 1
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda _: self._done())
+        try:
+            return future.result(timeout=config['TIMEOUT'])
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy('Password hashing timed out')
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call.
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise HashingBusy('Password hashing pool restarted')
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def pending(self):
+        return self._pending
+
+    def hash_password(self, password):
+        return self.run(make_password, password)
+
+    def verify_password(self, password, encoded):
+        start = time.perf_counter()
+        ok = self.run(check_password, password, encoded)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            previous = self.verify_seconds
+            self.verify_seconds = elapsed if previous is None else 0.9 * previous + 0.1 * elapsed
+        return ok
+
+    def _calibrate(self):
+        config = get_config()
+        if not config['WORKERS']:
+            seconds = _timed_hash()
+        else:
+            executor = self.executor
+            try:
+                seconds = self._calibration.result(timeout=config['TIMEOUT'])
+            except FutureTimeout:
+                raise HashingBusy('Password hashing timed out')
+            except BrokenProcessPool:
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                raise HashingBusy('Password hashing pool restarted')
+        with self._lock:
+            if self.verify_seconds is None:
+                self.verify_seconds = seconds
+
+    def dummy_verify(self, password):
+        """Take as long as a real verification without hashing anything.
+
+        Answering unknown emails faster than known ones would reveal which
+        accounts exist. Sleeping for the average verification time matches
+        the response time while leaving the CPU to other requests. Until a
+        real verification has been timed, the average starts from the one
+        hash each pool times when it starts.
+        """
+        if self.verify_seconds is None:
+            self._calibrate()
+        time.sleep(self.verify_seconds)
+        return False
+
+
+hashing_pool = HashingPool()
+os.register_at_fork(after_in_child=hashing_pool.reset)
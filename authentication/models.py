@@ -1,7 +1,15 @@
 from db_connection import db
+from pymongo import IndexModel, ASCENDING
 
 user_collection=db['users']
 
+INDEXES = {
+    user_collection: [
+        # signin lookups, and makes signup's duplicate check race-free.
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+}
+
 class User:
     def __init__(self, email, username, password, role, events=None):
         self.email = email
@@ -0,0 +1,88 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'EMAIL_BURST': 5,
+    'EMAIL_PER_MINUTE': 5,
+    'IP_BURST': 20,
+    'IP_PER_MINUTE': 60,
+    'MAX_KEYS': 100000,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AUTH_RATE_LIMIT', {}))
+    return config
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per key, in a bounded LRU.
+
+    Each bucket holds up to `burst` tokens and refills at `per_minute`; an
+    attempt spends one token. Limits apply per worker process.
+    """
+
+    def __init__(self, burst, per_minute, max_keys=100000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend a token for `key`; return 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate if self.rate else math.inf
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def build_limiters():
+    config = get_config()
+    return {
+        'email': TokenBucketLimiter(config['EMAIL_BURST'], config['EMAIL_PER_MINUTE'], config['MAX_KEYS']),
+        'ip': TokenBucketLimiter(config['IP_BURST'], config['IP_PER_MINUTE'], config['MAX_KEYS']),
+    }
+
+
+limiters = build_limiters()
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def retry_after(request, email=None):
+    """Seconds the caller must wait before another attempt, or 0.
+
+    Checked before any password work. The IP bucket is charged first, so a
+    client spraying many emails is stopped by it alone.
+    """
+    if not get_config()['ENABLED']:
+        return 0
+    wait = limiters['ip'].take(client_ip(request))
+    if wait:
+        return wait
+    if email:
+        return limiters['email'].take(email.strip().lower())
+    return 0
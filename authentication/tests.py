@@ -1,3 +1,144 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.test import override_settings
+
+from authentication.hashing import hashing_pool
+from authentication.middleware import decode_token, token_cache
+from authentication.models import user_collection
+from authentication.ratelimit import TokenBucketLimiter, build_limiters, limiters
+from events.tests import MongoTestCase
+
+
+class TokenCacheTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user_id = self.add_user('reader')
+
+    def my_events(self, token):
+        return self.client.get('/myEvents/', HTTP_AUTHORIZATION=token).status_code
+
+    def test_repeated_token_is_served_from_the_cache(self):
+        token = self.token(self.user_id)
+        self.assertEqual(self.my_events(token), 200)
+        self.assertEqual(self.my_events(token), 200)
+
+        stats = token_cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['decodes']), (1, 1, 1))
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scrape'}):
+            metrics = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        self.assertIn('eventease_jwt_cache_hits_total 1\n', metrics)
+        self.assertIn('eventease_jwt_cache_entries 1\n', metrics)
+
+    def test_expired_token_is_evicted_not_served(self):
+        claims = {'user_id': self.user_id, 'role': 'USER', 'exp': datetime.utcnow() - timedelta(seconds=1)}
+        token = jwt.encode(claims, 'test-secret', algorithm='HS256')
+        # Cached while it was still valid, as the middleware would have done.
+        key = hashlib.sha256(token.encode()).hexdigest()
+        token_cache.set(key, {**claims, 'exp': int(claims['exp'].timestamp())})
+
+        self.assertIsNone(decode_token(token))
+        self.assertEqual(self.my_events('Bearer ' + token), 403)
+        stats = token_cache.stats()
+        self.assertEqual((stats['entries'], stats['hits']), (0, 0))
+
+    def test_tampered_token_is_rejected(self):
+        token = self.token(self.user_id)
+        self.assertEqual(self.my_events(token), 200)
+
+        header, payload, signature = token[len('Bearer '):].split('.')
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        forged = base64.urlsafe_b64encode(json.dumps({**claims, 'role': 'ADMIN'}).encode()).rstrip(b'=').decode()
+        tampered = '.'.join((header, forged, signature))
+
+        self.assertIsNone(decode_token(tampered))
+        self.assertEqual(self.send('get', '/adminApproval/', token='Bearer ' + tampered)[0], 403)
+        self.assertEqual(token_cache.stats()['entries'], 1)
+
+
+@override_settings(PASSWORD_HASHING={**settings.PASSWORD_HASHING, 'WORKERS': 0, 'ITERATIONS': 1000})
+class AuthTestCase(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        for limiter in limiters.values():
+            limiter.clear()
+        hashing_pool.reset()
+        hashing_pool.verify_seconds = None
+        self.addCleanup(setattr, hashing_pool, 'verify_seconds', None)
+
+    def signup(self, email, password='Secret#123'):
+        return self.send('post', '/auth/signup/', {'email': email, 'username': email.split('@')[0], 'password': password})
+
+    def signin(self, email, password='Secret#123'):
+        return self.send('post', '/auth/signin/', {'email': email, 'password': password})
+
+
+class RateLimitTests(AuthTestCase):
+    def test_signin_is_refused_once_the_burst_is_spent(self):
+        config = {**settings.AUTH_RATE_LIMIT, 'IP_BURST': 10, 'EMAIL_BURST': 2, 'EMAIL_PER_MINUTE': 1}
+        with override_settings(AUTH_RATE_LIMIT=config), patch.dict(limiters, build_limiters()):
+            self.assertEqual(self.signin('nobody@example.com')[0], 400)
+            self.assertEqual(self.signin('nobody@example.com')[0], 400)
+            response = self.client.post('/auth/signin/', {'email': 'nobody@example.com', 'password': 'x'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '60')
+            # The email bucket is per address; another one is still allowed.
+            self.assertEqual(self.signin('other@example.com')[0], 400)
+
+    def test_bucket_refills_over_time(self):
+        limiter = TokenBucketLimiter(burst=2, per_minute=60)
+        with patch('authentication.ratelimit.time.monotonic', return_value=100.0) as clock:
+            self.assertEqual([limiter.take('key') for _ in range(3)], [0, 0, 1.0])
+            clock.return_value = 100.5
+            self.assertAlmostEqual(limiter.take('key'), 0.5)
+            clock.return_value = 101.5
+            self.assertEqual(limiter.take('key'), 0)
+            # Refill stops at the burst size, however long the bucket sat idle.
+            clock.return_value = 1000.0
+            self.assertEqual([limiter.take('key') for _ in range(3)], [0, 0, 1.0])
+
+
+class PasswordHashingTests(AuthTestCase):
+    def test_signup_and_signin_round_trip_through_the_pool(self):
+        config = {**settings.PASSWORD_HASHING, 'WORKERS': 1, 'ITERATIONS': 1000}
+        # Spawned workers read settings afresh, so they get the iteration count from the environment.
+        with override_settings(PASSWORD_HASHING=config), patch.dict(os.environ, {'PASSWORD_HASH_ITERATIONS': '1000'}):
+            self.addCleanup(hashing_pool.reset)
+            self.addCleanup(lambda: hashing_pool._executor and hashing_pool._executor.shutdown())
+
+            self.assertEqual(self.signup('pooled@example.com')[0], 201)
+            encoded = user_collection.find_one({'email': 'pooled@example.com'})['password']
+            self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+            status, body = self.signin('pooled@example.com')
+            self.assertEqual(status, 200)
+            self.assertIn('token', body)
+            self.assertEqual(self.signin('pooled@example.com', 'Wrong#123')[0], 400)
+            self.assertIsNotNone(hashing_pool._executor)
+
+    def test_unknown_email_waits_like_a_real_verification(self):
+        self.signup('known@example.com')
+        self.assertEqual(self.signin('known@example.com', 'Wrong#123')[0], 400)
+        average = hashing_pool.verify_seconds
+        self.assertIsNotNone(average)
+
+        # No hashing happens for an unknown email; the view sleeps instead.
+        with patch.object(hashing_pool, 'run', side_effect=AssertionError('hashed')), \
+                patch('authentication.hashing.time.sleep') as sleep:
+            status, body = self.signin('unknown@example.com')
+        self.assertEqual((status, body), (400, {'error': 'Invalid credentials'}))
+        sleep.assert_called_once_with(average)
+
+    def test_first_unknown_email_is_calibrated_by_a_timed_hash(self):
+        with patch('authentication.hashing.time.sleep') as sleep:
+            self.assertEqual(self.signin('unknown@example.com')[0], 400)
+        self.assertGreater(hashing_pool.verify_seconds, 0)
+        sleep.assert_called_once_with(hashing_pool.verify_seconds)
@@ -1,16 +1,17 @@
 from django.shortcuts import render,redirect
-from django.http import JsonResponse,HttpResponseNotAllowed
-from django.contrib.auth.hashers import make_password,check_password
+from django.http import HttpResponseNotAllowed
+from EventEase.responses import JsonResponse
 from .models import user_collection,User
+from .hashing import HashingBusy, hashing_pool
+from .ratelimit import retry_after
+import math
 import re
 from datetime import datetime, timedelta
 import jwt
-import os
-from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+from django.conf import settings
 import json
 
-load_dotenv()
-
 regexEmail=r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
 
 regexPassword=r'^(?=.*[A-Z])(?=.*[a-z])(?=.*\d)(?=.*[@#$%^&+=]).{8,}$'
@@ -22,9 +23,19 @@ def generate_jwt_token(user):
         'exp': datetime.utcnow() + timedelta(hours=6),
         'iat': datetime.utcnow(),
     }
-    token = jwt.encode(payload, f'{os.getenv('SECRET_KEY')}', algorithm=f'{os.getenv('SECRET_ALGORITHM')}')
+    token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return token
 
+def too_many_attempts(wait):
+    response = JsonResponse({'error': 'Too many attempts, Please try again later'}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+def hashing_busy():
+    response = JsonResponse({'error': 'Server busy, Please try again'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
 def signup(request):
     try:
         if request.method == "POST":
@@ -37,15 +48,25 @@ def signup(request):
             if email is None: return JsonResponse({'error': "Email not provided"}, status=400)
             if password is None: return JsonResponse({'error': "Password not provided"}, status=400)
 
+            wait = retry_after(request)
+            if wait: return too_many_attempts(wait)
+
             if user_collection.find_one({"email": email}):
                 return JsonResponse({'error': 'Email already exists'}, status=400)
 
             if(re.fullmatch(regexEmail,email)==None): return JsonResponse({'error': 'Please provide email in correct format'}, status=400)
             # if(re.fullmatch(regexPassword,password)==None): return JsonResponse({'error': 'Please provide a strong password'}, status=400)
-            hashed_password = make_password(password)
+            try:
+                hashed_password = hashing_pool.hash_password(password)
+            except HashingBusy:
+                return hashing_busy()
             role='USER'
             new_user = User(email=email, username=username, password=hashed_password,role=role)
-            result = user_collection.insert_one(new_user.to_dict())
+            try:
+                result = user_collection.insert_one(new_user.to_dict())
+            except DuplicateKeyError:
+                # Lost a race with a concurrent signup for the same email.
+                return JsonResponse({'error': 'Email already exists'}, status=400)
             if result.inserted_id:
                 return JsonResponse({'message': 'User created successfully'}, status=201)
             else:
@@ -64,8 +85,18 @@ def signin(request):
             if email is None: return JsonResponse({'error': "Email not provided"}, status=400)
             if password is None: return JsonResponse({'error': "Password not provided"}, status=400)
 
+            wait = retry_after(request, email)
+            if wait: return too_many_attempts(wait)
+
             user_data = user_collection.find_one({"email": email})
-            if user_data and check_password(password, user_data['password']):
+            try:
+                if user_data:
+                    valid = hashing_pool.verify_password(password, user_data['password'])
+                else:
+                    valid = hashing_pool.dummy_verify(password)
+            except HashingBusy:
+                return hashing_busy()
+            if valid:
                 token = generate_jwt_token(user_data)
                 return JsonResponse({'token': token}, status=200)
             return JsonResponse({'error': 'Invalid credentials'}, status=400)
@@ -0,0 +1,113 @@
+"""Requests per second of the async views under uvicorn against the WSGI views.
+
+By default both apps are started under uvicorn with the same worker count,
+the WSGI one through uvicorn's WSGI interface, so the only difference is
+sync pymongo views (/) against Motor views (/async/):
+
+    python -m benchmarks.asgi_load --workers 2 --concurrency 64 --requests 5000
+
+To compare against another WSGI server, start it yourself and pass its URL:
+
+    gunicorn EventEase.wsgi -w 2 -b 127.0.0.1:8001 &
+    python -m benchmarks.asgi_load --wsgi-url http://127.0.0.1:8001/
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmarks.common import summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def start_server(app, port, workers, interface):
+    cmd = [sys.executable, '-m', 'uvicorn', app, '--port', str(port), '--workers', str(workers),
+           '--interface', interface, '--log-level', 'warning', '--no-access-log']
+    process = subprocess.Popen(cmd, cwd=ROOT)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health/')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{app} did not start on port {port}')
+
+
+def run_load(url, total, concurrency, headers):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    local = threading.local()
+    errors = []
+
+    def one(_):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            local.conn = None
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return {'requests_per_sec': round(total / elapsed, 1), 'errors': len(errors), **summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--path', default='?limit=20', help='Query string appended to both listing URLs.')
+    parser.add_argument('--token', help='Bearer token to send, e.g. to exercise the JWT middleware.')
+    parser.add_argument('--wsgi-url', help='Base URL of an already running WSGI server.')
+    parser.add_argument('--asgi-url', help='Base URL of an already running ASGI server.')
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    processes = []
+    try:
+        wsgi_url, asgi_url = args.wsgi_url, args.asgi_url
+        if not wsgi_url:
+            processes.append(start_server('EventEase.wsgi:application', 8101, args.workers, 'wsgi'))
+            wsgi_url = 'http://127.0.0.1:8101/'
+        if not asgi_url:
+            processes.append(start_server('EventEase.asgi:application', 8102, args.workers, 'asgi3'))
+            asgi_url = 'http://127.0.0.1:8102/'
+
+        results = {
+            'wsgi': run_load(wsgi_url.rstrip('/') + '/' + args.path, args.requests, args.concurrency, headers),
+            'asgi': run_load(asgi_url.rstrip('/') + '/async/' + args.path, args.requests, args.concurrency, headers),
+        }
+        results['speedup'] = round(results['asgi']['requests_per_sec'] / results['wsgi']['requests_per_sec'], 2)
+        print(json.dumps(results, indent=2))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
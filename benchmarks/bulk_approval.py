@@ -0,0 +1,67 @@
+"""Throughput of bulk approvals against deciding them one at a time.
+
+    python -m benchmarks.bulk_approval --approvals 2000 --batch-size 500
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import BENCH_MARKER, cleanup, setup_django
+
+
+def seed_approvals(count):
+    from bson import ObjectId
+    from events.models import Event, EventApproval, approval_collection
+
+    starts = datetime.utcnow() + timedelta(days=30)
+    docs = []
+    for i in range(count):
+        payload = Event(
+            title=f'Bulk approval {i}', description='Seeded by the benchmark suite.', venue='Hall 1',
+            date=starts.strftime('%Y-%m-%d'), time=starts.strftime('%H:%M:%S'), organizer='bench-user',
+        ).to_dict()
+        payload[BENCH_MARKER] = True
+        doc = EventApproval(event_id=str(ObjectId()), user_id='bench-user', action='post', payload=payload).to_dict()
+        doc[BENCH_MARKER] = True
+        docs.append(doc)
+    return [str(oid) for oid in approval_collection.insert_many(docs).inserted_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--approvals', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from events.approvals import decide, decide_many
+    from events.models import approval_collection, event_collection
+
+    try:
+        ids = seed_approvals(args.approvals)
+        start = time.perf_counter()
+        for approval_id in ids:
+            decide(approval_id, 'approve')
+        single = time.perf_counter() - start
+        cleanup(event_collection, approval_collection)
+
+        ids = seed_approvals(args.approvals)
+        start = time.perf_counter()
+        for i in range(0, len(ids), args.batch_size):
+            decide_many([{'approval_id': a, 'action': 'approve'} for a in ids[i:i + args.batch_size]])
+        bulk = time.perf_counter() - start
+
+        print(json.dumps({
+            'approvals': args.approvals,
+            'batch_size': args.batch_size,
+            'one_at_a_time_per_sec': round(args.approvals / single, 1),
+            'bulk_per_sec': round(args.approvals / bulk, 1),
+            'speedup': round(single / bulk, 2),
+        }, indent=2))
+    finally:
+        cleanup(event_collection, approval_collection)
+
+
+if __name__ == '__main__':
+    main()
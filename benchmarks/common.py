@@ -0,0 +1,82 @@
+"""Shared helpers for the scripts in this package.
+
+Benchmarks never touch the configured database: setup_django() points
+DB_NAME at a dedicated one, BENCH_DB_NAME or eventease_bench, on the server in
+DB_URI. Every document they seed carries BENCH_MARKER so cleanup() can remove
+exactly what was added.
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_MARKER = '_bench'
+BENCH_DATABASE = os.environ.get('BENCH_DB_NAME', 'eventease_bench')
+
+
+def setup_django(database=BENCH_DATABASE):
+    """Configure Django against the benchmark `database`, with indexes in place."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'EventEase.settings')
+    os.environ['DB_NAME'] = database
+    import django
+    django.setup()
+
+    from authentication.models import INDEXES as USER_INDEXES
+    from db_connection import ensure_indexes
+    from events.models import INDEXES as EVENT_INDEXES
+    ensure_indexes({**USER_INDEXES, **EVENT_INDEXES})
+
+
+def seed_events(collection, count, batch_size=10000):
+    """Insert `count` events spread over a year either side of now."""
+    from events.models import Event
+
+    now = datetime.utcnow()
+    batch = []
+    for i in range(count):
+        starts = now + timedelta(minutes=(i * 7919) % (2 * 525600) - 525600)
+        doc = Event(
+            title=f'Benchmark event {i}',
+            description='Seeded by the benchmark suite. ' * 4,
+            venue=f'Hall {i % 50}',
+            date=starts.strftime('%Y-%m-%d'),
+            time=starts.strftime('%H:%M:%S'),
+            organizer=f'organizer-{i % 500}',
+        ).to_dict()
+        doc[BENCH_MARKER] = True
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def cleanup(*collections):
+    for collection in collections:
+        collection.delete_many({BENCH_MARKER: True})
+
+
+def measure(fn, iterations):
+    """Call fn `iterations` times and return latency percentiles in ms."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p95_ms': round(pick(0.95), 3),
+        'p99_ms': round(pick(0.99), 3),
+    }
@@ -0,0 +1,44 @@
+"""Latency of display_events with and without the read-through cache.
+
+    python -m benchmarks.event_cache --events 100000 --iterations 500
+"""
+import argparse
+import json
+
+from benchmarks.common import cleanup, measure, seed_events, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from events.cache import event_cache
+    from events.models import event_collection
+    from events.views import display_events
+
+    factory = RequestFactory()
+    seed_events(event_collection, args.events)
+    sample_id = str(event_collection.find_one({}, {'_id': 1})['_id'])
+    try:
+        results = {}
+        for label, path in (('listing', '/'), ('single', f'/?id={sample_id}')):
+            call = lambda: display_events(factory.get(path))
+            event_cache.enabled = False
+            uncached = measure(call, args.iterations)
+            event_cache.enabled = True
+            event_cache.invalidate(sample_id)
+            event_cache.reset_stats()
+            cached = measure(call, args.iterations)
+            results[label] = {'uncached': uncached, 'cached': cached, 'cache': event_cache.stats()}
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(event_collection)
+        event_cache.invalidate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Peak RSS of a full event export: streaming endpoint against an in-memory payload.
+
+Each mode runs in its own child process so ru_maxrss measures that mode alone.
+
+    python -m benchmarks.export_memory --events 200000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.common import cleanup, seed_events, setup_django
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_mode(mode, gzip):
+    setup_django()
+    from django.http import JsonResponse
+    from django.test import RequestFactory
+    from events.models import event_collection
+    from events.views import export_events
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    if mode == 'in_memory':
+        # What display_events used to do: materialise everything, then encode.
+        events = list(event_collection.find({}, {'_id': 0}))
+        size = len(JsonResponse({'events': events}).content)
+    else:
+        request = RequestFactory().get('/export/', {'gzip': '1' if gzip else ''})
+        request.user_claims = {'role': 'ADMIN'}
+        for chunk in export_events(request).streaming_content:
+            size += len(chunk)
+    print(json.dumps({
+        'mode': mode,
+        'bytes': size,
+        'seconds': round(time.perf_counter() - start, 3),
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--mode', choices=('in_memory', 'streaming'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args.mode, args.gzip)
+
+    setup_django()
+    from events.models import event_collection
+
+    seed_events(event_collection, args.events)
+    try:
+        results = []
+        for mode in ('in_memory', 'streaming'):
+            cmd = [sys.executable, '-m', 'benchmarks.export_memory', '--mode', mode]
+            if args.gzip:
+                cmd.append('--gzip')
+            output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(event_collection)
+
+
+if __name__ == '__main__':
+    main()
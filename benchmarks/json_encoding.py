@@ -0,0 +1,60 @@
+"""Encoding cost of large listing responses, per JSON backend.
+
+Fetches one large page of full event documents, then times building the
+response with Django's stock JsonResponse, the shared encoder on the standard
+library, and the shared encoder on orjson (when installed). The fetch itself
+is timed too, to show what share of the response the encoding takes:
+
+    python -m benchmarks.json_encoding --events 20000 --limit 1000 --iterations 100
+"""
+import argparse
+import json
+from datetime import datetime
+
+from benchmarks.common import cleanup, measure, seed_events, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.http import JsonResponse as DjangoJsonResponse
+    from EventEase import responses
+    from events.models import event_collection
+    from events.pagination import PAST, UPCOMING, fetch_page
+
+    seed_events(event_collection, args.events)
+    now = datetime.utcnow()
+    try:
+        fetch = lambda: {f'{page}_events': fetch_page(event_collection, page, now, args.limit)[0]
+                         for page in (UPCOMING, PAST)}
+        payload = fetch()
+        backends = {
+            'django': lambda: DjangoJsonResponse(payload).content,
+            'stdlib': lambda: responses.dumps_stdlib(payload),
+        }
+        if responses.orjson is not None:
+            backends['orjson'] = lambda: responses.dumps_orjson(payload)
+
+        results = {
+            'documents': sum(len(events) for events in payload.values()),
+            'payload_bytes': len(responses.dumps(payload)),
+            'fetch': measure(fetch, args.iterations),
+        }
+        for label, encode in backends.items():
+            results[label] = measure(encode, args.iterations)
+            results[label]['share_of_response'] = round(
+                results[label]['mean_ms'] / (results[label]['mean_ms'] + results['fetch']['mean_ms']), 3)
+        for label in list(backends)[1:]:
+            results[f'speedup_{label}'] = round(results['django']['mean_ms'] / results[label]['mean_ms'], 2)
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(event_collection)
+
+
+if __name__ == '__main__':
+    main()
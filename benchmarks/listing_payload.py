@@ -0,0 +1,43 @@
+"""Response size and fetch time of listing pages, full documents against summaries.
+
+    python -m benchmarks.listing_payload --events 100000 --limit 100 --iterations 200
+"""
+import argparse
+import json
+from datetime import datetime
+
+from benchmarks.common import cleanup, measure, seed_events, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.serializers.json import DjangoJSONEncoder
+    from events.models import event_collection
+    from events.pagination import PAST, fetch_page
+    from events.views import listing_projection
+
+    seed_events(event_collection, args.events)
+    now = datetime.utcnow()
+    try:
+        results = {}
+        for label, projection in (('full', None), ('summary', listing_projection())):
+            fetch = lambda: fetch_page(event_collection, PAST, now, args.limit, projection=projection)
+            docs, _ = fetch()
+            results[label] = {
+                'page_bytes': len(json.dumps(docs, cls=DjangoJSONEncoder)),
+                'fetch': measure(fetch, args.iterations),
+            }
+        results['bytes_saved'] = round(1 - results['summary']['page_bytes'] / results['full']['page_bytes'], 3)
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(event_collection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Listing latency while a storm of signins hits the same server.
+
+Starts the WSGI app under uvicorn (its threads share one process, like a
+gunicorn gthread worker), measures GET / alone, then again while --storm
+threads sign in as fast as they can:
+
+    python -m benchmarks.login_storm --storm 32 --requests 500
+    python -m benchmarks.login_storm --inline     # hash on the request thread
+
+Rate limiting is switched off in the server unless --rate-limit is given, so
+every signin really hashes.
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+
+from benchmarks.asgi_load import run_load, start_server
+from benchmarks.common import BENCH_MARKER, cleanup, setup_django
+
+PASSWORD = 'storm-password'
+
+
+def seed_user():
+    from django.contrib.auth.hashers import make_password
+    from authentication.models import User, user_collection
+
+    doc = User(email='storm@bench.invalid', username='storm', password=make_password(PASSWORD), role='USER').to_dict()
+    doc[BENCH_MARKER] = True
+    user_collection.insert_one(doc)
+    return doc['email']
+
+
+def storm(port, email, threads, stop):
+    counts = {}
+    lock = threading.Lock()
+    body = json.dumps({'email': email, 'password': PASSWORD})
+
+    def loop():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while not stop.is_set():
+            try:
+                conn.request('POST', '/auth/signin/', body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                status = 'error'
+            with lock:
+                counts[status] = counts.get(status, 0) + 1
+
+    workers = [threading.Thread(target=loop, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    return workers, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storm', type=int, default=32, help='Concurrent signin threads.')
+    parser.add_argument('--requests', type=int, default=500, help='Listing requests per phase.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent listing clients.')
+    parser.add_argument('--inline', action='store_true', help='Hash on the request thread (PASSWORD_HASHING_WORKERS=0).')
+    parser.add_argument('--rate-limit', action='store_true', help='Keep signin rate limiting on.')
+    args = parser.parse_args()
+
+    os.environ['PASSWORD_HASHING_WORKERS'] = '0' if args.inline else os.environ.get('PASSWORD_HASHING_WORKERS', '2')
+    os.environ['AUTH_RATE_LIMIT_ENABLED'] = 'true' if args.rate_limit else 'false'
+    setup_django()
+    from authentication.models import user_collection
+
+    port = 8104
+    process = None
+    stop = threading.Event()
+    try:
+        email = seed_user()
+        process = start_server('EventEase.wsgi:application', port, 1, 'wsgi')
+        url = f'http://127.0.0.1:{port}/?limit=20'
+        results = {'baseline': run_load(url, args.requests, args.concurrency, {})}
+
+        start = time.perf_counter()
+        workers, counts = storm(port, email, args.storm, stop)
+        time.sleep(1)
+        results['during_storm'] = run_load(url, args.requests, args.concurrency, {})
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        results['signins'] = {str(k): v for k, v in counts.items()}
+        results['signins_per_sec'] = round(sum(counts.values()) / elapsed, 1)
+        results['p99_ratio'] = round(results['during_storm']['p99_ms'] / results['baseline']['p99_ms'], 2)
+        print(json.dumps(results, indent=2))
+    finally:
+        stop.set()
+        if process:
+            process.terminate()
+            process.wait()
+        cleanup(user_collection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Burst of concurrent registrations for one event with limited seats.
+
+Seeds --users users and one event with --capacity seats, starts the app under
+uvicorn (or targets an already running server with --url) and fires every
+registration at once, resending a share of them to mimic client retries.
+Afterwards it checks that the event is not overbooked, that its counters match
+the registrations collection, and that p99 latency is within budget:
+
+    python -m benchmarks.registration_burst --users 10000 --capacity 500 --workers 4
+
+Use --interface wsgi to drive the sync views instead of the async ones. Very
+high concurrency needs a matching open files limit (ulimit -n). The script
+exits non-zero when a check fails.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from benchmarks.asgi_load import start_server
+from benchmarks.common import BENCH_MARKER, cleanup, setup_django, summarize
+
+
+def seed(users, capacity):
+    from authentication.models import User, user_collection
+    from events.models import Event, event_collection
+
+    docs = []
+    for i in range(users):
+        doc = User(email=f'burst-{i}@bench.invalid', username=f'burst-{i}', password='!', role='USER').to_dict()
+        doc[BENCH_MARKER] = True
+        docs.append(doc)
+    user_ids = [str(oid) for oid in user_collection.insert_many(docs, ordered=False).inserted_ids]
+
+    starts = datetime.utcnow() + timedelta(days=30)
+    event = Event(title='Registration burst', description='Seeded by the benchmark suite.', venue='Hall 1',
+                  date=starts.strftime('%Y-%m-%d'), time=starts.strftime('%H:%M:%S'),
+                  organizer='bench-user', capacity=capacity).to_dict()
+    event[BENCH_MARKER] = True
+    return str(event_collection.insert_one(event).inserted_id), user_ids
+
+
+def token_for(user_id):
+    import jwt
+    from django.conf import settings
+
+    payload = {'user_id': user_id, 'role': 'USER', 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+async def post(host, port, path, body, token):
+    """One HTTP/1.1 request on its own connection; returns (status, ms)."""
+    payload = json.dumps(body).encode()
+    head = (f'POST {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+            f'Authorization: Bearer {token}\r\n\r\n').encode()
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(head + payload)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+    finally:
+        writer.close()
+    return status, (time.perf_counter() - start) * 1000
+
+
+async def burst(url, requests, concurrency):
+    parts = urlsplit(url)
+    gate = asyncio.Semaphore(concurrency)
+    statuses = {}
+    samples = []
+
+    async def one(body, token):
+        async with gate:
+            try:
+                status, ms = await post(parts.hostname, parts.port, parts.path, body, token)
+            except (OSError, ValueError, IndexError) as e:
+                status, ms = type(e).__name__, None
+        statuses[status] = statuses.get(status, 0) + 1
+        if ms is not None:
+            samples.append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(body, token) for body, token in requests))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_sec': round(len(requests) / elapsed, 1),
+        'statuses': {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        **summarize(samples or [0.0]),
+    }
+
+
+def check(event_id, users, capacity):
+    from bson import ObjectId
+    from events.models import REGISTERED, WAITLISTED, event_collection, registration_collection
+
+    event = event_collection.find_one({'_id': ObjectId(event_id)})
+    registered = registration_collection.count_documents({'event_id': event_id, 'status': REGISTERED})
+    waitlisted = registration_collection.count_documents({'event_id': event_id, 'status': WAITLISTED})
+    checks = {
+        'not_overbooked': event['attendee_count'] <= capacity and registered <= capacity,
+        'attendee_count_matches': event['attendee_count'] == registered,
+        'waitlist_count_matches': event.get('waitlist_count', 0) == waitlisted,
+        'every_user_once': registered + waitlisted == users,
+        'seats_filled': registered == min(capacity, users),
+    }
+    return {'attendee_count': event['attendee_count'], 'registered': registered, 'waitlisted': waitlisted}, checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--capacity', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=10000)
+    parser.add_argument('--retry-share', type=float, default=0.1,
+                        help='Fraction of registrations sent a second time in the same burst.')
+    parser.add_argument('--p99-budget-ms', type=float, default=2000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--interface', choices=('asgi3', 'wsgi'), default='asgi3')
+    parser.add_argument('--url', help='registerEvent/ URL of an already running server.')
+    args = parser.parse_args()
+
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except ValueError:
+        pass
+
+    setup_django()
+    from authentication.models import user_collection
+    from events.models import event_collection, registration_collection
+
+    process = None
+    event_id = None
+    try:
+        event_id, user_ids = seed(args.users, args.capacity)
+        requests = [({'event_id': event_id, 'user_id': u}, token_for(u)) for u in user_ids]
+        requests += random.sample(requests, int(len(requests) * args.retry_share))
+        random.shuffle(requests)
+
+        url = args.url
+        if not url:
+            if args.interface == 'asgi3':
+                process = start_server('EventEase.asgi:application', 8103, args.workers, 'asgi3')
+                url = 'http://127.0.0.1:8103/async/registerEvent/'
+            else:
+                process = start_server('EventEase.wsgi:application', 8103, args.workers, 'wsgi')
+                url = 'http://127.0.0.1:8103/registerEvent/'
+
+        results = asyncio.run(burst(url, requests, args.concurrency))
+        results['counts'], checks = check(event_id, args.users, args.capacity)
+        checks['p99_within_budget'] = results['p99_ms'] <= args.p99_budget_ms
+        results['checks'] = checks
+        print(json.dumps(results, indent=2))
+        if not all(checks.values()):
+            sys.exit(1)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        if event_id:
+            registration_collection.delete_many({'event_id': event_id})
+        cleanup(event_collection, user_collection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Latency of events/search/ on a large synthetic catalogue.
+
+Seeds events whose titles, venues and descriptions are drawn from a small
+vocabulary, builds the text index and times a mix of searches:
+
+    python -m benchmarks.search --events 1000000 --iterations 200
+
+Seeding a million events takes a few minutes; pass --keep to reuse them on the
+next run with --no-seed.
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.common import BENCH_MARKER, cleanup, measure, setup_django
+
+TOPICS = ['python', 'django', 'mongodb', 'jazz', 'poetry', 'startup', 'robotics', 'yoga', 'chess', 'photography',
+          'marathon', 'cooking', 'design', 'security', 'climate', 'history', 'film', 'gaming', 'wine', 'astronomy']
+KINDS = ['meetup', 'workshop', 'conference', 'festival', 'night', 'bootcamp', 'summit', 'hackathon', 'class', 'tour']
+CITIES = ['Berlin', 'Lisbon', 'Austin', 'Pune', 'Osaka', 'Nairobi', 'Toronto', 'Lima', 'Oslo', 'Melbourne']
+
+
+def seed_search_events(count, batch_size=10000):
+    from events.models import Event, event_collection
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for i in range(count):
+        topic, kind, city = rng.choice(TOPICS), rng.choice(KINDS), rng.choice(CITIES)
+        starts = now + timedelta(minutes=rng.randrange(-525600, 525600))
+        doc = Event(
+            title=f'{topic.title()} {kind} {i}',
+            description=' '.join(rng.choices(TOPICS + KINDS, k=30)),
+            venue=f'{city} Hall {i % 20}',
+            date=starts.strftime('%Y-%m-%d'),
+            time=starts.strftime('%H:%M:%S'),
+            organizer=f'organizer-{i % 500}',
+        ).to_dict()
+        doc[BENCH_MARKER] = True
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            event_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        event_collection.insert_many(batch, ordered=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--no-seed', action='store_true', help='Reuse events left by an earlier --keep run.')
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded events in place.')
+    args = parser.parse_args()
+
+    setup_django()
+    from events.models import event_collection
+    from events.search import search_events
+
+    if not args.no_seed:
+        seed_search_events(args.events)
+    now = datetime.utcnow()
+    rng = random.Random(7)
+    cases = {
+        'single_term': lambda: search_events(rng.choice(TOPICS), limit=args.limit),
+        'two_terms': lambda: search_events(f'{rng.choice(TOPICS)} {rng.choice(KINDS)}', limit=args.limit),
+        'date_range': lambda: search_events(rng.choice(TOPICS), now, now + timedelta(days=30), limit=args.limit),
+        'venue': lambda: search_events(rng.choice(TOPICS), venue=f'{rng.choice(CITIES)} Hall 3', limit=args.limit),
+        'page_5': lambda: search_events(rng.choice(TOPICS), page=5, limit=args.limit),
+    }
+    try:
+        results = {label: measure(case, args.iterations) for label, case in cases.items()}
+        results['events'] = event_collection.count_documents({BENCH_MARKER: True})
+        print(json.dumps(results, indent=2))
+    finally:
+        if not args.keep:
+            cleanup(event_collection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""Benchmark every endpoint through the Django test client and a real HTTP server.
+
+Seeds a dedicated database with --users, --events, --pending and --approvals,
+then replays each scenario below through the test client (no network, one
+request at a time) and through a threaded WSGI server on a local port
+(--concurrency clients). Both passes start from a freshly seeded database.
+Throughput, status counts and p50/p95/p99 latency are written as JSON, so runs
+from two commits can be compared:
+
+    python -m benchmarks.suite --output before.json
+    git checkout my-branch
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Runs against the MongoDB in DB_URI, in the --database database (dropped
+before each pass and at the end). --mongomock runs fully offline on the
+in-memory stand-in instead (pip install -r requirements-dev.txt). It has no
+text search or $lookup pipelines, so those scenarios show up as 500s there.
+"""
+import argparse
+import http.client
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.common import BENCH_DATABASE, seed_events, setup_django, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+PASSWORD = 'bench-password'
+BULK_SIZE = 20
+# Scenarios that hash passwords or stream the whole collection run fewer times.
+SLOW = ('signup', 'signin', 'export')
+
+
+class Fixture:
+    """Seeds one pass worth of data and remembers the ids scenarios need."""
+
+    def __init__(self, args):
+        self.args = args
+        self.run = f'{time.time_ns():x}'
+
+    def seed(self):
+        from bson import ObjectId
+        from django.contrib.auth.hashers import make_password
+        from django.core.management import call_command
+        from authentication.models import User, user_collection
+        from events.models import (Event, EventApproval, approval_collection, event_collection,
+                                   pending_events_collection, series_collection)
+        from events.recurrence import new_series, parse_recurrence
+
+        args = self.args
+        encoded = make_password(PASSWORD)
+        users = [User(email=f'bench-{i}@bench.invalid', username=f'bench-{i}', password=encoded, role='USER').to_dict()
+                 for i in range(args.users)]
+        self.user_ids = [str(oid) for oid in user_collection.insert_many(users).inserted_ids]
+        admin = User(email='admin@bench.invalid', username='admin', password=encoded, role='ADMIN').to_dict()
+        self.admin_id = str(user_collection.insert_one(admin).inserted_id)
+
+        seed_events(event_collection, args.events)
+        self.event_ids = [str(doc['_id']) for doc in event_collection.find({}, {'_id': 1}).limit(1000)]
+
+        starts = datetime.utcnow() + timedelta(days=60)
+        # A hall each, so approvals and updates never hit a venue conflict.
+        halls = itertools.count()
+        def upcoming(title, organizer):
+            return Event(title=title, description='Seeded by the benchmark suite.', venue=f'Suite hall {next(halls)}',
+                         date=starts.strftime('%Y-%m-%d'), time=starts.strftime('%H:%M:%S'), organizer=organizer)
+
+        docs = [upcoming(f'Open event {i}', 'bench-organizer').to_dict() for i in range(50)]
+        self.open_ids = [str(oid) for oid in event_collection.insert_many(docs).inserted_ids]
+        docs = [upcoming(f'Owned event {i}', self.user_ids[i % len(self.user_ids)]).to_dict()
+                for i in range(args.iterations)]
+        self.owned = [(str(oid), doc['organizer']) for oid, doc in
+                      zip(event_collection.insert_many(docs).inserted_ids, docs)]
+        docs = [upcoming(f'Disposable event {i}', 'bench-organizer').to_dict() for i in range(args.iterations)]
+        self.disposable_ids = [str(oid) for oid in event_collection.insert_many(docs).inserted_ids]
+
+        # Legacy requests point at a pending_events copy; newer ones embed it.
+        pending = [upcoming(f'Pending event {i}', self.user_ids[0]).to_dict() for i in range(args.pending)]
+        legacy = []
+        if pending:
+            for oid in pending_events_collection.insert_many(pending).inserted_ids:
+                legacy.append(EventApproval(event_id=str(oid), user_id=self.user_ids[0], action='post').to_dict())
+            approval_collection.insert_many(legacy)
+        count = max(args.approvals, args.iterations * (1 + BULK_SIZE))
+        approvals = [EventApproval(event_id=str(ObjectId()), user_id=self.user_ids[i % len(self.user_ids)],
+                                   action='post', payload=upcoming(f'Requested event {i}', self.user_ids[0]).to_dict()).to_dict()
+                     for i in range(count)]
+        self.approval_ids = [str(oid) for oid in approval_collection.insert_many(approvals).inserted_ids]
+        # A daily series, so listings and the calendar expand occurrences.
+        series = new_series(Event(title='Daily series', description='Seeded by the benchmark suite.', venue='Suite series hall',
+                                  date=starts.strftime('%Y-%m-%d'), time='07:00', organizer='bench-organizer',
+                                  recurrence=parse_recurrence({'freq': 'daily'})))
+        self.series_id = series_collection.insert_one(series).inserted_id
+        self.series_starts = series['starts_at']
+        # Events and the series were inserted directly, so build their calendar buckets.
+        call_command('rebuild_calendar', stdout=io.StringIO())
+
+    def token(self, user_id, role='USER'):
+        import jwt
+        from django.conf import settings
+
+        payload = {'user_id': user_id, 'role': role, 'exp': datetime.utcnow() + timedelta(hours=2)}
+        return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+    def user(self, i):
+        return self.user_ids[i % len(self.user_ids)]
+
+    def scenarios(self):
+        """Return {name: request(i)}; each request is (method, path, body, token)."""
+        from events.recurrence import occurrence_id
+
+        admin = self.token(self.admin_id, 'ADMIN')
+        user = lambda i: self.token(self.user(i))
+        future = (datetime.utcnow() + timedelta(days=90)).strftime('%Y-%m-%d')
+        new_event = lambda i, venue: {'title': f'Created {i}', 'description': 'Benchmark', 'venue': f'{venue} {i}',
+                                      'date': future, 'time': '18:00', 'organizer': self.user(i)}
+        today = datetime.utcnow()
+        month = (today.strftime('%Y-%m-%d'), (today + timedelta(days=30)).strftime('%Y-%m-%d'))
+        pair = lambda i: (self.open_ids[i % len(self.open_ids)], self.user(i // len(self.open_ids)))
+        approvals = iter(self.approval_ids)
+        return {
+            'display_events': lambda i: ('GET', '/?limit=20', None, None),
+            'display_events_fields': lambda i: ('GET', '/?status=upcoming&limit=20&fields=description,capacity', None, None),
+            'display_event_by_id': lambda i: ('GET', f'/?id={self.event_ids[i % len(self.event_ids)]}', None, None),
+            'search': lambda i: ('GET', '/search/?q=benchmark&limit=20', None, None),
+            'calendar': lambda i: ('GET', f'/calendar/?from={month[0]}&to={month[1]}', None, None),
+            'series_occurrence_by_id': lambda i: ('GET', f'/?id={occurrence_id(self.series_id, self.series_starts + timedelta(days=i))}', None, None),
+            'my_events': lambda i: ('GET', '/myEvents/?limit=20', None, user(i)),
+            'export': lambda i: ('GET', '/export/?format=ndjson', None, admin),
+            'event_create': lambda i: ('POST', '/event/', new_event(i, 'Admin hall'), admin),
+            'event_update': lambda i: ('PUT', '/event/', {'event_id': self.owned[i % len(self.owned)][0], 'venue': f'Moved hall {i}'}, admin),
+            'series_create': lambda i: ('POST', '/event/', {**new_event(i, 'Series hall'), 'recurrence': {'freq': 'weekly', 'count': 10}}, admin),
+            'userevent_create': lambda i: ('POST', f'/userevent/?id={self.user(i)}', new_event(i, 'User hall'), user(i)),
+            'userevent_update': lambda i: ('PUT', '/userevent/', {'event_id': self.owned[i][0], 'user_id': self.owned[i][1], 'title': f'Renamed {i}'},
+                                           self.token(self.owned[i][1])),
+            'userevent_delete': lambda i: ('DELETE', '/userevent/', {'event_id': self.owned[i][0], 'user_id': self.owned[i][1]},
+                                           self.token(self.owned[i][1])),
+            'admin_approvals_list': lambda i: ('GET', '/adminApproval/?limit=20', None, admin),
+            'admin_approve': lambda i: ('POST', '/adminApproval/', {'approval_id': next(approvals), 'action': 'approve'}, admin),
+            'admin_approve_bulk': lambda i: ('POST', '/adminApproval/bulk/', {'items': [
+                {'approval_id': next(approvals), 'action': 'approve'} for _ in range(BULK_SIZE)]}, admin),
+            'admin_conflicts': lambda i: ('GET', f'/adminConflicts/?from={month[0]}&to={month[1]}', None, admin),
+            'register_event': lambda i: ('POST', '/registerEvent/', dict(zip(('event_id', 'user_id'), pair(i))), user(i)),
+            'cancel_registration': lambda i: ('DELETE', '/registerEvent/', dict(zip(('event_id', 'user_id'), pair(i))), user(i)),
+            'event_delete': lambda i: ('DELETE', '/event/', {'event_id': self.disposable_ids[i]}, admin),
+            'signup': lambda i: ('POST', '/auth/signup/', {'email': f'new-{self.run}-{i}@bench.invalid', 'username': 'new', 'password': PASSWORD}, None),
+            'signin': lambda i: ('POST', '/auth/signin/', {'email': f'bench-{i % len(self.user_ids)}@bench.invalid', 'password': PASSWORD}, None),
+        }
+
+
+def client_sender():
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(method, path, body, token):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(HTTP_HOST='localhost')
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        data = json.dumps(body) if body is not None else ''
+        response = client.generic(method, path, data, content_type='application/json', **extra)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    return send
+
+
+def start_http_server():
+    """Serve the WSGI app from a thread of this process, so it shares the database (even mongomock)."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+    from django.core.wsgi import get_wsgi_application
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), ThreadingWSGIServer, QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def http_sender(host, port):
+    def send(method, path, body, token):
+        headers = {'Content-Type': 'application/json', 'Connection': 'close'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    return send
+
+
+def drive(send, make_request, iterations, concurrency):
+    # Build every request up front so fixture bookkeeping stays out of the timings.
+    requests = [make_request(i) for i in range(iterations)]
+    samples = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def one(request):
+        start = time.perf_counter()
+        try:
+            status = send(*request)
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            samples.append(elapsed)
+            statuses[str(status)] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, requests))
+    elapsed = time.perf_counter() - start
+    return {'requests_per_sec': round(iterations / elapsed, 1), 'statuses': dict(statuses), **summarize(samples)}
+
+
+def reset_database():
+    from authentication.models import INDEXES as USER_INDEXES
+    from db_connection import connections, ensure_indexes
+    from events.cache import event_cache
+    from events.models import INDEXES as EVENT_INDEXES
+
+    connections.client.drop_database(connections.database.name)
+    ensure_indexes({**USER_INDEXES, **EVENT_INDEXES})
+    event_cache.invalidate()
+
+
+def run_pass(args, send, concurrency):
+    from authentication.hashing import hashing_pool
+
+    # Start the hashing workers now rather than inside the first signup.
+    hashing_pool.hash_password(PASSWORD)
+    reset_database()
+    fixture = Fixture(args)
+    fixture.seed()
+    results = {}
+    for name, make_request in fixture.scenarios().items():
+        if args.only and name not in args.only:
+            continue
+        iterations = min(args.iterations, args.slow_iterations) if name in SLOW else args.iterations
+        results[name] = drive(send, make_request, iterations, concurrency)
+        print(f"{name}: {results[name]['requests_per_sec']} req/s, p99 {results[name]['p99_ms']} ms",
+              file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    """Per scenario ratios of current to previous (below 1 is faster for latency)."""
+    report = {}
+    for mode, scenarios in current.items():
+        for name, now in scenarios.items():
+            before = previous.get(mode, {}).get(name)
+            if not before:
+                continue
+            report[f'{mode}/{name}'] = {
+                'p50_ratio': round(now['p50_ms'] / before['p50_ms'], 2) if before['p50_ms'] else None,
+                'p99_ratio': round(now['p99_ms'] / before['p99_ms'], 2) if before['p99_ms'] else None,
+                'throughput_ratio': round(now['requests_per_sec'] / before['requests_per_sec'], 2),
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--pending', type=int, default=100, help='Legacy pending_events requests.')
+    parser.add_argument('--approvals', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--slow-iterations', type=int, default=20, help=f"Iterations for {', '.join(SLOW)}.")
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients in the HTTP pass.')
+    parser.add_argument('--modes', default='client,http', help='Comma-separated: client, http.')
+    parser.add_argument('--only', type=lambda s: s.split(','), help='Comma-separated scenario names.')
+    parser.add_argument('--database', default=BENCH_DATABASE)
+    parser.add_argument('--mongomock', action='store_true', help='Run on the in-memory stand-in instead of DB_URI.')
+    parser.add_argument('--hash-iterations', type=int, help='PBKDF2 iterations for this run.')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout.')
+    parser.add_argument('--compare', help='Earlier JSON report to compare against.')
+    args = parser.parse_args()
+
+    if args.mongomock:
+        os.environ['DB_URI'] = 'mongomock://'
+    if args.hash_iterations:
+        os.environ['PASSWORD_HASH_ITERATIONS'] = str(args.hash_iterations)
+    # Tokens are minted here, so any key works when none is configured.
+    os.environ.setdefault('SECRET_KEY', 'benchmark-suite')
+    os.environ.setdefault('SECRET_ALGORITHM', 'HS256')
+    # Every request comes from one address; the suite measures the views, not the limiter.
+    os.environ['AUTH_RATE_LIMIT_ENABLED'] = 'false'
+    setup_django(args.database)
+    # Failing scenarios are already counted by status; skip a traceback per request.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    from db_connection import connections
+
+    results = {}
+    server = None
+    try:
+        modes = args.modes.split(',')
+        if 'client' in modes:
+            results['client'] = run_pass(args, client_sender(), 1)
+        if 'http' in modes:
+            server = start_http_server()
+            results['http'] = run_pass(args, http_sender(*server.server_address), args.concurrency)
+    finally:
+        if server:
+            server.shutdown()
+        connections.client.drop_database(args.database)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'backend': 'mongomock' if args.mongomock else 'mongodb',
+            'volumes': {'users': args.users, 'events': args.events, 'pending': args.pending, 'approvals': args.approvals},
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+        },
+        **results,
+    }
+    if args.compare:
+        report['comparison'] = compare(results, json.loads(Path(args.compare).read_text()))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Cost of the venue double-booking check and the admin conflict report.
+
+Seeds events at a few hundred venues, mostly without overlaps, and times
+find_conflicts() for free and taken slots (the query event and userevent run
+before every write that books a venue), then the adminConflicts/ report over
+one month:
+
+    python -m benchmarks.venue_conflicts --events 1000000 --iterations 1000
+
+The check should stay under a millisecond however many events there are;
+pass --keep to reuse the seeded events on the next run with --no-seed.
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.common import BENCH_MARKER, cleanup, measure, setup_django
+
+VENUES = 500
+# Every SLOT minutes each venue hosts one event, shorter than the slot.
+SLOT = 180
+
+
+def seed_venue_events(count, batch_size=10000):
+    from events.models import Event, event_collection
+
+    rng = random.Random(42)
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    batch = []
+    for i in range(count):
+        starts = start + timedelta(minutes=(i // VENUES) * SLOT)
+        doc = Event(
+            title=f'Booking {i}',
+            description='Seeded by the venue conflict benchmark.',
+            venue=f'Hall {i % VENUES}',
+            date=starts.strftime('%Y-%m-%d'),
+            time=starts.strftime('%H:%M:%S'),
+            organizer=f'organizer-{i % 500}',
+            duration=rng.choice((60, 90, 120, 150)),
+        ).to_dict()
+        doc[BENCH_MARKER] = True
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            event_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        event_collection.insert_many(batch, ordered=False)
+    return start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--no-seed', action='store_true', help='Reuse events left by an earlier --keep run.')
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded events in place.')
+    args = parser.parse_args()
+
+    setup_django()
+    from events.conflicts import conflict_report, find_conflicts
+    from events.models import event_collection
+
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    if not args.no_seed:
+        start = seed_venue_events(args.events)
+    slots = max(1, args.events // VENUES)
+    rng = random.Random(7)
+
+    def slot(offset):
+        starts_at = start + timedelta(minutes=rng.randrange(slots) * SLOT + offset)
+        return f'Hall {rng.randrange(VENUES)}', starts_at, starts_at + timedelta(minutes=30)
+
+    try:
+        results = {
+            # The half hour before the next booking, which even the longest event leaves free.
+            'free_slot': measure(lambda: find_conflicts(*slot(150)), args.iterations),
+            'taken_slot': measure(lambda: find_conflicts(*slot(15)), args.iterations),
+            'report_month': measure(lambda: conflict_report(start, start + timedelta(days=30)),
+                                    max(1, args.iterations // 100)),
+            'events': event_collection.count_documents({BENCH_MARKER: True}),
+        }
+        results['check_under_1ms'] = results['free_slot']['p99_ms'] < 1 and results['taken_slot']['p99_ms'] < 1
+        print(json.dumps(results, indent=2))
+    finally:
+        if not args.keep:
+            cleanup(event_collection)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,425 @@
+"""Lazily created, fork-aware MongoClient shared by the whole project.
+
+`db` keeps the old module-level interface (`db['events']`), but nothing
+touches the network until a collection is first used. Client options come
+from the MONGO setting, so pool sizes and timeouts can be tuned per
+deployment without code changes.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import weakref
+
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = MongoClient(os.getenv('DB_URI'), server_api=ServerApi('1'))
-db=client["event_management_system"]
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'URI': os.getenv('DB_URI'),
+    'NAME': 'event_management_system',
+    'MAX_POOL_SIZE': 100,
+    'MIN_POOL_SIZE': 0,
+    'MAX_IDLE_TIME_MS': None,
+    'CONNECT_TIMEOUT_MS': 20000,
+    'SERVER_SELECTION_TIMEOUT_MS': 30000,
+    'SOCKET_TIMEOUT_MS': None,
+    'WAIT_QUEUE_TIMEOUT_MS': None,
+    'READ_PREFERENCE': 'primary',
+    'WRITE_CONCERN': {},
+}
+
+
+def get_config():
+    from django.conf import settings
+
+    config = dict(DEFAULTS)
+    if settings.configured:
+        config.update(getattr(settings, 'MONGO', {}))
+    return config
+
+
+def client_options(config):
+    """Translate the MONGO setting into MongoClient keyword arguments."""
+    options = {
+        'maxPoolSize': config['MAX_POOL_SIZE'],
+        'minPoolSize': config['MIN_POOL_SIZE'],
+        'connectTimeoutMS': config['CONNECT_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': config['SERVER_SELECTION_TIMEOUT_MS'],
+        'readPreference': config['READ_PREFERENCE'],
+    }
+    for key, option in (('MAX_IDLE_TIME_MS', 'maxIdleTimeMS'),
+                        ('SOCKET_TIMEOUT_MS', 'socketTimeoutMS'),
+                        ('WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS')):
+        if config[key] is not None:
+            options[option] = config[key]
+    # e.g. {'w': 'majority', 'wTimeoutMS': 5000, 'journal': True}
+    options.update(config['WRITE_CONCERN'])
+    return options
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so health checks can report pool usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.checkout_failures = 0
+        self.pools_cleared = 0
+
+    def _incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        self._incr('checked_in')
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'open_connections': self.created - self.closed,
+                'in_use': self.checked_out - self.checked_in,
+                'created': self.created,
+                'closed': self.closed,
+                'checkouts': self.checked_out,
+                'checkout_failures': self.checkout_failures,
+                'pools_cleared': self.pools_cleared,
+            }
+
+
+class CommandTally:
+    """Commands issued, and time spent in them, on behalf of one request."""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# The tally of the request being served; Motor copies the context into its
+# executor threads, so async views are counted too.
+current_tally = contextvars.ContextVar('mongo_command_tally', default=None)
+
+
+class CommandStatsListener(monitoring.CommandListener):
+    """Times every command, per command name and for the current request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.commands = {}
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, False)
+
+    def failed(self, event):
+        self._record(event, True)
+
+    def _record(self, event, failed):
+        seconds = event.duration_micros / 1e6
+        tally = current_tally.get()
+        if tally is not None:
+            tally.count += 1
+            tally.seconds += seconds
+        with self._lock:
+            count, failures, total = self.commands.get(event.command_name, (0, 0, 0.0))
+            self.commands[event.command_name] = (count + 1, failures + failed, total + seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.commands)
+
+
+command_stats = CommandStatsListener()
+
+
+class ConnectionManager:
+    def __init__(self):
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pool_stats = PoolStatsListener()
+        self.transactions_supported = None
+
+    def _create_client(self, config):
+        if (config['URI'] or '').startswith('mongomock://'):
+            # In-memory stand-in for offline benchmarks (requirements-dev.txt).
+            # It lacks $text, $lookup pipelines and transactions, and every
+            # process gets its own empty store.
+            import mongomock
+            return mongomock.MongoClient()
+        return MongoClient(
+            config['URI'],
+            server_api=ServerApi('1'),
+            event_listeners=[self.pool_stats, command_stats],
+            # Connecting happens on first use, never at import time.
+            connect=False,
+            **client_options(config)
+        )
+
+    @property
+    def client(self):
+        # A client inherited across fork() shares sockets with the parent, so
+        # each process builds its own on first use.
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._create_client(get_config())
+                    self._pid = os.getpid()
+                    self.pool_stats.reset()
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[get_config()['NAME']]
+
+    def reset(self):
+        """Forget the current client without closing the parent's sockets."""
+        self._client = None
+        self._pid = None
+        self.transactions_supported = None
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self.reset()
+
+    def health(self):
+        """Ping the server and return (ok, report)."""
+        config = get_config()
+        report = {
+            'database': config['NAME'],
+            'max_pool_size': config['MAX_POOL_SIZE'],
+            'min_pool_size': config['MIN_POOL_SIZE'],
+            'read_preference': config['READ_PREFERENCE'],
+        }
+        start = time.perf_counter()
+        try:
+            self.client.admin.command('ping')
+            ok = True
+        except Exception as e:
+            ok = False
+            report['error'] = str(e)
+        report['ping_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        report['pool'] = self.pool_stats.snapshot()
+        return ok, report
+
+
+class AsyncConnectionManager:
+    """Motor clients for the ASGI views.
+
+    A Motor client is tied to the event loop it was created on, so there is
+    one per running loop; in a uvicorn worker that is exactly one.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self.transactions_supported = None
+
+    @property
+    def client(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            config = get_config()
+            if (config['URI'] or '').startswith('mongomock://'):
+                # Shares the sync client's in-memory store (requirements-dev.txt).
+                from mongomock_motor import AsyncMongoMockClient
+                client = AsyncMongoMockClient(mock_mongo_client=connections.client)
+            else:
+                client = AsyncIOMotorClient(config['URI'], server_api=ServerApi('1'), io_loop=loop,
+                                            event_listeners=[command_stats], **client_options(config))
+            self._clients[loop] = client
+        return client
+
+    @property
+    def database(self):
+        return self.client[get_config()['NAME']]
+
+    def reset(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self.transactions_supported = None
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection until it is first used."""
+
+    def __init__(self, manager, name):
+        self._manager = manager
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = self._manager.client
+        if self._client is not client:
+            self._collection = self._manager.database[self._name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._resolve(), attr)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+
+class LazyDatabase:
+    def __init__(self, manager):
+        self._manager = manager
+
+    def __getitem__(self, name):
+        return LazyCollection(self._manager, name)
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._manager.database, attr)
+
+
+connections = ConnectionManager()
+os.register_at_fork(after_in_child=connections.reset)
+
+async_connections = AsyncConnectionManager()
+os.register_at_fork(after_in_child=async_connections.reset)
+
+db = LazyDatabase(connections)
+
+
+def get_client():
+    return connections.client
+
+
+def ensure_indexes(indexes):
+    """Create the declared indexes, returning {collection name: index names}.
+
+    `indexes` maps collections to lists of IndexModel. createIndexes is a
+    no-op for an index that already exists with the same definition, so this
+    is safe to run on every start.
+    """
+    return {collection.name: collection.create_indexes(models) for collection, models in indexes.items()}
+
+
+def ensure_indexes_on_startup(indexes):
+    """AppConfig.ready() hook: create indexes when MONGO_ENSURE_INDEXES is on.
+
+    Off by default; deploys run `manage.py ensure_indexes` instead. When it
+    is on, the work happens in a daemon thread so an unreachable server does
+    not hold up process start for the server selection timeout.
+    """
+    from django.conf import settings
+
+    if not getattr(settings, 'MONGO_ENSURE_INDEXES', False):
+        return
+
+    def create():
+        for collection, models in indexes.items():
+            try:
+                collection.create_indexes(models)
+            except Exception:
+                logger.exception('Could not create indexes on %s', collection.name)
+
+    threading.Thread(target=create, name='ensure-indexes', daemon=True).start()
+
+
+def run_transaction(callback):
+    """Run callback(session) inside a transaction when the server supports it.
+
+    Standalone servers reject transactions; there callback(None) runs the
+    same writes without one, and callers are expected to compensate.
+    """
+    if connections.transactions_supported is False:
+        return callback(None)
+    try:
+        with connections.client.start_session() as session:
+            result = session.with_transaction(callback)
+        connections.transactions_supported = True
+        return result
+    except OperationFailure as e:
+        # IllegalOperation: "Transaction numbers are only allowed on a replica
+        # set member or mongos". Nothing was written, so just run it bare.
+        if e.code != 20 or connections.transactions_supported:
+            raise
+    except NotImplementedError:
+        # In-memory stand-ins such as mongomock have no sessions.
+        pass
+    connections.transactions_supported = False
+    return callback(None)
+
+
+def get_async_db():
+    return async_connections.database
+
 
-try:
-    client.admin.command('ping')
-    # print("hello")
-except Exception as e:
-    print(e)
\ No newline at end of file
+async def run_transaction_async(callback):
+    """Async counterpart of run_transaction for Motor; awaits callback(session)."""
+    if async_connections.transactions_supported is False:
+        return await callback(None)
+    try:
+        async with await async_connections.client.start_session() as session:
+            result = await session.with_transaction(callback)
+        async_connections.transactions_supported = True
+        return result
+    except OperationFailure as e:
+        if e.code != 20 or async_connections.transactions_supported:
+            raise
+    except NotImplementedError:
+        pass
+    async_connections.transactions_supported = False
+    return await callback(None)
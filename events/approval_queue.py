@@ -0,0 +1,226 @@
+"""Write-behind queue for approval requests submitted through userevent.
+
+With APPROVAL_QUEUE['ENABLED'], a submission is appended to a journal on
+local disk and acknowledged straight away; a background thread inserts the
+queued approvals with insert_many once BATCH_SIZE are waiting or every
+FLUSH_INTERVAL seconds, and drains the rest when the process exits.
+
+Each approval gets its _id when queued, which is also the tracking id
+returned to the client, so replaying a journal after a crash cannot insert
+it twice. Journals are BSON segments named after the owning process, which
+holds a lock file for its lifetime; a starting worker replays segments whose
+owner is gone.
+"""
+import atexit
+import fcntl
+import glob
+import logging
+import os
+import threading
+from collections import deque
+from pathlib import Path
+
+import bson
+from bson.errors import InvalidBSON
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+
+from .models import approval_collection
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DIRECTORY': None,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_PENDING': 10000,
+    'FSYNC': False,
+}
+
+DUPLICATE_KEY = 11000
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'APPROVAL_QUEUE', {}))
+    if config['DIRECTORY'] is None:
+        config['DIRECTORY'] = Path(settings.BASE_DIR) / 'var' / 'approval-queue'
+    return config
+
+
+class QueueFull(Exception):
+    pass
+
+
+def insert_approvals(docs):
+    """insert_many that treats already-inserted approvals as done."""
+    try:
+        approval_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+            raise
+
+
+def read_segment(path):
+    docs = []
+    with open(path, 'rb') as f:
+        try:
+            for doc in bson.decode_file_iter(f):
+                docs.append(doc)
+        except InvalidBSON:
+            # A write cut short by a crash; everything before it is intact.
+            logger.warning('Ignoring truncated record at the end of %s', path)
+    return docs
+
+
+class ApprovalQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pending = deque()
+        self._pid = None
+        self._thread = None
+        self._stopping = False
+        self._lock_file = None
+        self._segment = None
+        self._segment_number = 0
+        # Segments whose approvals are all in _pending, oldest first.
+        self._sealed = []
+
+    @property
+    def enabled(self):
+        return get_config()['ENABLED']
+
+    def pending(self):
+        return len(self._pending)
+
+    def enqueue(self, doc):
+        """Journal `doc` for a later insert and return its tracking id.
+
+        Raises QueueFull when MAX_PENDING approvals are already waiting, so the
+        caller can write it synchronously instead.
+        """
+        config = get_config()
+        with self._lock:
+            self._start(config)
+            if len(self._pending) >= config['MAX_PENDING']:
+                raise QueueFull('Approval queue is full')
+            doc.setdefault('_id', bson.ObjectId())
+            self._segment.write(bson.encode(doc))
+            self._segment.flush()
+            if config['FSYNC']:
+                os.fsync(self._segment.fileno())
+            self._pending.append(doc)
+            if len(self._pending) >= config['BATCH_SIZE']:
+                self._wakeup.set()
+        return str(doc['_id'])
+
+    def _start(self, config):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        directory = Path(config['DIRECTORY'])
+        directory.mkdir(parents=True, exist_ok=True)
+        self._pid = os.getpid()
+        self._lock_file = open(directory / f'{self._pid}.lock', 'w')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._recover(directory)
+        self._open_segment(directory)
+        self._thread = threading.Thread(target=self._run, name='approval-queue', daemon=True)
+        self._thread.start()
+
+    def _recover(self, directory):
+        """Replay the segments of workers that exited before draining."""
+        for lock_path in glob.glob(str(directory / '*.lock')):
+            owner = Path(lock_path).stem
+            if owner == str(self._pid):
+                # Left by an earlier process that had the same pid.
+                self._replay(directory, owner)
+                continue
+            with open(lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # still running
+                self._replay(directory, owner)
+                Path(lock_path).unlink(missing_ok=True)
+
+    def _replay(self, directory, owner):
+        for segment in sorted(glob.glob(str(directory / f'{owner}-*.bson'))):
+            docs = read_segment(segment)
+            if docs:
+                insert_approvals(docs)
+            os.remove(segment)
+            logger.info('Recovered %d queued approvals from %s', len(docs), segment)
+
+    def _open_segment(self, directory):
+        self._segment_number += 1
+        self._segment = open(directory / f'{self._pid}-{self._segment_number:08d}.bson', 'ab')
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(get_config()['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing queued approvals failed; will retry')
+
+    def flush(self):
+        """Insert everything queued so far, BATCH_SIZE approvals per insert_many."""
+        with self._flushing:
+            return self._flush(get_config())
+
+    def _flush(self, config):
+        with self._lock:
+            if not self._pending or self._segment is None:
+                return 0
+            # Seal the current segment so its file can go once it is inserted.
+            self._segment.close()
+            self._sealed.append(self._segment.name)
+            self._open_segment(Path(config['DIRECTORY']))
+            batch = list(self._pending)
+            sealed = list(self._sealed)
+        for start in range(0, len(batch), config['BATCH_SIZE']):
+            insert_approvals(batch[start:start + config['BATCH_SIZE']])
+        with self._lock:
+            for _ in batch:
+                self._pending.popleft()
+            for name in sealed:
+                os.remove(name)
+                self._sealed.remove(name)
+        return len(batch)
+
+    def close(self):
+        """Stop the flusher and drain what is left; registered with atexit."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not drain queued approvals; they stay journaled for the next worker')
+            return
+        self._segment.close()
+        os.remove(self._segment.name)
+        os.remove(self._lock_file.name)
+        self._lock_file.close()
+        self._thread = None
+
+    def reset(self):
+        # A forked child must not share the parent's journal or thread.
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset_state()
+
+
+approval_queue = ApprovalQueue()
+atexit.register(approval_queue.close)
+os.register_at_fork(after_in_child=approval_queue.reset)
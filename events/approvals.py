@@ -0,0 +1,511 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db_connection import run_transaction, run_transaction_async
+from .approval_queue import QueueFull, approval_queue
+from .calendar import arefresh_days, refresh_days, touched_days
+from .conflicts import CONFLICT_MESSAGE, acheck_slot, check_slot, find_conflicts, slot_after, touches_schedule
+from .models import event_collection, approval_collection, pending_events_collection
+from .pagination import decode_cursor, encode_cursor
+
+ACTIONS = ('approve', 'reject')
+
+# How long a bulk run may hold approvals before others can claim them again.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+class ApprovalError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def unclaimed(now):
+    """Filter for approvals nobody has decided or is currently deciding."""
+    return {
+        'approved': None,
+        '$or': [{'claimed_at': None}, {'claimed_at': {'$lte': now - CLAIM_TIMEOUT}}],
+    }
+
+
+def claim_filter(approval_id, now):
+    return {'_id': ObjectId(approval_id), **unclaimed(now)}
+
+
+def claim_update(approved, now):
+    return {'$set': {'approved': approved, 'decided_at': now}}
+
+
+# Puts a claimed approval back to pending.
+RELEASE = {'$set': {'approved': None}, '$unset': {'decided_at': ''}}
+
+
+def unclaimable(exists):
+    """Error for an approval that could not be claimed."""
+    if exists:
+        return ApprovalError('Approval request has already been processed.', 409)
+    return ApprovalError('Approval request not found.', 404)
+
+
+def write_failed():
+    return ApprovalError('Action could not be processed successfully, Try again', 500)
+
+
+def is_legacy(approval):
+    """Whether the request keeps its payload in pending_events."""
+    return approval.get('payload') is None and approval['action'] != 'delete'
+
+
+def claim_approval(approval_id, approved, session=None):
+    """Atomically mark a still-pending approval as decided and return it.
+
+    Filtering on `approved: None` means two admins deciding the same request
+    concurrently cannot both apply it.
+    """
+    now = datetime.utcnow()
+    approval = approval_collection.find_one_and_update(
+        claim_filter(approval_id, now),
+        claim_update(approved, now),
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if approval is None:
+        raise unclaimable(approval_collection.find_one({'_id': ObjectId(approval_id)}, {'_id': 1}, session=session))
+    return approval
+
+
+def release_approval(approval_id):
+    approval_collection.update_one({'_id': ObjectId(approval_id)}, RELEASE)
+
+
+def pending_payload(approval, session=None):
+    """Return the event document an approval would write.
+
+    Requests made before payloads were embedded in the approval keep theirs
+    in pending_events under the event's id.
+    """
+    if approval.get('payload') is not None:
+        return approval['payload']
+    payload = pending_events_collection.find_one({'_id': ObjectId(approval['event_id'])}, {'_id': 0}, session=session)
+    if payload is None:
+        raise write_failed()
+    return payload
+
+
+def event_write(approval, payload=None):
+    """Return the write to event_collection an approved request asks for.
+
+    `payload` is the pending_events document for legacy requests.
+    """
+    event_filter = {'_id': ObjectId(approval['event_id'])}
+    if approval['action'] == 'post':
+        return InsertOne({**(approval.get('payload') or payload), **event_filter})
+    if approval['action'] == 'put':
+        if approval.get('payload') is not None:
+            return UpdateOne(event_filter, {'$set': approval['payload']})
+        # Legacy pending copies predate registrations; never let their
+        # attendee fields overwrite the live count.
+        fields = {k: v for k, v in payload.items() if k not in ('attendees', 'attendee_count')}
+        return UpdateOne(event_filter, {'$set': fields})
+    return DeleteOne(event_filter)
+
+
+# Fields of the current event that place it in time and at a venue.
+SLOT_FIELDS = {'venue': 1, 'starts_at': 1, 'duration': 1}
+
+
+def approval_slot(approval, payload=None, current=None):
+    """Return the (venue, starts_at, ends_at) an approved request books, or None.
+
+    Requests are checked for conflicts when submitted, but other events may
+    have taken the slot since, so approvals check again. ends_at is
+    recomputed into the write, so the stored interval matches the duration
+    even for legacy payloads. Updates to legacy events with no venue or
+    starts_at have no slot to check.
+    """
+    if approval['action'] == 'delete':
+        return None
+    changes = approval.get('payload') or payload
+    if approval['action'] == 'put' and not touches_schedule(changes):
+        return None
+    slot = slot_after(changes, current)
+    if slot:
+        changes['ends_at'] = slot[2]
+    return slot
+
+
+def approval_days(approval, payload=None, previous=None):
+    """Calendar days an approved request changes.
+
+    `previous` is the event's start before the write, for updates and deletes.
+    """
+    starts_at = None
+    if approval['action'] != 'delete':
+        starts_at = (approval.get('payload') or payload or {}).get('starts_at')
+    return touched_days(previous, starts_at)
+
+
+def check_applied(approval, result):
+    """Raise if an update or delete found no event to change."""
+    if approval['action'] in ('put', 'delete') and result.matched_count + result.deleted_count == 0:
+        raise write_failed()
+
+
+def apply_approval(approval, session=None):
+    """Write the event change an approved request asks for; return the days it touched."""
+    payload = None
+    if approval['action'] != 'delete':
+        payload = pending_payload(approval, session)
+    current = None
+    if approval['action'] != 'post':
+        current = event_collection.find_one({'_id': ObjectId(approval['event_id'])}, SLOT_FIELDS, session=session)
+        if current is None:
+            raise write_failed()
+    slot = approval_slot(approval, payload, current)
+    if slot:
+        check_slot(*slot, exclude_id=ObjectId(approval['event_id']), session=session)
+    previous = current.get('starts_at') if current else None
+    check_applied(approval, event_collection.bulk_write([event_write(approval, payload)], session=session))
+    return approval_days(approval, payload, previous)
+
+
+async def aapply_approval(db, approval, session=None):
+    """apply_approval for the Motor views."""
+    events = db['events']
+    payload = None
+    if approval['action'] != 'delete':
+        payload = approval.get('payload')
+        if payload is None:
+            payload = await db['pending_events'].find_one({'_id': ObjectId(approval['event_id'])}, {'_id': 0},
+                                                          session=session)
+            if payload is None:
+                raise write_failed()
+    current = None
+    if approval['action'] != 'post':
+        current = await events.find_one({'_id': ObjectId(approval['event_id'])}, SLOT_FIELDS, session=session)
+        if current is None:
+            raise write_failed()
+    slot = approval_slot(approval, payload, current)
+    if slot:
+        await acheck_slot(events, *slot, exclude_id=ObjectId(approval['event_id']), session=session)
+    previous = current.get('starts_at') if current else None
+    check_applied(approval, await events.bulk_write([event_write(approval, payload)], session=session))
+    return approval_days(approval, payload, previous)
+
+
+def decide(approval_id, action):
+    """Approve or reject one request as a single unit of work.
+
+    On a replica set the claim and the event write commit together in a
+    transaction. On a standalone server the claim is released again if the
+    event write fails, so the request can be retried.
+    """
+    approve = action == 'approve'
+
+    def unit(session):
+        approval = claim_approval(approval_id, approve, session)
+        days = set()
+        try:
+            if approve:
+                days = apply_approval(approval, session)
+            if is_legacy(approval):
+                pending_events_collection.delete_one({'_id': ObjectId(approval['event_id'])}, session=session)
+        except Exception:
+            if session is None:
+                release_approval(approval_id)
+            raise
+        return approval, days
+
+    approval, days = run_transaction(unit)
+    # Calendar buckets are derived data; refresh them once the write is in.
+    refresh_days(days)
+    return approval
+
+
+async def adecide(db, approval_id, action):
+    """decide for the Motor views."""
+    approve = action == 'approve'
+    approvals = db['approvals']
+
+    async def unit(session):
+        now = datetime.utcnow()
+        approval = await approvals.find_one_and_update(
+            claim_filter(approval_id, now),
+            claim_update(approve, now),
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if approval is None:
+            raise unclaimable(await approvals.find_one({'_id': ObjectId(approval_id)}, {'_id': 1}, session=session))
+        days = set()
+        try:
+            if approve:
+                days = await aapply_approval(db, approval, session)
+            if is_legacy(approval):
+                await db['pending_events'].delete_one({'_id': ObjectId(approval['event_id'])}, session=session)
+        except Exception:
+            if session is None:
+                await approvals.update_one({'_id': ObjectId(approval_id)}, RELEASE)
+            raise
+        return approval, days
+
+    approval, days = await run_transaction_async(unit)
+    await arefresh_days(db, days)
+    return approval
+
+
+def decide_many(items):
+    """Approve or reject many requests with a fixed number of round trips.
+
+    `items` is a list of {'approval_id', 'action'} dicts. Approvals are
+    claimed in one update_many, the event writes are grouped by request
+    action ('post', 'put', 'delete') into one unordered bulk_write, and the
+    decisions are recorded in another. Approved posts, and puts that move an
+    event, also cost one indexed venue conflict query each. Items fail
+    independently; a failed item is released and stays pending.
+
+    Returns (results, changed_event_ids) with one result per item, in order.
+    """
+    now = datetime.utcnow()
+    token = ObjectId()
+    results = []
+    decisions = {}
+    for item in items:
+        approval_id = item.get('approval_id') if isinstance(item, dict) else None
+        result = {'approval_id': approval_id}
+        results.append(result)
+        action = item.get('action') if isinstance(item, dict) else None
+        try:
+            oid = ObjectId(approval_id)
+        except (InvalidId, TypeError):
+            result.update(status='error', error='Invalid approval id', code=400)
+            continue
+        if action not in ACTIONS:
+            result.update(status='error', error="Action must be either 'approve' or 'reject'", code=400)
+        elif oid in decisions:
+            result.update(status='error', error='Duplicate approval id', code=400)
+        else:
+            decisions[oid] = (action, result)
+
+    if not decisions:
+        return results, []
+
+    ids = list(decisions)
+    approval_collection.update_many(
+        {'_id': {'$in': ids}, **unclaimed(now)},
+        {'$set': {'claimed_by': token, 'claimed_at': now}}
+    )
+    claimed = {a['_id']: a for a in approval_collection.find({'_id': {'$in': ids}, 'claimed_by': token})}
+
+    missing = [oid for oid in ids if oid not in claimed]
+    if missing:
+        existing = {a['_id'] for a in approval_collection.find({'_id': {'$in': missing}}, {'_id': 1})}
+        for oid in missing:
+            if oid in existing:
+                decisions[oid][1].update(status='error', error='Approval request has already been processed.', code=409)
+            else:
+                decisions[oid][1].update(status='error', error='Approval request not found.', code=404)
+
+    by_action = defaultdict(list)
+    for oid, approval in claimed.items():
+        by_action[approval['action']].append(approval)
+
+    approved = lambda approval: decisions[approval['_id']][0] == 'approve'
+    failed = set()
+
+    def fail(approval, message, code):
+        failed.add(approval['_id'])
+        decisions[approval['_id']][1].update(status='error', error=message, code=code)
+
+    # Legacy requests keep their payload in pending_events; read them in one go.
+    legacy = [ObjectId(a['event_id']) for a in claimed.values() if approved(a) and is_legacy(a)]
+    legacy_payloads = {}
+    if legacy:
+        for doc in pending_events_collection.find({'_id': {'$in': legacy}}):
+            legacy_payloads[str(doc.pop('_id'))] = doc
+
+    # Updates and deletes report no per-item error when the event is gone, so
+    # check which targets still exist up front.
+    targets = [ObjectId(a['event_id']) for action in ('put', 'delete')
+               for a in by_action[action] if approved(a)]
+    existing_events = {}
+    if targets:
+        existing_events = {str(e['_id']): e for e in event_collection.find({'_id': {'$in': targets}}, SLOT_FIELDS)}
+
+    # Slots taken by earlier items of this batch, which the database cannot see yet.
+    booked = defaultdict(list)
+
+    def double_booked(approval, slot):
+        if slot is None:
+            return False
+        venue, starts_at, ends_at = slot
+        if any(start < ends_at and starts_at < end for start, end in booked[venue]):
+            return True
+        if find_conflicts(venue, starts_at, ends_at, exclude_id=ObjectId(approval['event_id'])):
+            return True
+        booked[venue].append((starts_at, ends_at))
+        return False
+
+    event_ops, owners = [], []
+    for action in ('post', 'put', 'delete'):
+        for approval in by_action[action]:
+            if not approved(approval):
+                continue
+            payload = legacy_payloads.get(approval['event_id'])
+            if is_legacy(approval) and payload is None:
+                fail(approval, 'Action could not be processed successfully, Try again', 500)
+            elif action != 'post' and approval['event_id'] not in existing_events:
+                fail(approval, 'Action could not be processed successfully, Try again', 500)
+            elif double_booked(approval, approval_slot(approval, payload, existing_events.get(approval['event_id']))):
+                fail(approval, CONFLICT_MESSAGE, 409)
+            else:
+                event_ops.append(event_write(approval, payload))
+                owners.append(approval)
+    if event_ops:
+        try:
+            event_collection.bulk_write(event_ops, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                fail(owners[error['index']], 'Action could not be processed successfully, Try again', 500)
+
+    pending_ops, approval_ops, changed, days = [], [], [], set()
+    for oid, approval in claimed.items():
+        if oid in failed:
+            approval_ops.append(UpdateOne(
+                {'_id': oid, 'claimed_by': token},
+                {'$unset': {'claimed_by': '', 'claimed_at': ''}}
+            ))
+            continue
+        approval_ops.append(UpdateOne(
+            {'_id': oid, 'claimed_by': token},
+            {'$set': {'approved': approved(approval), 'decided_at': now},
+             '$unset': {'claimed_by': '', 'claimed_at': ''}}
+        ))
+        if is_legacy(approval):
+            pending_ops.append(DeleteOne({'_id': ObjectId(approval['event_id'])}))
+        if approved(approval):
+            changed.append(approval['event_id'])
+            previous = existing_events.get(approval['event_id'], {}).get('starts_at')
+            days |= approval_days(approval, legacy_payloads.get(approval['event_id']), previous)
+        decisions[oid][1].update(status='approved' if approved(approval) else 'rejected')
+    if pending_ops:
+        pending_events_collection.bulk_write(pending_ops, ordered=False)
+    if approval_ops:
+        approval_collection.bulk_write(approval_ops, ordered=False)
+    refresh_days(days)
+    return results, changed
+
+
+def queue_approval(approval):
+    """Hand an approval to the write-behind queue and return its tracking id.
+
+    None means it must be inserted now: the queue is disabled or full.
+    """
+    if not approval_queue.enabled:
+        return None
+    try:
+        return approval_queue.enqueue(approval.to_dict())
+    except QueueFull:
+        return None
+
+
+def submit(approval):
+    """Store a new approval request; return (tracking_id, queued).
+
+    queued is True when the write-behind queue took it and the insert is
+    still to come.
+    """
+    tracking_id = queue_approval(approval)
+    if tracking_id:
+        return tracking_id, True
+    return str(approval_collection.insert_one(approval.to_dict()).inserted_id), False
+
+
+async def asubmit(db, approval):
+    """submit for the Motor views."""
+    if approval_queue.enabled:
+        # Enqueueing locks and appends to the journal file; keep that off the event loop.
+        tracking_id = await asyncio.to_thread(queue_approval, approval)
+        if tracking_id:
+            return tracking_id, True
+    return str((await db['approvals'].insert_one(approval.to_dict())).inserted_id), False
+
+
+SUMMARY_FIELDS = ('title', 'venue', 'date', 'time', 'starts_at', 'organizer')
+APPROVAL_FIELDS = ('event_id', 'user_id', 'action', 'approved', 'requested_at')
+
+
+def pending_pipeline(limit, cursor=None, action=None, user_id=None, include_event=False):
+    """Aggregation for one page of undecided approvals, oldest first.
+
+    With include_event, each approval carries an `event` summary of what it
+    would produce: the embedded payload merged over the current event (or the
+    legacy pending_events document), computed in the same aggregation.
+    """
+    match = {'approved': None}
+    if action:
+        match['action'] = action
+    if user_id:
+        match['user_id'] = user_id
+    if cursor:
+        requested_at, approval_id = decode_cursor(cursor)
+        match['$or'] = [
+            {'requested_at': {'$gt': requested_at}},
+            {'requested_at': requested_at, '_id': {'$gt': approval_id}},
+        ]
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'requested_at': 1, '_id': 1}},
+        {'$limit': limit + 1},
+    ]
+    if include_event:
+        pipeline.append({'$addFields': {'event_oid': {
+            '$convert': {'input': '$event_id', 'to': 'objectId', 'onError': None}
+        }}})
+        for source, alias in (('events', 'current_event'), ('pending_events', 'legacy_event')):
+            pipeline.append({'$lookup': {
+                'from': source,
+                'localField': 'event_oid',
+                'foreignField': '_id',
+                'as': alias,
+            }})
+        pipeline.append({'$addFields': {'event': {'$mergeObjects': [
+            {'$arrayElemAt': ['$current_event', 0]},
+            {'$arrayElemAt': ['$legacy_event', 0]},
+            {'$ifNull': ['$payload', {}]},
+        ]}}})
+        pipeline.append({'$project': {
+            **{field: 1 for field in APPROVAL_FIELDS},
+            **{f'event.{field}': 1 for field in SUMMARY_FIELDS},
+        }})
+    else:
+        pipeline.append({'$project': {field: 1 for field in APPROVAL_FIELDS}})
+    return pipeline
+
+
+def pending_result(approvals, limit):
+    next_cursor = encode_cursor(approvals[limit - 1], 'requested_at') if len(approvals) > limit else None
+    approvals = approvals[:limit]
+    for approval in approvals:
+        approval['_id'] = str(approval['_id'])
+    return approvals, next_cursor
+
+
+def pending_page(limit, cursor=None, action=None, user_id=None, include_event=False):
+    """Return one page of undecided approvals and the next cursor."""
+    pipeline = pending_pipeline(limit, cursor, action, user_id, include_event)
+    return pending_result(list(approval_collection.aggregate(pipeline)), limit)
+
+
+async def apending_page(db, limit, cursor=None, action=None, user_id=None, include_event=False):
+    """pending_page for the Motor views."""
+    pipeline = pending_pipeline(limit, cursor, action, user_id, include_event)
+    return pending_result(await db['approvals'].aggregate(pipeline).to_list(None), limit)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
+
+    def ready(self):
+        from db_connection import ensure_indexes_on_startup
+        from .models import INDEXES
+        ensure_indexes_on_startup(INDEXES)
@@ -0,0 +1,13 @@
+from django.urls import path
+from .async_views import event,display_events,live_events,my_events,calendar,userevent,admin_approve_event,register_event
+
+urlpatterns = [
+    path('event/', event, name='async_event'),
+    path('',display_events,name='async_display_events'),
+    path('live/',live_events,name='async_live_events'),
+    path('myEvents/',my_events,name='async_my_events'),
+    path('calendar/',calendar,name='async_calendar'),
+    path('userevent/',userevent,name='async_userevent'),
+    path('adminApproval/',admin_approve_event,name='async_admin_approve_event'),
+    path('registerEvent/',register_event,name="async_register_event")
+]
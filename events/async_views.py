@@ -0,0 +1,376 @@
+"""Async counterparts of the event views, for serving under ASGI.
+
+They mirror events.views request for request but talk to MongoDB through
+Motor, so one worker can keep many database calls in flight. Independent
+round trips (the upcoming and past pages) are issued concurrently.
+
+Validation, filters and payloads come from the domain modules (changes,
+approvals, registrations, recurrence), next to the sync code using them;
+these views only do the I/O, and keep blocking calls off the event loop.
+"""
+import asyncio
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from django.http import HttpResponseNotAllowed, StreamingHttpResponse
+
+from db_connection import get_async_db
+from EventEase.responses import JsonResponse
+from .approvals import ACTIONS as APPROVAL_ACTIONS, ApprovalError, adecide, apending_page, asubmit
+from .cache import event_cache
+from .calendar import CalendarError, aload_calendar, arefresh_days, bucket_horizon, parse_range, series_days, touched_days
+from .changes import PROTECTED_FIELDS, SCHEDULE_PROJECTION, EventChangeError, needs_schedule, new_event, reschedule, update_fields
+from .conflicts import VenueConflict, afind_booked, afind_conflicts, series_slots
+from .live import event_stream, get_feed
+from .models import EventApproval, WAITLISTED
+from .recurrence import RecurrenceError, aexpand_page, afind_occurrence, amaterialize, new_series, parse_occurrence_id
+from .pagination import InvalidCursor, PAST, UPCOMING, afetch_page, get_page_size
+from .registrations import RegistrationError, acancel, aregister, auser_registrations
+from .views import approval_listing, conflict_response, get_user_role, listing_fields, listing_projection
+
+
+def collection(name):
+    return get_async_db()[name]
+
+
+async def listing_page(status, now, limit, cursor, projection):
+    events, next_cursor = await afetch_page(collection('events'), status, now, limit, cursor, projection)
+    return await aexpand_page(get_async_db(), status, now, limit, cursor, events, next_cursor, projection)
+
+
+async def load_listing(status, cursor, limit, fields=()):
+    now = datetime.utcnow()
+    pages = [status] if status else [UPCOMING, PAST]
+    projection = listing_projection(fields)
+    results = await asyncio.gather(*(listing_page(page, now, limit, cursor, projection) for page in pages))
+    response = {'next_cursor': {}}
+    for page, (events, next_cursor) in zip(pages, results):
+        response[f'{page}_events'] = events
+        response['next_cursor'][page] = next_cursor
+    return response
+
+
+async def load_user_events(user_id, status, cursor, limit):
+    registrations = await auser_registrations(get_async_db(), user_id)
+    in_user_events = {'_id': {'$in': [ObjectId(event_id) for event_id in registrations]}}
+    now = datetime.utcnow()
+    pages = [status] if status else [UPCOMING, PAST]
+    projection = listing_projection()
+    results = await asyncio.gather(*(afetch_page(collection('events'), page, now, limit, cursor, projection, in_user_events)
+                                     for page in pages))
+    response = {'next_cursor': {}}
+    for page, (events, next_cursor) in zip(pages, results):
+        for event in events:
+            event['registration_status'] = registrations.get(event['_id'])
+        response[f'{page}_events'] = events
+        response['next_cursor'][page] = next_cursor
+    return response
+
+
+async def display_events(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
+    id = request.GET.get('id', '')
+    if id:
+        try:
+            event = await event_cache.aget_event(
+                id,
+                lambda: afind_occurrence(get_async_db(), id) if parse_occurrence_id(id)
+                else collection('events').find_one({'_id': ObjectId(id)}, {'_id': 0})
+            )
+            return JsonResponse({'event': event}, status=200)
+        except Exception:
+            return JsonResponse({'error': 'Internal Server Error, Failed to fetch the event with this id'}, status=500)
+
+    try:
+        limit = get_page_size(request.GET.get('limit'))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+    status = request.GET.get('status', '')
+    if status not in ('', UPCOMING, PAST):
+        return JsonResponse({'error': "status must be 'upcoming' or 'past'"}, status=400)
+    cursor = request.GET.get('cursor') or None
+    if cursor and not status:
+        return JsonResponse({'error': 'status is required when paginating with a cursor'}, status=400)
+    try:
+        fields = listing_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        response = await event_cache.aget_listing(
+            (status, cursor, limit, fields),
+            lambda: load_listing(status, cursor, limit, fields)
+        )
+        return JsonResponse(response, status=200)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error, Failed to fetch events'}, status=500)
+
+
+async def live_events(request):
+    """Server-Sent Events feed of listing changes; resumes from Last-Event-ID."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    feed = get_feed()
+    subscriber = feed.subscribe(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(event_stream(feed, subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def calendar(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        first, last, top = parse_range(request.GET.get('from'), request.GET.get('to'), request.GET.get('top'))
+    except CalendarError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        return JsonResponse(await aload_calendar(get_async_db(), first, last, top), status=200)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error, Failed to load the calendar'}, status=500)
+
+
+async def my_events(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    claims = getattr(request, 'user_claims', None)
+    if get_user_role(request) != 'USER' or not claims.get('user_id'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    user_id = claims['user_id']
+    try:
+        limit = get_page_size(request.GET.get('limit'))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+    status = request.GET.get('status', '')
+    if status not in ('', UPCOMING, PAST):
+        return JsonResponse({'error': "status must be 'upcoming' or 'past'"}, status=400)
+    cursor = request.GET.get('cursor') or None
+    if cursor and not status:
+        return JsonResponse({'error': 'status is required when paginating with a cursor'}, status=400)
+    try:
+        response = await event_cache.aget_user_events(
+            user_id,
+            (status, cursor, limit),
+            lambda: load_user_events(user_id, status, cursor, limit)
+        )
+        return JsonResponse(response, status=200)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error, Failed to fetch events'}, status=500)
+
+
+async def event(request):
+    try:
+        if request.method not in ('POST', 'PUT', 'DELETE'):
+            return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
+        if get_user_role(request) != "ADMIN":
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        events = collection('events')
+        data = json.loads(request.body)
+
+        if request.method == 'POST':
+            nevent = new_event(data, allow_recurrence=True)
+            if nevent.recurrence:
+                try:
+                    series = new_series(nevent)
+                except RecurrenceError as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+                conflicts = await afind_booked(events, series['venue'], series_slots(series))
+                if conflicts:
+                    return conflict_response(conflicts)
+                series['bucketed_until'] = bucket_horizon()
+                result = await collection('event_series').insert_one(series)
+                await event_cache.ainvalidate(str(result.inserted_id))
+                await arefresh_days(get_async_db(), series_days(series))
+                return JsonResponse({'message': 'Event series registered successfully', 'series_id': str(result.inserted_id)}, status=201)
+            conflicts = await afind_conflicts(events, nevent.venue, nevent.starts_at, nevent.ends_at)
+            if conflicts:
+                return conflict_response(conflicts)
+            result = await events.insert_one(nevent.to_dict())
+            await event_cache.ainvalidate(str(result.inserted_id))
+            await arefresh_days(get_async_db(), touched_days(nevent.starts_at))
+            return JsonResponse({'message': 'Event registered successfully'}, status=201)
+
+        event_id = data.get('event_id')
+        if not event_id:
+            return JsonResponse({'error': 'Event ID is required'}, status=400)
+
+        if request.method == 'PUT':
+            update_data = update_fields(data)
+            if needs_schedule(data, update_data):
+                current = await events.find_one({'_id': ObjectId(event_id)}, SCHEDULE_PROJECTION)
+                if not current:
+                    return JsonResponse({'error': 'Event not found'}, status=404)
+                slot = reschedule(data, update_data, current)
+                if slot:
+                    conflicts = await afind_conflicts(events, *slot, exclude_id=current['_id'])
+                    if conflicts:
+                        return conflict_response(conflicts)
+            previous = await events.find_one_and_update({'_id': ObjectId(event_id)}, {'$set': update_data}, {'starts_at': 1})
+            if previous:
+                await event_cache.ainvalidate(event_id)
+                await arefresh_days(get_async_db(), touched_days(previous.get('starts_at'), update_data.get('starts_at')))
+                return JsonResponse({'message': 'Event updated successfully'}, status=200)
+            return JsonResponse({'error': 'Event not found'}, status=404)
+
+        deleted = await events.find_one_and_delete({'_id': ObjectId(event_id)}, {'starts_at': 1})
+        if deleted:
+            await event_cache.ainvalidate(event_id)
+            await arefresh_days(get_async_db(), touched_days(deleted.get('starts_at')))
+            return JsonResponse({'message': 'Event deleted successfully'}, status=200)
+        deleted = await collection('event_series').find_one_and_delete({'_id': ObjectId(event_id)})
+        if deleted:
+            await event_cache.ainvalidate(event_id)
+            await arefresh_days(get_async_db(), series_days(deleted))
+            return JsonResponse({'message': 'Event series deleted successfully'}, status=200)
+        return JsonResponse({'error': 'Event not found'}, status=404)
+    except EventChangeError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error'}, status=500)
+
+
+async def userevent(request):
+    try:
+        if request.method not in ('POST', 'PUT', 'DELETE'):
+            return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
+        if get_user_role(request) != "USER":
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        data = json.loads(request.body)
+
+        if request.method == 'POST':
+            user_id = request.GET.get('id', '')
+            if not user_id:
+                return JsonResponse({'error': 'User ID is required'}, status=400)
+            nevent = new_event(data)
+            conflicts = await afind_conflicts(collection('events'), nevent.venue, nevent.starts_at, nevent.ends_at)
+            if conflicts:
+                return conflict_response(conflicts)
+            approval = EventApproval(event_id=str(ObjectId()), user_id=user_id, action='post', payload=nevent.to_dict())
+            tracking_id, queued = await asubmit(get_async_db(), approval)
+            return JsonResponse({'message': 'Event posted successfully. Awaiting admin approval.', 'tracking_id': tracking_id},
+                                status=202 if queued else 201)
+
+        event_id = data.get('event_id')
+        user_id = data.get('user_id')
+        if not event_id:
+            return JsonResponse({'error': 'Event ID is required'}, status=400)
+        if not user_id:
+            return JsonResponse({'error': 'User ID is required'}, status=400)
+        event = await collection('events').find_one({'_id': ObjectId(event_id)})
+        if not event or event['organizer'] != user_id:
+            return JsonResponse({'error': 'Event not found or unauthorized.'}, status=403)
+
+        if request.method == 'PUT':
+            update_data = update_fields(data, PROTECTED_FIELDS + ('user_id',))
+            slot = reschedule(data, update_data, event)
+            if slot:
+                conflicts = await afind_conflicts(collection('events'), *slot, exclude_id=event['_id'])
+                if conflicts:
+                    return conflict_response(conflicts)
+            approval = EventApproval(event_id=event_id, user_id=user_id, action='put', payload=update_data)
+            tracking_id, queued = await asubmit(get_async_db(), approval)
+            return JsonResponse({'message': 'Update request submitted. Awaiting admin approval.', 'tracking_id': tracking_id},
+                                status=202 if queued else 200)
+
+        approval = EventApproval(event_id=event_id, user_id=user_id, action='delete')
+        tracking_id, queued = await asubmit(get_async_db(), approval)
+        return JsonResponse({'message': 'Delete request submitted. Awaiting admin approval.', 'tracking_id': tracking_id},
+                            status=202 if queued else 200)
+    except EventChangeError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error'}, status=500)
+
+
+async def admin_approve_event(request):
+    try:
+        if get_user_role(request) != "ADMIN":
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        if request.method == 'GET':
+            try:
+                listing = approval_listing(request.GET)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            try:
+                approvals, next_cursor = await apending_page(get_async_db(), **listing)
+            except InvalidCursor:
+                return JsonResponse({'error': 'Invalid cursor'}, status=400)
+            return JsonResponse({'approvals': approvals, 'next_cursor': next_cursor}, status=200)
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
+        data = json.loads(request.body)
+        approval_id = data.get('approval_id')
+        action = data.get('action')
+        if not approval_id:
+            return JsonResponse({'error': 'approval id is required'}, status=400)
+        if not action:
+            return JsonResponse({'error': 'Action is required whether to approve or reject'}, status=400)
+        if action not in APPROVAL_ACTIONS:
+            return JsonResponse({'error': "Action must be either 'approve' or 'reject'"}, status=400)
+        try:
+            approval = await adecide(get_async_db(), approval_id, action)
+        except ApprovalError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
+        except VenueConflict as e:
+            return conflict_response(e.conflicts)
+        except Exception:
+            return JsonResponse({'error': 'Action could not be processed successfully'}, status=500)
+        if action == 'approve':
+            await event_cache.ainvalidate(approval['event_id'])
+        return JsonResponse({'message': 'Action processed successfully.'}, status=200)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error'}, status=500)
+
+
+async def register_event(request):
+    try:
+        if request.method not in ('POST', 'DELETE'):
+            return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
+        if get_user_role(request) != 'USER':
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        data = json.loads(request.body)
+        event_id = data['event_id']
+        user_id = data['user_id']
+        if not event_id or not user_id:
+            return JsonResponse({'error': 'Event ID and User ID are required'}, status=400)
+        occurrence_id = event_id
+        try:
+            event_id, materialized_at = await amaterialize(get_async_db(), occurrence_id, create=request.method == 'POST')
+        except VenueConflict as e:
+            return conflict_response(e.conflicts)
+        if event_id is None:
+            if request.method == 'DELETE':
+                return JsonResponse({'error': 'Registration not found'}, status=404)
+            return JsonResponse({'error': 'Event not found or user already registered'}, status=404)
+        if materialized_at:
+            await event_cache.ainvalidate(occurrence_id)
+            await arefresh_days(get_async_db(), touched_days(materialized_at))
+
+        if request.method == 'DELETE':
+            try:
+                promoted = await acancel(get_async_db(), event_id, user_id)
+            except RegistrationError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
+            await event_cache.ainvalidate(event_id)
+            await event_cache.ainvalidate_user(user_id)
+            if promoted:
+                await event_cache.ainvalidate_user(promoted)
+            return JsonResponse({'message': 'Registration cancelled successfully', 'promoted_user_id': promoted}, status=200)
+
+        try:
+            status = await aregister(get_async_db(), event_id, user_id)
+        except RegistrationError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
+        await event_cache.ainvalidate(event_id)
+        await event_cache.ainvalidate_user(user_id)
+        if status == WAITLISTED:
+            return JsonResponse({'message': 'Event is full, user added to the waitlist', 'status': status, 'event_id': event_id}, status=202)
+        return JsonResponse({'message': 'User registered to event successfully', 'status': status, 'event_id': event_id}, status=200)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error'}, status=500)
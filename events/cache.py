@@ -0,0 +1,260 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .recurrence import parse_occurrence_id
+
+GENERATION_KEY = 'events:generation'
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    # Calls only take an in-process lock, so the async views make them inline.
+    blocking = False
+
+    def __init__(self, max_entries=1024, timeout=30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr_generation(self):
+        # Listing keys embed the generation, so bumping it orphans all of them;
+        # clearing the dict releases the memory right away.
+        with self._lock:
+            self._data.clear()
+
+    def get_generation(self):
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCache:
+    """Adapter over a Django cache alias (locmem, file, redis, ...).
+
+    Entries may be shared between processes, so listing invalidation bumps a
+    generation counter stored in the backend instead of clearing it.
+    """
+
+    # File, database and network backends do I/O on every call.
+    blocking = True
+
+    def __init__(self, alias='default', timeout=30):
+        self.backend = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, self.timeout if timeout is None else timeout)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def get_generation(self):
+        return self.backend.get_or_set(GENERATION_KEY, 0, None)
+
+    def incr_generation(self):
+        try:
+            self.backend.incr(GENERATION_KEY)
+        except ValueError:
+            self.backend.set(GENERATION_KEY, 1, None)
+
+    def clear(self):
+        self.incr_generation()
+
+    def __len__(self):
+        return 0
+
+
+class EventCache:
+    """Read-through cache for display_events.
+
+    Listing pages are keyed by the request parameters plus a generation that
+    every write to event_collection bumps; single events are keyed by id and
+    dropped individually. A user's own event pages also carry a per-user token
+    that changes whenever their registrations do, and a series' occurrences a
+    per-series token that changes whenever the series does.
+    """
+
+    def __init__(self, store, enabled=True):
+        self.store = store
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        value = self.store.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _fetch(self, key, loader):
+        if not self.enabled:
+            return loader()
+        value = self._lookup(key)
+        if value is None:
+            value = loader()
+            self.store.set(key, value)
+        return value
+
+    async def _offload(self, func, *args):
+        """Call into the store from the event loop, in a thread if the store blocks."""
+        if self.store.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def _afetch(self, make_key, loader):
+        if not self.enabled:
+            return await loader()
+
+        def lookup():
+            key = make_key()
+            return key, self._lookup(key)
+
+        key, value = await self._offload(lookup)
+        if value is None:
+            value = await loader()
+            await self._offload(self.store.set, key, value)
+        return value
+
+    def _listing_key(self, params):
+        return f"events:list:{self.store.get_generation()}:{params}"
+
+    def get_listing(self, params, loader):
+        return self._fetch(self._listing_key(params), loader)
+
+    def _token(self, key):
+        # A random token rather than a counter: if the token is evicted, the
+        # replacement can never match entries cached under the old one.
+        token = self.store.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.store.set(key, token)
+        return token
+
+    def _series_token_key(self, series_id):
+        return f"events:series-token:{series_id}"
+
+    def _event_key(self, event_id):
+        occurrence = parse_occurrence_id(event_id)
+        if occurrence is None:
+            return f"events:one:{event_id}"
+        token = self._token(self._series_token_key(occurrence[0]))
+        return f"events:one:{token}:{event_id}"
+
+    def get_event(self, event_id, loader):
+        return self._fetch(self._event_key(event_id), loader)
+
+    async def aget_listing(self, params, loader):
+        """get_listing for the async views; `loader` is a coroutine function."""
+        return await self._afetch(lambda: self._listing_key(params), loader)
+
+    async def aget_event(self, event_id, loader):
+        return await self._afetch(lambda: self._event_key(event_id), loader)
+
+    def _user_token_key(self, user_id):
+        return f"events:user-token:{user_id}"
+
+    def _user_key(self, user_id, params):
+        token = self._token(self._user_token_key(user_id))
+        return f"events:user:{user_id}:{token}:{self.store.get_generation()}:{params}"
+
+    def get_user_events(self, user_id, params, loader):
+        return self._fetch(self._user_key(user_id, params), loader)
+
+    async def aget_user_events(self, user_id, params, loader):
+        return await self._afetch(lambda: self._user_key(user_id, params), loader)
+
+    def invalidate_user(self, user_id):
+        if not self.enabled:
+            return
+        self.store.set(self._user_token_key(user_id), uuid.uuid4().hex)
+
+    def invalidate(self, event_id=None):
+        if not self.enabled:
+            return
+        if event_id is not None:
+            self.store.delete(self._event_key(event_id))
+            if parse_occurrence_id(event_id) is None:
+                # The id may be a series: orphan its cached occurrences too.
+                self.store.delete(self._series_token_key(event_id))
+        self.store.incr_generation()
+
+    async def ainvalidate(self, event_id=None):
+        """invalidate for the async views."""
+        if self.enabled:
+            await self._offload(self.invalidate, event_id)
+
+    async def ainvalidate_user(self, user_id):
+        if self.enabled:
+            await self._offload(self.invalidate_user, user_id)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'entries': len(self.store),
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+def build_event_cache():
+    config = getattr(settings, 'EVENTS_CACHE', {})
+    timeout = config.get('TIMEOUT', 30)
+    if config.get('BACKEND', 'lru') == 'django':
+        store = DjangoCache(config.get('ALIAS', 'default'), timeout)
+    else:
+        store = LRUCache(config.get('MAX_ENTRIES', 1024), timeout)
+    return EventCache(store, enabled=config.get('ENABLED', True))
+
+
+event_cache = build_event_cache()
@@ -0,0 +1,249 @@
+"""Per-day event counts for calendar views, kept in event_day_buckets.
+
+One bucket per UTC day that has events, keyed by the day as YYYY-MM-DD so a
+date range is a range on _id:
+
+    {'_id': '2024-05-01', 'date': datetime, 'count': 12, 'events': [...], 'seq': 7}
+
+`events` holds the first TOP_EVENTS of the day by start time. Every write
+path that adds, moves or removes an event calls refresh_days() with the days
+it touched, which recomputes them from `events` and the bucketed series
+occurrences. Concurrent refreshes are ordered by `seq`: each one bumps it
+after its own event write, reads, and only writes if nobody bumped it since,
+so the refresh that claimed last, and so read last, is the one that lands. A
+write path that skips refresh_days, or a process dying between its event
+write and the refresh, still leaves a day stale; rebuild_calendar rebuilds
+them all. A day that loses its last event keeps its bucket, and its seq, with
+a zero count; reads skip those.
+
+Occurrences of recurring series are bucketed too, up to the series'
+`bucketed_until` (HORIZON_DAYS past its creation, or past the last
+rebuild_calendar). Only ranges beyond that expand series per request.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .models import day_bucket_collection, event_collection, series_collection
+from .recurrence import expand, get_config as get_recurrence_config, materialized_query, page_key, series_projection, window_query
+
+# Fields of each event listed in a bucket.
+BUCKET_FIELDS = ('title', 'venue', 'starts_at', 'organizer')
+DAY_FORMAT = '%Y-%m-%d'
+
+
+class CalendarError(ValueError):
+    pass
+
+
+def get_config():
+    config = {'TOP_EVENTS': 5, 'MAX_DAYS': 62}
+    config.update(getattr(settings, 'EVENTS_CALENDAR', {}))
+    return config
+
+
+def day_key(starts_at):
+    return starts_at.strftime(DAY_FORMAT)
+
+
+def day_start(day):
+    return datetime.strptime(day, DAY_FORMAT)
+
+
+def touched_days(*starts):
+    """Day keys for the given start times, skipping unknown (None) ones."""
+    return {day_key(starts_at) for starts_at in starts if starts_at is not None}
+
+
+def bucket_projection():
+    return {field: 1 for field in BUCKET_FIELDS}
+
+
+def series_fields():
+    return series_projection({**bucket_projection(), 'bucketed_until': 1})
+
+
+def bucket_horizon(now=None):
+    """The bucketed_until given to series created or rebuilt now."""
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=get_recurrence_config()['HORIZON_DAYS'])
+
+
+def bucketed_occurrences(series, start, end, materialized=()):
+    """Occurrences in [start, end) that buckets hold: those before each series' bucketed_until."""
+    for one in series:
+        until = min(end, one.get('bucketed_until') or start)
+        yield from expand([one], start, until - timedelta(microseconds=1), materialized)
+
+
+def series_days(series):
+    """Days holding bucketed occurrences of one series."""
+    start = series['starts_at']
+    return touched_days(*(doc['starts_at'] for doc in bucketed_occurrences([series], start, series['bucketed_until'])))
+
+
+def days_query(days):
+    """(start, end, filter) covering `days`, consecutive days merged into one range."""
+    ranges = []
+    for day in sorted(days):
+        start = day_start(day)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(days=1)
+        else:
+            ranges.append([start, start + timedelta(days=1)])
+    clauses = [{'starts_at': {'$gte': start, '$lt': end}} for start, end in ranges]
+    return ranges[0][0], ranges[-1][1], clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def claim_ops(days):
+    return [UpdateOne({'_id': day}, {'$inc': {'seq': 1}, '$setOnInsert': {'date': day_start(day), 'count': 0, 'events': []}},
+                      upsert=True) for day in days]
+
+
+def bucket_ops(days, seqs, events, occurrences, top):
+    """Guarded writes of each day's count and first `top` events."""
+    summary = {day: [] for day in days}
+    for doc in events:
+        summary[day_key(doc['starts_at'])].append(doc)
+    for doc in occurrences:
+        key = day_key(doc['starts_at'])
+        if key in summary:
+            summary[key].append({field: doc.get(field) for field in ('_id',) + BUCKET_FIELDS})
+    return [UpdateOne({'_id': day, 'seq': seqs[day]},
+                      {'$set': {'count': len(docs), 'events': sorted(docs, key=page_key)[:top]}})
+            for day, docs in summary.items() if day in seqs]
+
+
+def refresh_days(days):
+    """Recompute the buckets of `days` from events and bucketed series occurrences.
+
+    A fixed number of round trips however many days there are.
+    """
+    if not days:
+        return
+    days = sorted(days)
+    day_bucket_collection.bulk_write(claim_ops(days), ordered=False)
+    seqs = {doc['_id']: doc['seq'] for doc in day_bucket_collection.find({'_id': {'$in': days}}, {'seq': 1})}
+    start, end, query = days_query(days)
+    events = list(event_collection.find(query, bucket_projection()))
+    series = list(series_collection.find(window_query(start, end), series_fields()))
+    materialized = set()
+    if series:
+        materialized = {(doc['series_id'], doc['starts_at'])
+                        for doc in event_collection.find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})}
+    ops = bucket_ops(days, seqs, events, bucketed_occurrences(series, start, end, materialized), get_config()['TOP_EVENTS'])
+    if ops:
+        day_bucket_collection.bulk_write(ops, ordered=False)
+
+
+async def arefresh_days(db, days):
+    """refresh_days for the Motor views; `db` is the async database."""
+    if not days:
+        return
+    days = sorted(days)
+    buckets = db['event_day_buckets']
+    await buckets.bulk_write(claim_ops(days), ordered=False)
+    seqs = {doc['_id']: doc['seq'] async for doc in buckets.find({'_id': {'$in': days}}, {'seq': 1})}
+    start, end, query = days_query(days)
+    events = await db['events'].find(query, bucket_projection()).to_list(None)
+    series = await db['event_series'].find(window_query(start, end), series_fields()).to_list(None)
+    materialized = set()
+    if series:
+        docs = db['events'].find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})
+        materialized = {(doc['series_id'], doc['starts_at']) async for doc in docs}
+    ops = bucket_ops(days, seqs, events, bucketed_occurrences(series, start, end, materialized), get_config()['TOP_EVENTS'])
+    if ops:
+        await buckets.bulk_write(ops, ordered=False)
+
+
+def parse_range(raw_from, raw_to, raw_top=None):
+    """Validate calendar/ query parameters; return (first_day, last_day, top)."""
+    config = get_config()
+    try:
+        first = datetime.strptime(raw_from or '', DAY_FORMAT)
+        last = datetime.strptime(raw_to or '', DAY_FORMAT)
+    except ValueError:
+        raise CalendarError('from and to must be dates in YYYY-MM-DD format')
+    if last < first:
+        raise CalendarError('to must not be before from')
+    if (last - first).days + 1 > config['MAX_DAYS']:
+        raise CalendarError(f"A calendar range may span at most {config['MAX_DAYS']} days")
+    top = config['TOP_EVENTS']
+    if raw_top not in (None, ''):
+        try:
+            top = int(raw_top)
+        except ValueError:
+            top = -1
+        if not 0 <= top <= config['TOP_EVENTS']:
+            raise CalendarError(f"top must be an integer between 0 and {config['TOP_EVENTS']}")
+    return day_key(first), day_key(last), top
+
+
+def range_query(first, last, top):
+    return ({'_id': {'$gte': first, '$lte': last}, 'count': {'$gt': 0}},
+            {'date': 0, 'seq': 0, 'events': {'$slice': top}})
+
+
+def calendar_response(first, last, buckets):
+    return {
+        'from': first,
+        'to': last,
+        'days': [{'date': bucket['_id'], 'count': bucket['count'], 'events': bucket['events']} for bucket in buckets],
+    }
+
+
+def range_bounds(first, last):
+    return day_start(first), day_start(last) + timedelta(days=1)
+
+
+def unbucketed_query(start, end):
+    """Series with occurrences in [start, end) past their bucketed_until."""
+    return {**window_query(start, end), 'bucketed_until': {'$not': {'$gte': end}}}
+
+
+def add_occurrences(response, series, materialized, start, end, top):
+    """Count the unbucketed occurrences of `series` in the days of a calendar response."""
+    days = {day['date']: day for day in response['days']}
+    for one in series:
+        since = max(start, one.get('bucketed_until') or start)
+        for doc in expand([one], since, end - timedelta(microseconds=1), materialized):
+            key = day_key(doc['starts_at'])
+            day = days.setdefault(key, {'date': key, 'count': 0, 'events': []})
+            day['count'] += 1
+            day['events'].append({field: doc.get(field) for field in ('_id',) + BUCKET_FIELDS})
+    for day in days.values():
+        day['events'] = sorted(day['events'], key=page_key)[:top]
+    response['days'] = sorted(days.values(), key=lambda day: day['date'])
+    return response
+
+
+def load_calendar(first, last, top):
+    """One range read over the buckets, in day order; days without events are absent.
+
+    Plus one read for series not bucketed as far as the range, which finds
+    nothing unless the range reaches past their horizon.
+    """
+    query, projection = range_query(first, last, top)
+    buckets = day_bucket_collection.find(query, projection).sort('_id', 1)
+    response = calendar_response(first, last, list(buckets))
+    start, end = range_bounds(first, last)
+    series = list(series_collection.find(unbucketed_query(start, end), series_fields()))
+    if not series:
+        return response
+    materialized = {(doc['series_id'], doc['starts_at'])
+                    for doc in event_collection.find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})}
+    return add_occurrences(response, series, materialized, start, end, top)
+
+
+async def aload_calendar(db, first, last, top):
+    query, projection = range_query(first, last, top)
+    buckets = await db['event_day_buckets'].find(query, projection).sort('_id', 1).to_list(None)
+    response = calendar_response(first, last, buckets)
+    start, end = range_bounds(first, last)
+    series = await db['event_series'].find(unbucketed_query(start, end), series_fields()).to_list(None)
+    if not series:
+        return response
+    docs = db['events'].find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})
+    materialized = {(doc['series_id'], doc['starts_at']) async for doc in docs}
+    return add_occurrences(response, series, materialized, start, end, top)
@@ -0,0 +1,106 @@
+"""Validation and payload building for event writes.
+
+Shared by the admin event endpoints and userevent requests, sync and async:
+the views do the I/O and turn EventChangeError into a response.
+"""
+from datetime import datetime
+
+from .conflicts import max_duration, slot_after, touches_schedule, valid_duration
+from .models import Event, to_starts_at
+from .recurrence import RecurrenceError, parse_recurrence
+
+# Request keys that never go straight into an event $set: ids, the schedule
+# fields derived from date/time/duration, the counters registrations keep,
+# the series link, ownership and the approval flag.
+PROTECTED_FIELDS = ('event_id', 'starts_at', 'ends_at', 'attendee_count', 'attendees', '_id', 'waitlist_count',
+                    'series_id', 'occurrence_id', 'organizer', 'approved')
+
+# Fields of the stored event an update needs to move it.
+SCHEDULE_PROJECTION = {'date': 1, 'time': 1, 'venue': 1, 'starts_at': 1, 'duration': 1}
+
+
+class EventChangeError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def valid_capacity(capacity):
+    return capacity is None or (isinstance(capacity, int) and not isinstance(capacity, bool) and capacity > 0)
+
+
+def duration_error():
+    return EventChangeError(f'duration must be a whole number of minutes from 1 to {max_duration()}')
+
+
+def schedule_update(data, current=None):
+    """Return the starts_at for an update touching date and/or time.
+
+    Fields missing from the update are taken from `current`, the stored event.
+    """
+    date = data['date'] if 'date' in data else current.get('date')
+    time = data['time'] if 'time' in data else current.get('time')
+    if date is None or time is None:
+        raise EventChangeError('Event has no date or time; include both in the update')
+    return to_starts_at(date, time)
+
+
+def check_future(starts_at):
+    if starts_at <= datetime.utcnow():
+        raise EventChangeError('Please provide appropriate time')
+
+
+def new_event(data, allow_recurrence=False):
+    """Build the Event a create request describes, or raise EventChangeError."""
+    if not valid_duration(data.get('duration')):
+        raise duration_error()
+    recurrence = None
+    if allow_recurrence and data.get('recurrence') is not None:
+        try:
+            recurrence = parse_recurrence(data['recurrence'])
+        except RecurrenceError as e:
+            raise EventChangeError(str(e))
+    event = Event(title=data['title'], description=data['description'], venue=data['venue'], date=data['date'],
+                  time=data['time'], organizer=data['organizer'], capacity=data.get('capacity'),
+                  duration=data.get('duration'), recurrence=recurrence)
+    if not valid_capacity(event.capacity):
+        raise EventChangeError('capacity must be a positive integer')
+    check_future(event.starts_at)
+    return event
+
+
+def update_fields(data, protected=PROTECTED_FIELDS):
+    """The $set an update request asks for, with protected keys dropped."""
+    update_data = {k: v for k, v in data.items() if k not in protected}
+    if not valid_capacity(update_data.get('capacity')):
+        raise EventChangeError('capacity must be a positive integer')
+    if not valid_duration(update_data.get('duration')):
+        raise duration_error()
+    return update_data
+
+
+def needs_schedule(data, update_data):
+    """Whether applying the update needs the stored event's schedule."""
+    return 'date' in data or 'time' in data or touches_schedule(update_data)
+
+
+def reschedule(data, update_data, current):
+    """Fill in the derived schedule fields of an update to `current`.
+
+    Returns the (venue, starts_at, ends_at) the event moves to, to be checked
+    for conflicts, or None when the update leaves it where it is.
+    """
+    if 'date' in data or 'time' in data:
+        update_data['starts_at'] = schedule_update(data, current)
+        check_future(update_data['starts_at'])
+    if not touches_schedule(update_data):
+        return None
+    if not current.get('starts_at') and 'starts_at' not in update_data:
+        # Legacy events stored before backfill_starts_at: derive it from their date and time.
+        update_data['starts_at'] = schedule_update(data, current)
+    slot = slot_after(update_data, current)
+    if slot is None:
+        raise EventChangeError('Event has no venue or start time; include venue, date and time in the update')
+    update_data['ends_at'] = slot[2]
+    return slot
@@ -0,0 +1,208 @@
+"""Double-booking checks for venues.
+
+Events occupy their venue from starts_at to ends_at (starts_at plus
+`duration` minutes). Two events conflict when they share a venue and their
+intervals overlap. Because no event runs longer than EVENTS_MAX_DURATION, an
+event overlapping [starts_at, ends_at) must start within MAX_DURATION before
+ends_at, which bounds the starts_at range of the check on the
+venue_starts_at_ends_at index to a handful of keys.
+
+Recurring series book every occurrence: checks expand the series at the
+venue around the slot, skipping occurrences already materialized (those are
+checked as events), and a new series is checked occurrence by occurrence over
+HORIZON_DAYS.
+
+The check runs before the write and is not atomic with it; the admin report
+finds any overlap that two concurrent requests let through. The report only
+covers stored events, not unmaterialized occurrences.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .models import default_duration, event_collection, series_collection
+from .recurrence import (get_config as get_recurrence_config, materialized_query, occurrence_id, occurrence_starts,
+                         series_projection, window_query)
+
+# Fields of each conflicting event in 409 responses and the admin report.
+CONFLICT_FIELDS = ('title', 'venue', 'starts_at', 'ends_at', 'organizer')
+# Conflicts listed per rejected request.
+CONFLICT_LIMIT = 5
+# Fields whose change moves an event in time or space.
+SCHEDULE_FIELDS = ('venue', 'starts_at', 'duration')
+
+CONFLICT_MESSAGE = 'Venue is already booked at that time'
+
+
+class VenueConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__(CONFLICT_MESSAGE)
+        self.conflicts = conflicts
+
+
+def max_duration():
+    return getattr(settings, 'EVENTS_MAX_DURATION', 24 * 60)
+
+
+def valid_duration(duration):
+    return duration is None or (isinstance(duration, int) and not isinstance(duration, bool)
+                                and 0 < duration <= max_duration())
+
+
+def touches_schedule(changes):
+    return any(field in changes for field in SCHEDULE_FIELDS)
+
+
+def slot_after(changes, current=None):
+    """Return (venue, starts_at, ends_at) of an event once `changes` are $set over `current`.
+
+    None when the result has no venue or starts_at to book, as legacy events
+    stored before backfill_starts_at may not.
+    """
+    merged = {**(current or {}), **changes}
+    if not merged.get('venue') or not isinstance(merged.get('starts_at'), datetime):
+        return None
+    duration = merged.get('duration') or default_duration()
+    return merged['venue'], merged['starts_at'], merged['starts_at'] + timedelta(minutes=duration)
+
+
+def overlap_query(venue, starts_at, ends_at, exclude_id=None):
+    query = {
+        'venue': venue,
+        'starts_at': {'$gt': starts_at - timedelta(minutes=max_duration()), '$lt': ends_at},
+        'ends_at': {'$gt': starts_at},
+    }
+    if exclude_id is not None:
+        query['_id'] = {'$ne': exclude_id}
+    return query
+
+
+def conflict_projection():
+    return {field: 1 for field in CONFLICT_FIELDS}
+
+
+def series_query(venue, starts_at, ends_at):
+    """Series at `venue` with an occurrence that may overlap [starts_at, ends_at)."""
+    return {'venue': venue, **window_query(starts_at - timedelta(minutes=max_duration()), ends_at)}
+
+
+def series_slots(series):
+    """(starts_at, ends_at) of each occurrence of a new series within HORIZON_DAYS of its first."""
+    start = series['starts_at']
+    length = timedelta(minutes=series.get('duration') or default_duration())
+    end = start + timedelta(days=get_recurrence_config()['HORIZON_DAYS'])
+    return [(starts_at, starts_at + length) for starts_at in occurrence_starts(series, start, end)]
+
+
+def booked(slots, events, series, materialized=(), exclude_id=None):
+    """The first CONFLICT_LIMIT of `events` and occurrences of `series` overlapping one of `slots`.
+
+    `slots` are (starts_at, ends_at) pairs in starts_at order and of one
+    length, so their ends are in order too.
+    """
+    low, high = slots[0][0], slots[-1][1]
+    candidates = list(events)
+    for one in series:
+        length = timedelta(minutes=one.get('duration') or default_duration())
+        for starts_at in occurrence_starts(one, low - timedelta(minutes=max_duration()), high):
+            doc_id = occurrence_id(one['_id'], starts_at)
+            if (str(one['_id']), starts_at) in materialized or doc_id == exclude_id:
+                continue
+            doc = {field: one.get(field) for field in CONFLICT_FIELDS}
+            doc.update(_id=doc_id, starts_at=starts_at, ends_at=starts_at + length)
+            candidates.append(doc)
+    starts = [starts_at for starts_at, _ in slots]
+    conflicts = []
+    for doc in sorted(candidates, key=lambda doc: doc['starts_at']):
+        i = bisect_left(starts, doc['ends_at']) - 1
+        if i >= 0 and slots[i][1] > doc['starts_at']:
+            conflicts.append(doc)
+            if len(conflicts) >= CONFLICT_LIMIT:
+                break
+    return conflicts
+
+
+def find_booked(venue, slots, exclude_id=None, session=None):
+    """Events and series occurrences at `venue` overlapping any of `slots`, soonest first."""
+    if not slots:
+        return []
+    low, high = slots[0][0], slots[-1][1]
+    events = event_collection.find(overlap_query(venue, low, high, exclude_id), conflict_projection(), session=session)
+    series = list(series_collection.find(series_query(venue, low, high), series_projection(conflict_projection()),
+                                         session=session))
+    materialized = set()
+    if series:
+        docs = event_collection.find(materialized_query(series, low - timedelta(minutes=max_duration()), high),
+                                     {'series_id': 1, 'starts_at': 1}, session=session)
+        materialized = {(doc['series_id'], doc['starts_at']) for doc in docs}
+    return booked(slots, events, series, materialized, exclude_id)
+
+
+async def afind_booked(collection, venue, slots, exclude_id=None, session=None):
+    if not slots:
+        return []
+    low, high = slots[0][0], slots[-1][1]
+    events = await collection.find(overlap_query(venue, low, high, exclude_id), conflict_projection(),
+                                   session=session).to_list(None)
+    series = await collection.database['event_series'].find(
+        series_query(venue, low, high), series_projection(conflict_projection()), session=session).to_list(None)
+    materialized = set()
+    if series:
+        docs = collection.find(materialized_query(series, low - timedelta(minutes=max_duration()), high),
+                               {'series_id': 1, 'starts_at': 1}, session=session)
+        materialized = {(doc['series_id'], doc['starts_at']) async for doc in docs}
+    return booked(slots, events, series, materialized, exclude_id)
+
+
+def find_conflicts(venue, starts_at, ends_at, exclude_id=None, session=None):
+    """Events and series occurrences at `venue` overlapping [starts_at, ends_at), soonest first."""
+    return find_booked(venue, [(starts_at, ends_at)], exclude_id, session)
+
+
+async def afind_conflicts(collection, venue, starts_at, ends_at, exclude_id=None, session=None):
+    return await afind_booked(collection, venue, [(starts_at, ends_at)], exclude_id, session)
+
+
+def check_slot(venue, starts_at, ends_at, exclude_id=None, session=None):
+    conflicts = find_conflicts(venue, starts_at, ends_at, exclude_id, session)
+    if conflicts:
+        raise VenueConflict(conflicts)
+
+
+async def acheck_slot(collection, venue, starts_at, ends_at, exclude_id=None, session=None):
+    conflicts = await afind_conflicts(collection, venue, starts_at, ends_at, exclude_id, session)
+    if conflicts:
+        raise VenueConflict(conflicts)
+
+
+def conflict_report(date_from, date_to, venue=None, limit=100):
+    """Pairs of overlapping events where the later one starts in [date_from, date_to).
+
+    One pass over the venue_starts_at_ends_at index in (venue, starts_at)
+    order: a sweep keeps the events still running at each start, so every
+    overlap is found once, without a query per event. Returns (pairs,
+    truncated).
+    """
+    query = {
+        'starts_at': {'$gte': date_from - timedelta(minutes=max_duration()), '$lt': date_to},
+        'ends_at': {'$type': 'date'},
+    }
+    # Legacy events without a venue book nothing.
+    query['venue'] = venue or {'$type': 'string'}
+    cursor = event_collection.find(query, conflict_projection()).sort([('venue', 1), ('starts_at', 1)])
+    pairs, current_venue, running = [], None, []
+    try:
+        for doc in cursor:
+            if doc['venue'] != current_venue:
+                current_venue, running = doc['venue'], []
+            running = [other for other in running if other['ends_at'] > doc['starts_at']]
+            if doc['starts_at'] >= date_from:
+                for other in running:
+                    if len(pairs) >= limit:
+                        return pairs, True
+                    pairs.append({'venue': current_venue, 'events': [other, doc]})
+            running.append(doc)
+    finally:
+        cursor.close()
+    return pairs, False
@@ -0,0 +1,50 @@
+import zlib
+
+from EventEase.responses import dumps
+
+from .models import event_collection
+
+
+def iter_events(batch_size):
+    """Yield every event in _id order, holding at most one batch in memory."""
+    cursor = event_collection.find({}, batch_size=batch_size).sort('_id', 1)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+def ndjson_chunks(docs):
+    for doc in docs:
+        yield dumps(doc) + b'\n'
+
+
+def json_array_chunks(docs):
+    yield b'['
+    first = True
+    for doc in docs:
+        yield dumps(doc) if first else b',' + dumps(doc)
+        first = False
+    yield b']'
+
+
+def buffered(chunks, size=64 * 1024):
+    """Group small byte chunks into ~`size` byte blocks to cut write calls."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(blocks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,272 @@
+"""Live updates to the events listing, pushed over Server-Sent Events.
+
+Each worker keeps one upstream source open for all of its clients: a change
+stream on `events` when the deployment supports them (replica sets and
+sharded clusters). Changes are fanned out in-process to one bounded queue per
+client. Without change streams the feed can poll, diffing listing snapshots,
+but each pass rescans every event, so that fallback is only taken in
+development (DEBUG or a mongomock:// URI) or when MODE is 'poll'.
+
+Every message carries an id. A client reconnecting with Last-Event-ID is
+replayed what it missed from a short in-memory history; when that is not
+possible, or when a client falls so far behind that its queue fills, it gets
+a `reset` event instead and should re-fetch the listing.
+"""
+import asyncio
+import logging
+import uuid
+import weakref
+from collections import deque
+from itertools import count
+
+from django.conf import settings
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db_connection import get_async_db, get_config as get_mongo_config
+from EventEase.responses import dumps
+from .views import SUMMARY_FIELDS, listing_projection
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'auto',
+    'POLL_INTERVAL': 2.0,
+    'QUEUE_SIZE': 100,
+    'REPLAY_SIZE': 1000,
+    'HEARTBEAT': 15,
+    'RETRY_MS': 3000,
+}
+
+# "The $changeStream stage is only supported on replica sets".
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_FATAL = (280, 286)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'EVENTS_LIVE', {}))
+    return config
+
+
+def polling_allowed():
+    return (get_config()['MODE'] == 'poll' or settings.DEBUG
+            or (get_mongo_config()['URI'] or '').startswith('mongomock://'))
+
+
+class ChangeStreamsUnavailable(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, feed, size):
+        self.feed = feed
+        self.queue = asyncio.Queue(size)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop its backlog rather than buffer
+            # without limit, and have it re-fetch instead.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.feed.reset_message())
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventFeed:
+    """The shared upstream for one event loop, started by its first subscriber."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.history = deque(maxlen=get_config()['REPLAY_SIZE'])
+        self.last_id = None
+        self.resume_token = None
+        self.mode = None
+        self._task = None
+
+    def subscribe(self, last_event_id=None):
+        subscriber = Subscriber(self, get_config()['QUEUE_SIZE'])
+        if last_event_id:
+            missed = self.since(last_event_id)
+            if missed is None:
+                subscriber.put(self.reset_message())
+            for message in missed or ():
+                subscriber.put(message)
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._start(self.run())
+        return subscriber
+
+    def _start(self, source):
+        self._task = asyncio.get_running_loop().create_task(source)
+        self._task.add_done_callback(self._stopped)
+
+    def _stopped(self, task):
+        """Log an upstream that died, and poll instead where that is allowed."""
+        if task.cancelled() or task is not self._task or task.exception() is None:
+            return
+        if self.mode != 'poll' and self.subscribers and polling_allowed():
+            logger.error('Live events feed failed, falling back to polling', exc_info=task.exception())
+            # Set before the poll starts, so a poll that fails too is not retried.
+            self.mode = 'poll'
+            self._start(self.run(poll=True))
+            return
+        logger.error('Live events feed failed', exc_info=task.exception())
+        # Clients re-fetch; the next subscriber starts a fresh upstream.
+        self.restart()
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def since(self, event_id):
+        """Messages after `event_id`, or None when it is no longer in history."""
+        if event_id == self.last_id:
+            return []
+        messages = list(self.history)
+        for index, message in enumerate(messages):
+            if message['id'] == event_id:
+                return messages[index + 1:]
+        return None
+
+    def reset_message(self):
+        return {'id': self.last_id, 'event': 'reset', 'data': {}}
+
+    def publish(self, message_id, event, data):
+        message = {'id': message_id, 'event': event, 'data': data}
+        self.history.append(message)
+        self.last_id = message_id
+        for subscriber in list(self.subscribers):
+            subscriber.put(message)
+
+    def restart(self):
+        """Forget history that can no longer be resumed and tell clients so."""
+        had_history = self.last_id is not None
+        self.history.clear()
+        self.last_id = None
+        if not had_history:
+            return
+        for subscriber in list(self.subscribers):
+            subscriber.put(self.reset_message())
+
+    async def run(self, poll=False):
+        config = get_config()
+        # The feed follows `events` only: series and their unmaterialized
+        # occurrences are excluded until a registration materializes them.
+        collection = get_async_db()['events']
+        if config['MODE'] != 'poll' and not poll:
+            try:
+                await self.watch(collection)
+                return
+            except ChangeStreamsUnavailable:
+                if config['MODE'] == 'change_stream':
+                    raise
+                if not polling_allowed():
+                    logger.error('Change streams unavailable and polling is limited to development; '
+                                 'the live events feed needs a replica set')
+                    return
+                logger.info('Change streams unavailable, polling events every %ss', config['POLL_INTERVAL'])
+        await self.poll(collection, config['POLL_INTERVAL'])
+
+    async def watch(self, collection):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+        while True:
+            try:
+                async with collection.watch(pipeline, full_document='updateLookup',
+                                            resume_after=self.resume_token) as stream:
+                    self.mode = 'change_stream'
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        self.publish_change(change)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    raise ChangeStreamsUnavailable(str(e))
+                if e.code not in CHANGE_STREAM_FATAL:
+                    raise
+                # The resume point fell off the oplog.
+                logger.warning('Change stream history lost, restarting the live feed')
+                self.resume_token = None
+                self.restart()
+            except (AttributeError, NotImplementedError, TypeError) as e:
+                # In-memory stand-ins such as mongomock-motor have no watch().
+                raise ChangeStreamsUnavailable(str(e))
+            except PyMongoError:
+                logger.exception('Live events change stream failed, resuming')
+                await asyncio.sleep(1)
+
+    def publish_change(self, change):
+        event_id = change['documentKey']['_id']
+        operation = change['operationType']
+        document = change.get('fullDocument')
+        if operation == 'delete' or document is None:
+            self.publish(change['_id']['_data'], 'delete', {'_id': event_id})
+            return
+        data = {field: document.get(field) for field in SUMMARY_FIELDS}
+        data['_id'] = event_id
+        self.publish(change['_id']['_data'], 'insert' if operation == 'insert' else 'update', data)
+
+    async def poll(self, collection, interval):
+        """Diff the listing fields of every event against the previous pass.
+
+        One full scan per interval per worker, however many clients are
+        connected: O(events), which is why run() only polls in development.
+        """
+        self.mode = 'poll'
+        epoch, sequence = uuid.uuid4().hex[:8], count(1)
+        # Ids from an earlier run are not comparable with this one.
+        self.restart()
+        snapshot = None
+        while True:
+            try:
+                current = {doc['_id']: doc async for doc in collection.find({}, listing_projection())}
+            except PyMongoError:
+                logger.exception('Live events poll failed')
+                await asyncio.sleep(interval)
+                continue
+            if snapshot is not None:
+                for event_id, doc in current.items():
+                    previous = snapshot.get(event_id)
+                    if previous != doc:
+                        self.publish(f'{epoch}-{next(sequence)}', 'insert' if previous is None else 'update', doc)
+                for event_id in snapshot.keys() - current.keys():
+                    self.publish(f'{epoch}-{next(sequence)}', 'delete', {'_id': event_id})
+            snapshot = current
+            await asyncio.sleep(interval)
+
+
+_feeds = weakref.WeakKeyDictionary()
+
+
+def get_feed():
+    loop = asyncio.get_running_loop()
+    feed = _feeds.get(loop)
+    if feed is None:
+        feed = _feeds[loop] = EventFeed()
+    return feed
+
+
+def format_message(message):
+    lines = [f"id: {message['id']}"] if message['id'] else []
+    lines.append(f"event: {message['event']}")
+    lines.append('data: ' + dumps(message['data']).decode())
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def event_stream(feed, subscriber):
+    config = get_config()
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n".encode()
+        while True:
+            try:
+                message = await subscriber.get(config['HEARTBEAT'])
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            yield format_message(message)
+    finally:
+        feed.unsubscribe(subscriber)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from events.models import event_collection, pending_events_collection
+
+
+class BackfillCommand(BaseCommand):
+    """Batched $set of derived fields on events and pending_events documents.
+
+    Subclasses name the `field` that marks a document as done, the
+    `projection` they read, and `values(doc)`, the fields to write; a
+    ValueError from it skips the document.
+    """
+    field = None
+    projection = None
+    # Filter every candidate must match, even with --all.
+    base_query = {}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true',
+                            help=f'Recompute {self.field} on every document, not only the missing ones.')
+
+    def handle(self, *args, **options):
+        for collection in (event_collection, pending_events_collection):
+            self.backfill(collection, options['batch_size'], options['all'])
+
+    def values(self, doc):
+        raise NotImplementedError
+
+    def backfill(self, collection, batch_size, recompute):
+        query = dict(self.base_query)
+        if not recompute:
+            query[self.field] = {'$exists': False}
+        total = collection.count_documents(query)
+        self.stdout.write(f"{collection.name}: {total} documents to backfill")
+
+        updated = skipped = 0
+        batch = []
+        cursor = collection.find(query, self.projection, batch_size=batch_size)
+        for doc in cursor:
+            try:
+                values = self.values(doc)
+            except ValueError as e:
+                skipped += 1
+                self.stderr.write(f"{collection.name}: skipping {doc['_id']}, {e}")
+                continue
+            batch.append(UpdateOne({'_id': doc['_id']}, {'$set': values}))
+            if len(batch) >= batch_size:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+                self.stdout.write(f"{collection.name}: {updated}/{total}")
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{collection.name}: backfilled {updated} documents, skipped {skipped}"
+        ))
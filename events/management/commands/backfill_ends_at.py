@@ -0,0 +1,15 @@
+from datetime import timedelta
+
+from events.management.backfill import BackfillCommand
+from events.models import default_duration
+
+
+class Command(BackfillCommand):
+    help = "Write duration and ends_at on events and pending_events documents that predate them."
+    field = 'ends_at'
+    projection = {'starts_at': 1, 'duration': 1}
+    base_query = {'starts_at': {'$type': 'date'}}
+
+    def values(self, doc):
+        duration = doc.get('duration') or default_duration()
+        return {'duration': duration, 'ends_at': doc['starts_at'] + timedelta(minutes=duration)}
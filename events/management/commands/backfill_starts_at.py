@@ -0,0 +1,14 @@
+from events.management.backfill import BackfillCommand
+from events.models import to_starts_at
+
+
+class Command(BackfillCommand):
+    help = "Write the starts_at datetime on events and pending_events documents that predate it."
+    field = 'starts_at'
+    projection = {'date': 1, 'time': 1}
+
+    def values(self, doc):
+        try:
+            return {'starts_at': to_starts_at(doc['date'], doc['time'])}
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('unparseable date/time')
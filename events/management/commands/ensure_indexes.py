@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+
+from authentication.models import INDEXES as USER_INDEXES, user_collection
+from db_connection import ensure_indexes
+from events.models import INDEXES as EVENT_INDEXES, approval_collection, day_bucket_collection, event_collection, registration_collection, series_collection
+
+
+def view_queries():
+    """Representative queries issued by the views, as (label, collection, filter, sort)."""
+    now = datetime.utcnow()
+    return [
+        ('signup/signin: user by email', user_collection, {'email': 'someone@example.com'}, None),
+        ('display_events: upcoming page', event_collection, {'starts_at': {'$gt': now}}, [('starts_at', 1), ('_id', 1)]),
+        ('display_events: past page', event_collection, {'starts_at': {'$lte': now}}, [('starts_at', -1), ('_id', -1)]),
+        ('display_events: event by id', event_collection, {'_id': ObjectId()}, None),
+        ('events by organizer', event_collection, {'organizer': 'user-id'}, [('starts_at', 1)]),
+        ('search: text match', event_collection, {'$text': {'$search': 'jazz'}}, None),
+        ('calendar: buckets of a month', day_bucket_collection, {'_id': {'$gte': '2024-05-01', '$lte': '2024-05-31'}}, [('_id', 1)]),
+        ('calendar refresh: events of one day', event_collection,
+         {'starts_at': {'$gte': datetime(2024, 5, 1), '$lt': datetime(2024, 5, 2)}}, [('starts_at', 1), ('_id', 1)]),
+        ('event/userevent: venue conflicts', event_collection,
+         {'venue': 'Main Hall', 'starts_at': {'$gt': datetime(2024, 4, 30, 20), '$lt': datetime(2024, 5, 1, 22)},
+          'ends_at': {'$gt': datetime(2024, 5, 1, 20)}}, [('starts_at', 1)]),
+        ('adminConflicts: events by venue', event_collection,
+         {'starts_at': {'$gte': datetime(2024, 5, 1), '$lt': datetime(2024, 6, 1)}, 'ends_at': {'$type': 'date'}},
+         [('venue', 1), ('starts_at', 1)]),
+        ('display_events/calendar: series in a window', series_collection,
+         {'starts_at': {'$lte': datetime(2024, 6, 1)}, 'last_starts_at': {'$gte': datetime(2024, 5, 1)}}, None),
+        ('event/userevent: series at a venue', series_collection,
+         {'venue': 'Main Hall', 'starts_at': {'$lte': datetime(2024, 5, 1, 22)}, 'last_starts_at': {'$gte': datetime(2024, 4, 30, 20)}}, None),
+        ('display_events/calendar: materialized occurrences', event_collection,
+         {'series_id': {'$in': ['series-id']}, 'starts_at': {'$gte': datetime(2024, 5, 1), '$lte': datetime(2024, 6, 1)}}, None),
+        ('register_event: registration by event and user', registration_collection, {'event_id': 'event-id', 'user_id': 'user-id'}, None),
+        ('registrations by user', registration_collection, {'user_id': 'user-id'}, [('registered_at', 1)]),
+        ('admin_approve_event: approval by id', approval_collection, {'_id': ObjectId()}, None),
+        ('adminApproval listing', approval_collection, {'approved': None}, [('requested_at', 1), ('_id', 1)]),
+        ('adminApproval listing by action', approval_collection, {'approved': None, 'action': 'post'}, [('requested_at', 1), ('_id', 1)]),
+        ('adminApproval listing by user', approval_collection, {'approved': None, 'user_id': 'user-id'}, [('requested_at', 1), ('_id', 1)]),
+    ]
+
+
+def plan_stages(plan):
+    stages = [plan.get('stage')]
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            stages.extend(plan_stages(child))
+    return stages
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes the views rely on and report queries that still scan collections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--explain', action='store_true',
+                            help='Explain the queries the views run and flag collection scans.')
+
+    def handle(self, *args, **options):
+        failed = False
+        for indexes in (USER_INDEXES, EVENT_INDEXES):
+            for collection, models in indexes.items():
+                try:
+                    names = ensure_indexes({collection: models})[collection.name]
+                    self.stdout.write(f"{collection.name}: {', '.join(names)}")
+                except Exception as e:
+                    failed = True
+                    self.stderr.write(f"{collection.name}: could not create indexes: {e}")
+
+        if options['explain']:
+            self.explain()
+        if failed:
+            self.stderr.write(self.style.ERROR('Some indexes could not be created.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All indexes are in place.'))
+
+    def explain(self):
+        self.stdout.write('')
+        for label, collection, query, sort in view_queries():
+            cursor = collection.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            try:
+                plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+            except Exception as e:
+                self.stdout.write(f"unknown   {label}: explain failed ({e})")
+                continue
+            # Newer servers nest the classic plan under queryPlan.
+            stages = plan_stages(plan.get('queryPlan', plan))
+            if 'COLLSCAN' in stages:
+                self.stdout.write(self.style.WARNING(f"COLLSCAN  {label}: {' <- '.join(stages)}"))
+            else:
+                self.stdout.write(f"ok        {label}: {' <- '.join(stages)}")
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from authentication.models import user_collection
+from events.models import event_collection, registration_collection, Registration, WAITLISTED
+
+DUPLICATE_KEY = 11000
+
+
+class Command(BaseCommand):
+    help = ("Move the attendees arrays on events (and events arrays on users) into the "
+            "registrations collection and set attendee_count and waitlist_count from it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--keep-arrays', action='store_true',
+                            help='Leave the old arrays in place instead of unsetting them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        inserted = self.copy_arrays(event_collection, 'attendees', lambda doc, value: (str(doc['_id']), value), batch_size)
+        inserted += self.copy_arrays(user_collection, 'events', lambda doc, value: (value, str(doc['_id'])), batch_size)
+        self.stdout.write(f"registrations: inserted {inserted}")
+
+        counted = self.recount(batch_size)
+        self.stdout.write(f"events: set attendee_count and waitlist_count on {counted} documents")
+
+        if not options['keep_arrays']:
+            for collection, field in ((event_collection, 'attendees'), (user_collection, 'events')):
+                result = collection.update_many({field: {'$exists': True}}, {'$unset': {field: ''}})
+                self.stdout.write(f"{collection.name}: removed {field} from {result.modified_count} documents")
+        self.stdout.write(self.style.SUCCESS('Migration complete'))
+
+    def copy_arrays(self, collection, field, pair, batch_size):
+        """Insert one registration per array entry; pairs already registered are skipped."""
+        inserted = 0
+        batch = []
+        cursor = collection.find({field: {'$exists': True, '$ne': []}}, {field: 1}, batch_size=batch_size)
+        for doc in cursor:
+            for value in doc.get(field) or []:
+                event_id, user_id = pair(doc, str(value))
+                batch.append(Registration(event_id, user_id).to_dict())
+                if len(batch) >= batch_size:
+                    inserted += self.insert(batch)
+                    batch = []
+                    self.stdout.write(f"{collection.name}.{field}: {inserted} registrations inserted")
+        if batch:
+            inserted += self.insert(batch)
+        return inserted
+
+    def insert(self, batch):
+        try:
+            return len(registration_collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != DUPLICATE_KEY for error in errors):
+                raise
+            return e.details['nInserted']
+
+    def recount(self, batch_size):
+        """Set both counters from registrations; ones without a status are seated."""
+        waitlisted = {'$cond': [{'$eq': ['$status', WAITLISTED]}, 1, 0]}
+        counts = registration_collection.aggregate([{'$group': {
+            '_id': '$event_id',
+            'waitlisted': {'$sum': waitlisted},
+            'total': {'$sum': 1},
+        }}])
+        counted = {row['_id']: (row['total'] - row['waitlisted'], row['waitlisted']) for row in counts}
+        updated = 0
+        batch = []
+        for doc in event_collection.find({}, {'_id': 1}, batch_size=batch_size):
+            attendees, waitlist = counted.get(str(doc['_id']), (0, 0))
+            batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {'attendee_count': attendees, 'waitlist_count': waitlist}}))
+            if len(batch) >= batch_size:
+                updated += event_collection.bulk_write(batch, ordered=False).matched_count
+                batch = []
+        if batch:
+            updated += event_collection.bulk_write(batch, ordered=False).matched_count
+        return updated
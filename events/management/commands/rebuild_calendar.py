@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from events.calendar import bucket_horizon, day_key, refresh_days, series_days
+from events.models import day_bucket_collection, event_collection, series_collection
+
+
+class Command(BaseCommand):
+    help = "Rebuild every event_day_buckets document from the events and event_series collections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Bucket every series up to today's horizon, then recompute each day
+        # holding an event or a bucketed occurrence through refresh_days, so
+        # the rebuild is ordered against concurrent writers like any refresh.
+        series_collection.update_many({}, {'$set': {'bucketed_until': bucket_horizon()}})
+        days = set()
+        for series in series_collection.find():
+            days |= series_days(series)
+        cursor = event_collection.find({'starts_at': {'$type': 'date'}}, {'starts_at': 1, '_id': 0}, batch_size=batch_size)
+        days |= {day_key(doc['starts_at']) for doc in cursor}
+
+        days = sorted(days)
+        for i in range(0, len(days), batch_size):
+            refresh_days(days[i:i + batch_size])
+
+        removed = day_bucket_collection.delete_many({'_id': {'$nin': days}}).deleted_count
+        self.stdout.write(self.style.SUCCESS(
+            f"event_day_buckets: wrote {len(days)} days, removed {removed} stale buckets"
+        ))
@@ -1,12 +1,99 @@
 from db_connection import db
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from pymongo import IndexModel, ASCENDING, TEXT
 
 event_collection=db['events']
 approval_collection=db['approvals']
 pending_events_collection=db['pending_events']
+registration_collection=db['registrations']
+# Per-day counts for calendar/, maintained by events.calendar.
+day_bucket_collection=db['event_day_buckets']
+# Recurring events, expanded on demand by events.recurrence.
+series_collection=db['event_series']
+
+EVENT_INDEXES = [
+    # Serves the upcoming/past keyset pages in display_events.
+    IndexModel([('starts_at', ASCENDING), ('_id', ASCENDING)], name='starts_at_id'),
+    # Ownership checks and lookups of an organizer's events.
+    IndexModel([('organizer', ASCENDING), ('starts_at', ASCENDING)], name='organizer_starts_at'),
+    # Venue double-booking checks and the admin conflict report.
+    IndexModel([('venue', ASCENDING), ('starts_at', ASCENDING), ('ends_at', ASCENDING)], name='venue_starts_at_ends_at'),
+    # One materialized event per series occurrence.
+    IndexModel([('occurrence_id', ASCENDING)], name='occurrence_id_unique', unique=True, sparse=True),
+    # Materialized occurrences in a window, which expansion must skip.
+    IndexModel([('series_id', ASCENDING), ('starts_at', ASCENDING)], name='series_id_starts_at',
+               partialFilterExpression={'series_id': {'$exists': True}}),
+    # Full-text search in events/search/; a collection can have only one.
+    IndexModel([('title', TEXT), ('venue', TEXT), ('description', TEXT)], name='event_text',
+               weights={'title': 10, 'venue': 5, 'description': 1}, default_language='english'),
+]
+
+REGISTRATION_INDEXES = [
+    # One registration per user per event; also serves per-event lookups.
+    IndexModel([('event_id', ASCENDING), ('user_id', ASCENDING)], name='event_user_unique', unique=True),
+    # A user's registrations, newest first.
+    IndexModel([('user_id', ASCENDING), ('registered_at', ASCENDING)], name='user_registered_at'),
+    # Head of an event's waitlist, for FIFO promotion.
+    IndexModel([('event_id', ASCENDING), ('status', ASCENDING), ('registered_at', ASCENDING), ('_id', ASCENDING)],
+               name='event_status_registered_at'),
+]
+
+APPROVAL_INDEXES = [
+    # Pending-queue pages, optionally filtered by action or requester.
+    IndexModel([('approved', ASCENDING), ('requested_at', ASCENDING), ('_id', ASCENDING)], name='approved_requested_at'),
+    IndexModel([('approved', ASCENDING), ('action', ASCENDING), ('requested_at', ASCENDING), ('_id', ASCENDING)], name='approved_action_requested_at'),
+    IndexModel([('approved', ASCENDING), ('user_id', ASCENDING), ('requested_at', ASCENDING), ('_id', ASCENDING)], name='approved_user_requested_at'),
+]
+
+SERIES_INDEXES = [
+    # Series with occurrences in a listing or calendar window.
+    IndexModel([('starts_at', ASCENDING), ('last_starts_at', ASCENDING)], name='starts_at_last_starts_at'),
+    # Venue conflict checks: the series at one venue around a slot.
+    IndexModel([('venue', ASCENDING), ('starts_at', ASCENDING)], name='venue_starts_at'),
+]
+
+INDEXES = {
+    event_collection: EVENT_INDEXES,
+    series_collection: SERIES_INDEXES,
+    approval_collection: APPROVAL_INDEXES,
+    registration_collection: REGISTRATION_INDEXES,
+}
+
+TIME_FORMATS = ('%H:%M:%S', '%H:%M')
+
+def parse_time(value):
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"time data '{value}' does not match any of {TIME_FORMATS}")
+
+def to_starts_at(date, time):
+    """Combine an event's date and time into a naive UTC datetime.
+
+    Strings are read as UTC wall-clock values, which is how the API has always
+    interpreted them. Timezone-aware values are converted to UTC first.
+    """
+    if isinstance(date, str):
+        date = datetime.strptime(date, '%Y-%m-%d').date()
+    elif isinstance(date, datetime):
+        date = date.date()
+    if isinstance(time, str):
+        time = parse_time(time)
+    elif isinstance(time, datetime):
+        time = time.timetz()
+    starts_at = datetime.combine(date, time.replace(tzinfo=None))
+    if time.tzinfo is not None:
+        starts_at = starts_at.replace(tzinfo=time.tzinfo).astimezone(timezone.utc).replace(tzinfo=None)
+    return starts_at
+
+def default_duration():
+    return getattr(settings, 'EVENTS_DEFAULT_DURATION', 120)
 
 class Event:
-    def __init__(self, title, description, venue, date, time, organizer, attendees=None, approved=False):
+    def __init__(self, title, description, venue, date, time, organizer, approved=False, capacity=None, duration=None, recurrence=None):
         self.title = title
         self.description = description
         self.venue = venue
@@ -19,29 +106,69 @@ class Event:
         else:
             self.time = time.strftime('%H:%M:%S')
         self.organizer = organizer
-        self.attendees = attendees if attendees is not None else []
+        # Attendees live in registration_collection; the event only keeps the
+        # seat and waitlist counts, and an optional seat limit (None: unlimited).
+        self.attendee_count = 0
+        self.waitlist_count = 0
+        self.capacity = capacity
         self.approved=approved
+        self.starts_at = to_starts_at(date, time)
+        # Minutes the event holds its venue, for double-booking checks.
+        self.duration = duration or default_duration()
+        self.ends_at = self.starts_at + timedelta(minutes=self.duration)
+        # A rule from events.recurrence.parse_recurrence makes this a series
+        # whose first occurrence starts at starts_at.
+        self.recurrence = recurrence
         self.created_at = datetime.utcnow()
 
     def to_dict(self):
-        return {
+        doc = {
             "title": self.title,
             "description": self.description,
             "venue": self.venue,
             "date": self.date,
             "time": self.time,
+            "starts_at": self.starts_at,
+            "duration": self.duration,
+            "ends_at": self.ends_at,
             "organizer": self.organizer,
-            "attendees": self.attendees,
+            "attendee_count": self.attendee_count,
+            "waitlist_count": self.waitlist_count,
+            "capacity": self.capacity,
             "approved": self.approved,
             "created_at": self.created_at,
         }
+        if self.recurrence:
+            doc["recurrence"] = self.recurrence
+        return doc
         
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+
+class Registration:
+    def __init__(self, event_id, user_id, status=REGISTERED):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.status = status
+        self.registered_at = datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            "event_id": self.event_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "registered_at": self.registered_at
+        }
+
 class EventApproval:
-    def __init__(self, event_id, user_id, action, approved=None):
+    def __init__(self, event_id, user_id, action, approved=None, payload=None):
         self.event_id = event_id
         self.user_id = user_id
         self.action = action
         self.approved = approved
+        # The event to insert ('post') or the fields to $set ('put'), kept on
+        # the approval itself so deciding it needs no other reads.
+        self.payload = payload
         self.requested_at = datetime.utcnow()
 
     def to_dict(self):
@@ -50,5 +177,6 @@ class EventApproval:
             "user_id": self.user_id,
             "action": self.action,
             "approved": self.approved,
+            "payload": self.payload,
             "requested_at": self.requested_at
         }
\ No newline at end of file
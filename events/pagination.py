@@ -0,0 +1,94 @@
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING
+
+UPCOMING = 'upcoming'
+PAST = 'past'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size(raw):
+    default = getattr(settings, 'EVENTS_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'EVENTS_MAX_PAGE_SIZE', 100)
+    if raw in (None, ''):
+        return default
+    size = int(raw)
+    if size < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(size, maximum)
+
+
+def encode_cursor(doc, field='starts_at'):
+    raw = f"{doc[field].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (datetime, id) position encoded by encode_cursor.
+
+    The id is an ObjectId, or the string id of a series occurrence.
+    """
+    try:
+        starts_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        series_id, sep, _ = event_id.partition('@')
+        if sep and ObjectId.is_valid(series_id):
+            return datetime.fromisoformat(starts_at), event_id
+        return datetime.fromisoformat(starts_at), ObjectId(event_id)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def build_page_query(status, now, cursor=None, extra=None):
+    """Return (filter, sort) for one keyset page of upcoming or past events.
+
+    Upcoming events are ordered soonest first, past events most recent first;
+    `_id` breaks ties between events starting at the same instant. `extra`
+    is an additional filter the page must also match.
+    """
+    if status == UPCOMING:
+        query = {'starts_at': {'$gt': now}}
+        direction, op = ASCENDING, '$gt'
+    else:
+        query = {'starts_at': {'$lte': now}}
+        direction, op = DESCENDING, '$lt'
+
+    if cursor:
+        starts_at, event_id = decode_cursor(cursor)
+        if isinstance(event_id, str):
+            # A series occurrence. Strings sort before every ObjectId, so the
+            # events at that instant all follow it on an upcoming page and
+            # all precede it on a past one.
+            ties = [{'starts_at': starts_at}] if op == '$gt' else []
+        else:
+            ties = [{'starts_at': starts_at, '_id': {op: event_id}}]
+        query = {'$and': [query, {'$or': [{'starts_at': {op: starts_at}}] + ties}]}
+    if extra:
+        query = {'$and': [extra, query]}
+    return query, [('starts_at', direction), ('_id', direction)]
+
+
+def page_result(docs, limit):
+    """Trim the limit + 1 documents of a page query to (page, next_cursor)."""
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+    return docs, next_cursor
+
+
+def fetch_page(collection, status, now, limit, cursor=None, projection=None, extra=None):
+    query, sort = build_page_query(status, now, cursor, extra)
+    # Fetch one extra document to learn whether another page exists.
+    return page_result(list(collection.find(query, projection).sort(sort).limit(limit + 1)), limit)
+
+
+async def afetch_page(collection, status, now, limit, cursor=None, projection=None, extra=None):
+    """fetch_page on a Motor collection."""
+    query, sort = build_page_query(status, now, cursor, extra)
+    return page_result(await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1), limit)
@@ -0,0 +1,360 @@
+"""Recurring events, stored once as a series and expanded on demand.
+
+A series lives in event_series: an event document whose starts_at is the
+first occurrence, plus a recurrence rule and last_starts_at, the time after
+which no occurrence starts (FOREVER for open-ended series). Listings and the
+calendar read the series overlapping the window they show and expand only
+that window, so their cost follows the number of series, not occurrences.
+
+Occurrences have string ids, '<series id>@<YYYYMMDDTHHMMSS>'. Registering for
+one materializes it into `events` as an ordinary event carrying series_id and
+that occurrence_id; from then on it is read from `events` and expansion
+skips it.
+"""
+from calendar import monthrange
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo.errors import DuplicateKeyError
+
+from .models import event_collection, series_collection
+from .pagination import UPCOMING, decode_cursor, encode_cursor
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+# last_starts_at of series without an end.
+FOREVER = datetime(9999, 12, 31)
+OCCURRENCE_FORMAT = '%Y%m%dT%H%M%S'
+# Series fields that occurrences do not inherit.
+SERIES_FIELDS = ('_id', 'recurrence', 'last_starts_at', 'bucketed_until')
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def get_config():
+    config = {'HORIZON_DAYS': 365, 'MAX_COUNT': 1000}
+    config.update(getattr(settings, 'EVENTS_RECURRENCE', {}))
+    return config
+
+
+def parse_recurrence(raw):
+    """Validate the `recurrence` of an event POST and return the stored rule.
+
+    {'freq': 'daily' | 'weekly' | 'monthly', 'interval': 1, 'weekdays': [0, 2],
+    'count': 10, 'until': 'YYYY-MM-DD'}; only freq is required. weekdays
+    (Monday is 0) apply to weekly series, and the series ends after `count`
+    occurrences or on `until`, whichever comes first.
+    """
+    if not isinstance(raw, dict):
+        raise RecurrenceError('recurrence must be an object')
+    unknown = set(raw) - {'freq', 'interval', 'weekdays', 'count', 'until'}
+    if unknown:
+        raise RecurrenceError(f"Unknown recurrence fields: {', '.join(sorted(unknown))}")
+    if raw.get('freq') not in FREQUENCIES:
+        raise RecurrenceError(f"recurrence freq must be one of {', '.join(FREQUENCIES)}")
+    rule = {'freq': raw['freq'], 'interval': raw.get('interval', 1), 'weekdays': None,
+            'count': raw.get('count'), 'until': None}
+    if not is_positive_int(rule['interval']):
+        raise RecurrenceError('recurrence interval must be a positive integer')
+    if raw.get('weekdays') is not None:
+        weekdays = raw['weekdays']
+        if rule['freq'] != 'weekly':
+            raise RecurrenceError('recurrence weekdays only apply to weekly series')
+        if (not isinstance(weekdays, list) or not weekdays
+                or not all(isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in weekdays)):
+            raise RecurrenceError('recurrence weekdays must be a list of days from 0 (Monday) to 6 (Sunday)')
+        rule['weekdays'] = sorted(set(weekdays))
+    max_count = get_config()['MAX_COUNT']
+    if rule['count'] is not None and not (is_positive_int(rule['count']) and rule['count'] <= max_count):
+        raise RecurrenceError(f'recurrence count must be an integer from 1 to {max_count}')
+    if raw.get('until') is not None:
+        try:
+            # Inclusive: occurrences may start at any time on that day.
+            rule['until'] = datetime.strptime(raw['until'], '%Y-%m-%d') + timedelta(days=1) - timedelta(microseconds=1)
+        except (TypeError, ValueError):
+            raise RecurrenceError('recurrence until must be a date in YYYY-MM-DD format')
+    return rule
+
+
+def is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def new_series(event):
+    """The event_series document for an Event created with a recurrence rule."""
+    series = event.to_dict()
+    rule = series['recurrence']
+    series['last_starts_at'] = rule['until'] or FOREVER
+    if rule['count'] is not None:
+        starts = list(islice(occurrence_starts(series, series['starts_at'], series['last_starts_at']), rule['count']))
+        if starts:
+            series['last_starts_at'] = starts[-1]
+    if series['last_starts_at'] < series['starts_at']:
+        raise RecurrenceError('recurrence until must not be before the first occurrence')
+    return series
+
+
+def occurrence_starts(series, start, end):
+    """Start times of the series' occurrences within [start, end], in order.
+
+    Jumps straight to the period containing `start`, so the cost is the
+    number of occurrences in the window, however old the series is.
+    """
+    rule, first = series['recurrence'], series['starts_at']
+    start, end = max(start, first), min(end, series['last_starts_at'])
+    if start > end:
+        return
+    interval = rule['interval']
+    if rule['freq'] == 'monthly':
+        months = (start.year - first.year) * 12 + start.month - first.month
+        period = max(0, months // interval - 1)
+        while True:
+            year, month = divmod(first.month - 1 + period * interval, 12)
+            year, month = first.year + year, month + 1
+            if (year, month) > (end.year, end.month):
+                return
+            # Months without that day (the 31st, say) are skipped.
+            if first.day <= monthrange(year, month)[1]:
+                starts_at = first.replace(year=year, month=month)
+                if start <= starts_at <= end:
+                    yield starts_at
+            period += 1
+    step = timedelta(days=interval) if rule['freq'] == 'daily' else timedelta(weeks=interval)
+    offsets = [timedelta(0)]
+    if rule['weekdays']:
+        offsets = [timedelta(days=day - first.weekday()) for day in rule['weekdays']]
+    period = max(0, (start - first) // step - 1)
+    while True:
+        base = first + period * step
+        if base + offsets[0] > end:
+            return
+        for offset in offsets:
+            starts_at = base + offset
+            if starts_at >= first and start <= starts_at <= end:
+                yield starts_at
+        period += 1
+
+
+def occurrence_id(series_id, starts_at):
+    return f'{series_id}@{starts_at.strftime(OCCURRENCE_FORMAT)}'
+
+
+def parse_occurrence_id(value):
+    """Return (series ObjectId, starts_at) for an occurrence id, or None for anything else."""
+    series_id, sep, starts = str(value).partition('@')
+    if not sep or not ObjectId.is_valid(series_id):
+        return None
+    try:
+        return ObjectId(series_id), datetime.strptime(starts, OCCURRENCE_FORMAT)
+    except ValueError:
+        return None
+
+
+def occurrence(series, starts_at):
+    """The event document of one occurrence, as it would be materialized."""
+    doc = {field: value for field, value in series.items() if field not in SERIES_FIELDS}
+    doc.update(
+        _id=occurrence_id(series['_id'], starts_at),
+        occurrence_id=occurrence_id(series['_id'], starts_at),
+        series_id=str(series['_id']),
+        starts_at=starts_at,
+        date=starts_at.strftime('%Y-%m-%d'),
+        attendee_count=0,
+        waitlist_count=0,
+    )
+    if 'duration' in series:
+        doc['ends_at'] = starts_at + timedelta(minutes=series['duration'])
+    return doc
+
+
+def window_query(start, end):
+    """Series with at least one occurrence that may start within [start, end]."""
+    return {'starts_at': {'$lte': end}, 'last_starts_at': {'$gte': start}}
+
+
+def materialized_query(series, start, end):
+    return {'series_id': {'$in': [str(s['_id']) for s in series]}, 'starts_at': {'$gte': start, '$lte': end}}
+
+
+def series_projection(projection):
+    fields = dict(projection or {})
+    fields.update({'starts_at': 1, 'duration': 1, 'recurrence': 1, 'last_starts_at': 1})
+    return fields
+
+
+def expand(series, start, end, materialized=()):
+    """Occurrence documents of `series` within [start, end], minus materialized ones."""
+    for one in series:
+        for starts_at in occurrence_starts(one, start, end):
+            if (str(one['_id']), starts_at) not in materialized:
+                yield occurrence(one, starts_at)
+
+
+def page_key(doc):
+    # The listing order: occurrence ids are strings, which MongoDB sorts
+    # before every ObjectId.
+    event_id = doc['_id']
+    return doc['starts_at'], '@' not in str(event_id), str(event_id)
+
+
+def page_window(status, now, cursor, events, next_cursor):
+    """Return (start, end, position) of the time span one listing page covers.
+
+    A full page of events ends the span at its last event; otherwise it runs
+    HORIZON_DAYS past the page's first position.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    horizon = timedelta(days=get_config()['HORIZON_DAYS'])
+    if status == UPCOMING:
+        start = position[0] if position else now
+        end = events[-1]['starts_at'] if next_cursor else start + horizon
+    else:
+        end = position[0] if position else now
+        start = events[-1]['starts_at'] if next_cursor else end - horizon
+    return start, end, position
+
+
+def due_occurrences(status, now, limit, position, series, start, end, materialized, projection=None):
+    """Occurrences that may appear on a listing page: per series, its first limit + 1 in page order."""
+    upcoming = status == UPCOMING
+    position_key = page_key({'starts_at': position[0], '_id': position[1]}) if position else None
+    fields = set(projection or ()) | {'_id', 'series_id'}
+    due = []
+    for one in series:
+        kept = deque(maxlen=limit + 1)
+        for doc in expand([one], start, end, materialized):
+            if (doc['starts_at'] > now) != upcoming:
+                continue
+            if position_key and (page_key(doc) <= position_key if upcoming else page_key(doc) >= position_key):
+                continue
+            kept.append({field: value for field, value in doc.items() if field in fields})
+            if upcoming and len(kept) > limit:
+                break
+        due.extend(kept)
+    return due
+
+
+def merge_page(status, limit, events, next_cursor, occurrences):
+    merged = sorted(events + occurrences, key=page_key, reverse=status != UPCOMING)
+    page = merged[:limit]
+    more = next_cursor is not None or len(merged) > limit
+    return page, encode_cursor(page[-1]) if more and page else None
+
+
+def expand_page(status, now, limit, cursor, events, next_cursor, projection=None):
+    """Add the series occurrences due on one display_events page.
+
+    Costs one indexed read of the series overlapping the page, plus one for
+    their materialized occurrences when there are any.
+    """
+    start, end, position = page_window(status, now, cursor, events, next_cursor)
+    series = list(series_collection.find(window_query(start, end), series_projection(projection)))
+    if not series:
+        return events, next_cursor
+    materialized = {(doc['series_id'], doc['starts_at'])
+                    for doc in event_collection.find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})}
+    due = due_occurrences(status, now, limit, position, series, start, end, materialized, projection)
+    return merge_page(status, limit, events, next_cursor, due)
+
+
+async def aexpand_page(db, status, now, limit, cursor, events, next_cursor, projection=None):
+    """expand_page for the Motor views; `db` is the async database."""
+    start, end, position = page_window(status, now, cursor, events, next_cursor)
+    series = await db['event_series'].find(window_query(start, end), series_projection(projection)).to_list(None)
+    if not series:
+        return events, next_cursor
+    docs = db['events'].find(materialized_query(series, start, end), {'series_id': 1, 'starts_at': 1})
+    materialized = {(doc['series_id'], doc['starts_at']) async for doc in docs}
+    due = due_occurrences(status, now, limit, position, series, start, end, materialized, projection)
+    return merge_page(status, limit, events, next_cursor, due)
+
+
+def find_occurrence(event_id):
+    """The event an occurrence id names: its materialized event, else the expanded occurrence."""
+    series_id, starts_at = parse_occurrence_id(event_id)
+    event = event_collection.find_one({'occurrence_id': event_id}, {'_id': 0})
+    if event is not None:
+        return event
+    series = series_collection.find_one({'_id': series_id})
+    return expanded_occurrence(series, starts_at)
+
+
+async def afind_occurrence(db, event_id):
+    series_id, starts_at = parse_occurrence_id(event_id)
+    event = await db['events'].find_one({'occurrence_id': event_id}, {'_id': 0})
+    if event is not None:
+        return event
+    series = await db['event_series'].find_one({'_id': series_id})
+    return expanded_occurrence(series, starts_at)
+
+
+def expanded_occurrence(series, starts_at):
+    if series is None or starts_at not in occurrence_starts(series, starts_at, starts_at):
+        return None
+    doc = occurrence(series, starts_at)
+    del doc['_id']
+    return doc
+
+
+def materialize(event_id, create=True):
+    """Resolve an event id that may name an occurrence to a stored event id.
+
+    Returns (event_id, starts_at): plain event ids come back unchanged, and
+    an occurrence is inserted into `events` first unless create is False.
+    starts_at is set only when an event was inserted, so the caller can
+    refresh that calendar day. event_id is None when the occurrence does not
+    exist, or is not materialized and create is False. Raises VenueConflict
+    when another booking has taken the occurrence's slot since the series was
+    checked.
+    """
+    parsed = parse_occurrence_id(event_id)
+    if parsed is None:
+        return event_id, None
+    series_id, starts_at = parsed
+    query = {'occurrence_id': event_id}
+    existing = event_collection.find_one(query, {'_id': 1})
+    if existing is not None:
+        return str(existing['_id']), None
+    doc = expanded_occurrence(series_collection.find_one({'_id': series_id}) if create else None, starts_at)
+    if doc is None:
+        return None, None
+    # conflicts expands series, so it imports this module and not the reverse.
+    from .conflicts import check_slot, slot_after
+    slot = slot_after(doc)
+    if slot:
+        check_slot(*slot, exclude_id=event_id)
+    doc['created_at'] = datetime.utcnow()
+    try:
+        return str(event_collection.insert_one(doc).inserted_id), starts_at
+    except DuplicateKeyError:
+        # Materialized by a concurrent registration.
+        return str(event_collection.find_one(query, {'_id': 1})['_id']), None
+
+
+async def amaterialize(db, event_id, create=True):
+    """materialize for the Motor views."""
+    parsed = parse_occurrence_id(event_id)
+    if parsed is None:
+        return event_id, None
+    series_id, starts_at = parsed
+    query = {'occurrence_id': event_id}
+    existing = await db['events'].find_one(query, {'_id': 1})
+    if existing is not None:
+        return str(existing['_id']), None
+    series = await db['event_series'].find_one({'_id': series_id}) if create else None
+    doc = expanded_occurrence(series, starts_at)
+    if doc is None:
+        return None, None
+    from .conflicts import acheck_slot, slot_after
+    slot = slot_after(doc)
+    if slot:
+        await acheck_slot(db['events'], *slot, exclude_id=event_id)
+    doc['created_at'] = datetime.utcnow()
+    try:
+        return str((await db['events'].insert_one(doc)).inserted_id), starts_at
+    except DuplicateKeyError:
+        return str((await db['events'].find_one(query, {'_id': 1}))['_id']), None
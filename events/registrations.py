@@ -0,0 +1,216 @@
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from authentication.models import user_collection
+from db_connection import run_transaction, run_transaction_async
+from .models import event_collection, registration_collection, Registration, REGISTERED, WAITLISTED
+
+# Oldest waitlisted registration first.
+WAITLIST_ORDER = [('registered_at', ASCENDING), ('_id', ASCENDING)]
+
+# Counter and status updates, shared by register/cancel and their async twins.
+TAKE_SEAT = {'$inc': {'attendee_count': 1}}
+FREE_SEAT = {'$inc': {'attendee_count': -1}}
+JOIN_WAITLIST = {'$inc': {'waitlist_count': 1}}
+LEAVE_WAITLIST = {'$inc': {'waitlist_count': -1}}
+SET_WAITLISTED = {'$set': {'status': WAITLISTED}}
+# Projection of a user's registrations, as read by user_registrations.
+USER_REGISTRATION_FIELDS = {'_id': 0, 'event_id': 1, 'status': 1}
+
+
+class RegistrationError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def has_seat():
+    """Filter matching events with no capacity or at least one free seat."""
+    return {'$or': [
+        {'capacity': None},
+        {'$expr': {'$lt': ['$attendee_count', '$capacity']}},
+    ]}
+
+
+def within_capacity():
+    """Filter matching events whose seats, counting one just freed, fit capacity."""
+    return {'$or': [
+        {'capacity': None},
+        {'$expr': {'$lte': ['$attendee_count', '$capacity']}},
+    ]}
+
+
+def waitlist_enabled():
+    return getattr(settings, 'EVENTS_WAITLIST_ENABLED', True)
+
+
+def registration_filter(event_id, user_id):
+    return {'event_id': event_id, 'user_id': user_id}
+
+
+def promotion():
+    """Update handing a freed seat to a waitlisted registration."""
+    return {'$set': {'status': REGISTERED, 'promoted_at': datetime.utcnow()}}
+
+
+def unknown_user():
+    return RegistrationError('Event not found or user already registered', 404)
+
+
+def rejected(event_exists):
+    """Error for a registration the event had no room for, or no event at all."""
+    if event_exists:
+        return RegistrationError('Event is full', 409)
+    return unknown_user()
+
+
+def existing_status(existing):
+    """Status a retried registration reports: that of the first attempt."""
+    if existing is None:
+        raise RegistrationError('Failed to register, Try again', 500)
+    return existing['status']
+
+
+def register(event_id, user_id):
+    """Register a user for an event and return the registration status.
+
+    The unique (event_id, user_id) index rejects duplicates, and the seat is
+    taken with a conditional $inc, so concurrent registrations cannot push
+    attendee_count past capacity. A full event puts the user on its waitlist.
+    Retrying a request returns the status of the existing registration, so
+    clients can safely resend after a timeout.
+    """
+    event_oid = ObjectId(event_id)
+    if not user_collection.find_one({'_id': ObjectId(user_id)}, {'_id': 1}):
+        raise unknown_user()
+
+    def unit(session):
+        registration_collection.insert_one(Registration(event_id, user_id).to_dict(), session=session)
+        result = event_collection.update_one({'_id': event_oid, **has_seat()}, TAKE_SEAT, session=session)
+        if result.matched_count:
+            return REGISTERED
+
+        if waitlist_enabled():
+            result = event_collection.update_one({'_id': event_oid}, JOIN_WAITLIST, session=session)
+            if result.matched_count:
+                registration_collection.update_one(registration_filter(event_id, user_id), SET_WAITLISTED,
+                                                   session=session)
+                return WAITLISTED
+        if session is None:
+            registration_collection.delete_one(registration_filter(event_id, user_id))
+        raise rejected(event_collection.find_one({'_id': event_oid}, {'_id': 1}, session=session))
+
+    try:
+        return run_transaction(unit)
+    except DuplicateKeyError:
+        # A retry, or a concurrent duplicate: report what the first one got.
+        return existing_status(registration_collection.find_one(registration_filter(event_id, user_id), {'status': 1}))
+
+
+async def aregister(db, event_id, user_id):
+    """register for the Motor views."""
+    event_oid = ObjectId(event_id)
+    events, registrations = db['events'], db['registrations']
+    if not await db['users'].find_one({'_id': ObjectId(user_id)}, {'_id': 1}):
+        raise unknown_user()
+
+    async def unit(session):
+        await registrations.insert_one(Registration(event_id, user_id).to_dict(), session=session)
+        result = await events.update_one({'_id': event_oid, **has_seat()}, TAKE_SEAT, session=session)
+        if result.matched_count:
+            return REGISTERED
+        if waitlist_enabled():
+            result = await events.update_one({'_id': event_oid}, JOIN_WAITLIST, session=session)
+            if result.matched_count:
+                await registrations.update_one(registration_filter(event_id, user_id), SET_WAITLISTED, session=session)
+                return WAITLISTED
+        if session is None:
+            await registrations.delete_one(registration_filter(event_id, user_id))
+        raise rejected(await events.find_one({'_id': event_oid}, {'_id': 1}, session=session))
+
+    try:
+        return await run_transaction_async(unit)
+    except DuplicateKeyError:
+        return existing_status(await registrations.find_one(registration_filter(event_id, user_id), {'status': 1}))
+
+
+def cancel(event_id, user_id):
+    """Cancel a registration, handing a freed seat to the head of the waitlist.
+
+    The seat moves straight to the promoted registration, so attendee_count
+    never dips and a registration arriving meanwhile cannot jump the queue.
+    Returns the promoted user's id, or None.
+    """
+    event_oid = ObjectId(event_id)
+
+    def unit(session):
+        registration = registration_collection.find_one_and_delete(registration_filter(event_id, user_id),
+                                                                    session=session)
+        if registration is None:
+            raise RegistrationError('Registration not found', 404)
+        if registration['status'] == WAITLISTED:
+            event_collection.update_one({'_id': event_oid}, LEAVE_WAITLIST, session=session)
+            return None
+
+        promoted = None
+        # Only pass the seat on if the event is still within capacity after
+        # this cancellation; an admin may have lowered it meanwhile.
+        if event_collection.find_one({'_id': event_oid, **within_capacity()}, {'_id': 1}, session=session):
+            promoted = registration_collection.find_one_and_update(
+                {'event_id': event_id, 'status': WAITLISTED},
+                promotion(),
+                sort=WAITLIST_ORDER,
+                session=session
+            )
+        if promoted:
+            event_collection.update_one({'_id': event_oid}, LEAVE_WAITLIST, session=session)
+            return promoted['user_id']
+        event_collection.update_one({'_id': event_oid}, FREE_SEAT, session=session)
+        return None
+
+    return run_transaction(unit)
+
+
+async def acancel(db, event_id, user_id):
+    """cancel for the Motor views."""
+    event_oid = ObjectId(event_id)
+    events, registrations = db['events'], db['registrations']
+
+    async def unit(session):
+        registration = await registrations.find_one_and_delete(registration_filter(event_id, user_id), session=session)
+        if registration is None:
+            raise RegistrationError('Registration not found', 404)
+        if registration['status'] == WAITLISTED:
+            await events.update_one({'_id': event_oid}, LEAVE_WAITLIST, session=session)
+            return None
+        promoted = None
+        if await events.find_one({'_id': event_oid, **within_capacity()}, {'_id': 1}, session=session):
+            promoted = await registrations.find_one_and_update(
+                {'event_id': event_id, 'status': WAITLISTED},
+                promotion(),
+                sort=WAITLIST_ORDER,
+                session=session
+            )
+        if promoted:
+            await events.update_one({'_id': event_oid}, LEAVE_WAITLIST, session=session)
+            return promoted['user_id']
+        await events.update_one({'_id': event_oid}, FREE_SEAT, session=session)
+        return None
+
+    return await run_transaction_async(unit)
+
+
+def user_registrations(user_id):
+    """Map event id to registration status for every registration of a user."""
+    cursor = registration_collection.find({'user_id': user_id}, USER_REGISTRATION_FIELDS)
+    return {doc['event_id']: doc.get('status', REGISTERED) for doc in cursor}
+
+
+async def auser_registrations(db, user_id):
+    cursor = db['registrations'].find({'user_id': user_id}, USER_REGISTRATION_FIELDS)
+    return {doc['event_id']: doc.get('status', REGISTERED) async for doc in cursor}
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .models import event_collection
+
+# Fields returned for each hit, next to its relevance score.
+RESULT_FIELDS = ('title', 'venue', 'starts_at', 'organizer', 'attendee_count')
+VENUE_FACET_SIZE = 20
+
+
+class SearchError(ValueError):
+    pass
+
+
+def parse_day(raw, name):
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, '%Y-%m-%d')
+    except ValueError:
+        raise SearchError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def build_match(q, date_from=None, date_to=None):
+    match = {'$text': {'$search': q}}
+    if date_from or date_to:
+        match['starts_at'] = {}
+        if date_from:
+            match['starts_at']['$gte'] = date_from
+        if date_to:
+            # date_to is inclusive of the whole day.
+            match['starts_at']['$lt'] = date_to + timedelta(days=1)
+    return match
+
+
+def search_events(q, date_from=None, date_to=None, venue=None, page=1, limit=20):
+    """Return one page of events matching `q`, best match first, with facets.
+
+    Results, the total and the venue and month facets all come from a single
+    $facet aggregation over the text match, so the collection is scanned once.
+    The venue filter applies inside the facets; the venue facet itself is
+    counted without it, so clients can still offer the other venues.
+    """
+    max_results = getattr(settings, 'EVENTS_SEARCH_MAX_RESULTS', 1000)
+    skip = (page - 1) * limit
+    if skip >= max_results:
+        raise SearchError(f'Search results are limited to the first {max_results} matches')
+    limit = min(limit, max_results - skip)
+
+    in_venue = [{'$match': {'venue': venue}}] if venue else []
+    pipeline = [
+        {'$match': build_match(q, date_from, date_to)},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+        {'$facet': {
+            'results': in_venue + [
+                {'$sort': {'score': -1, 'starts_at': 1, '_id': 1}},
+                {'$skip': skip},
+                {'$limit': limit},
+                {'$project': {'score': 1, **{field: 1 for field in RESULT_FIELDS}}},
+            ],
+            'total': in_venue + [{'$count': 'count'}],
+            'venues': [
+                {'$group': {'_id': '$venue', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': VENUE_FACET_SIZE},
+            ],
+            'months': in_venue + [
+                {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$starts_at'}}, 'count': {'$sum': 1}}},
+                {'$sort': {'_id': 1}},
+            ],
+        }},
+    ]
+    facets = next(event_collection.aggregate(pipeline))
+    for doc in facets['results']:
+        doc['_id'] = str(doc['_id'])
+    return {
+        'results': facets['results'],
+        'total': facets['total'][0]['count'] if facets['total'] else 0,
+        'page': page,
+        'facets': {
+            'venues': [{'venue': row['_id'], 'count': row['count']} for row in facets['venues']],
+            'months': [{'month': row['_id'], 'count': row['count']} for row in facets['months'] if row['_id']],
+        },
+    }
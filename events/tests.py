@@ -1,3 +1,454 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+import jwt
+import bson
+from bson import ObjectId
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from authentication.models import INDEXES as USER_INDEXES, User, user_collection
+from db_connection import async_connections, connections, ensure_indexes
+from events.approval_queue import ApprovalQueue, QueueFull, approval_queue
+from events.approvals import submit
+from events.cache import DjangoCache, event_cache
+from events.live import get_feed
+from events.models import INDEXES as EVENT_INDEXES, Event, EventApproval, approval_collection, event_collection
+from events.recurrence import occurrence_id
+
+# Runs on the in-memory mongomock store (requirements-dev.txt), so no
+# MongoDB server or SQL database is needed.
+MONGO = {**settings.MONGO, 'URI': 'mongomock://tests', 'NAME': 'event_management_system_tests'}
+
+
+@override_settings(MONGO=MONGO, JWT_SECRET_KEY='test-secret', JWT_ALGORITHM='HS256')
+class MongoTestCase(SimpleTestCase):
+    """Starts every test from an empty, indexed database."""
+
+    def setUp(self):
+        connections.reset()
+        async_connections.reset()
+        connections.client.drop_database(MONGO['NAME'])
+        ensure_indexes({**USER_INDEXES, **EVENT_INDEXES})
+        event_cache.invalidate()
+
+    def tearDown(self):
+        connections.close()
+        async_connections.reset()
+
+    def token(self, user_id, role='USER'):
+        payload = {'user_id': user_id, 'role': role, 'exp': datetime.utcnow() + timedelta(hours=1)}
+        return 'Bearer ' + jwt.encode(payload, 'test-secret', algorithm='HS256')
+
+    def admin(self):
+        return self.token('admin', 'ADMIN')
+
+    def send(self, method, path, body=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': token} if token else {}
+        response = getattr(self.client, method)(path, json.dumps(body) if body is not None else None,
+                                                content_type='application/json', **headers)
+        return response.status_code, json.loads(response.content)
+
+    async def asend(self, method, path, body=None, token=None):
+        headers = {'Authorization': token} if token else {}
+        response = await getattr(self.async_client, method)(path, json.dumps(body) if body is not None else None,
+                                                            content_type='application/json', headers=headers)
+        return response.status_code, json.loads(response.content)
+
+    def add_user(self, name):
+        user = User(email=f'{name}@example.com', username=name, password='unused', role='USER')
+        return str(user_collection.insert_one(user.to_dict()).inserted_id)
+
+    def add_event(self, title, starts, venue='Main Hall', **fields):
+        event = Event(title=title, description='Test event', venue=venue, date=starts.strftime('%Y-%m-%d'),
+                      time=starts.strftime('%H:%M'), organizer='organizer', **fields)
+        return str(event_collection.insert_one(event.to_dict()).inserted_id)
+
+
+class DisplayEventsPaginationTests(MongoTestCase):
+    def test_cursor_pages_cover_every_event_once(self):
+        start = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(days=1)
+        # Pairs share a start time, so pages must break ties on _id.
+        ids = [self.add_event(f'Event {i}', start + timedelta(hours=i // 2), venue=f'Hall {i}') for i in range(7)]
+
+        seen, cursor = [], None
+        while True:
+            path = '/?status=upcoming&limit=3' + (f'&cursor={cursor}' if cursor else '')
+            status, body = self.send('get', path)
+            self.assertEqual(status, 200)
+            seen += [event['_id'] for event in body['upcoming_events']]
+            cursor = body['next_cursor']['upcoming']
+            if cursor is None:
+                break
+            # An event added before the cursor neither repeats nor shifts later pages.
+            self.add_event('Earlier', start - timedelta(hours=1), venue=f'Late hall {len(seen)}')
+
+        self.assertEqual(seen, ids)
+
+
+class RegistrationTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event_id = self.add_event('Workshop', datetime.utcnow() + timedelta(days=7), capacity=1)
+        self.first, self.second = self.add_user('first'), self.add_user('second')
+
+    def register(self, user_id, method='post'):
+        return self.send(method, '/registerEvent/', {'event_id': self.event_id, 'user_id': user_id}, self.token(user_id))
+
+    def counters(self):
+        return event_collection.find_one({'_id': ObjectId(self.event_id)}, {'_id': 0, 'attendee_count': 1, 'waitlist_count': 1})
+
+    def test_cancel_promotes_the_waitlist(self):
+        self.assertEqual(self.register(self.first)[1]['status'], 'registered')
+        status, body = self.register(self.second)
+        self.assertEqual((status, body['status']), (202, 'waitlisted'))
+
+        status, body = self.register(self.first, 'delete')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['promoted_user_id'], self.second)
+        self.assertEqual(self.counters(), {'attendee_count': 1, 'waitlist_count': 0})
+        status, body = self.send('get', '/myEvents/', token=self.token(self.second))
+        self.assertEqual([event['_id'] for event in body['upcoming_events']], [self.event_id])
+
+    def test_repeated_registration_reports_the_first_outcome(self):
+        self.register(self.first)
+        self.register(self.second)
+
+        self.assertEqual(self.register(self.first), (200, {'message': 'User registered to event successfully',
+                                                          'status': 'registered', 'event_id': self.event_id}))
+        self.assertEqual(self.register(self.second)[1]['status'], 'waitlisted')
+        self.assertEqual(self.counters(), {'attendee_count': 1, 'waitlist_count': 1})
+
+
+class VenueConflictTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d')
+        self.booked = self.add_event('Booked', datetime.strptime(f'{self.day} 10:00', '%Y-%m-%d %H:%M'), duration=120)
+
+    def create(self, time, venue='Main Hall', **fields):
+        body = {'title': 'New', 'description': 'Test event', 'venue': venue, 'date': self.day, 'time': time,
+                'organizer': 'organizer', **fields}
+        return self.send('post', '/event/', body, self.admin())
+
+    def test_overlapping_booking_is_rejected(self):
+        status, body = self.create('11:00')
+        self.assertEqual(status, 409)
+        self.assertEqual([event['_id'] for event in body['conflicts']], [self.booked])
+
+    def test_adjacent_and_other_venue_bookings_are_accepted(self):
+        self.assertEqual(self.create('12:00')[0], 201)
+        self.assertEqual(self.create('11:00', venue='Side Hall')[0], 201)
+
+    def test_moving_into_a_booked_slot_is_rejected(self):
+        self.create('08:00', duration=60)
+        moved = str(event_collection.find_one({'title': 'New'})['_id'])
+
+        status, body = self.send('put', '/event/', {'event_id': moved, 'duration': 180}, self.admin())
+        self.assertEqual((status, body['conflicts'][0]['_id']), (409, self.booked))
+        self.assertEqual(self.send('put', '/event/', {'event_id': moved, 'duration': 120}, self.admin())[0], 200)
+
+
+class ApprovalTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = self.add_user('organizer')
+        starts = datetime.utcnow() + timedelta(days=7)
+        payload = Event(title='Requested', description='Test event', venue='Main Hall', date=starts.strftime('%Y-%m-%d'),
+                        time='10:00', organizer=self.user_id).to_dict()
+        approval = EventApproval(event_id=str(ObjectId()), user_id=self.user_id, action='post', payload=payload)
+        self.approval_id = str(approval_collection.insert_one(approval.to_dict()).inserted_id)
+
+    def decide(self, action):
+        return self.send('post', '/adminApproval/', {'approval_id': self.approval_id, 'action': action}, self.admin())
+
+    def test_deciding_twice_is_a_conflict(self):
+        self.assertEqual(self.decide('approve')[0], 200)
+
+        self.assertEqual(self.decide('approve'), (409, {'error': 'Approval request has already been processed.'}))
+        self.assertEqual(self.decide('reject')[0], 409)
+        self.assertEqual(event_collection.count_documents({'title': 'Requested'}), 1)
+
+    def test_rejected_request_writes_nothing(self):
+        self.assertEqual(self.decide('reject')[0], 200)
+
+        self.assertEqual(self.decide('approve')[0], 409)
+        self.assertEqual(event_collection.count_documents({}), 0)
+
+
+class RecurringEventTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = datetime.utcnow().replace(hour=18, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def create(self, starts, **fields):
+        body = {'title': 'Weekly', 'description': 'Test event', 'venue': 'Main Hall', 'date': starts.strftime('%Y-%m-%d'),
+                'time': starts.strftime('%H:%M'), 'organizer': 'organizer', **fields}
+        return self.send('post', '/event/', body, self.admin())
+
+    def test_series_and_events_cannot_double_book_a_venue(self):
+        booked = self.add_event('Booked', self.first + timedelta(weeks=3, minutes=30))
+        self.assertEqual(self.create(self.first, recurrence={'freq': 'weekly'})[1]['conflicts'][0]['_id'], booked)
+
+        status, body = self.create(self.first + timedelta(hours=4), recurrence={'freq': 'weekly'})
+        series_id = body['series_id']
+        status, body = self.create(self.first + timedelta(weeks=5, hours=5))
+        self.assertEqual(status, 409)
+        self.assertEqual(body['conflicts'][0]['_id'], occurrence_id(series_id, self.first + timedelta(weeks=5, hours=4)))
+
+    def test_registering_for_an_occurrence_materializes_it_once(self):
+        series_id = self.create(self.first, recurrence={'freq': 'daily', 'count': 3})[1]['series_id']
+        status, body = self.send('get', '/?status=upcoming&limit=10')
+        second = body['upcoming_events'][1]['_id']
+        self.assertEqual(second, occurrence_id(series_id, self.first + timedelta(days=1)))
+
+        user_id = self.add_user('attendee')
+        status, body = self.send('post', '/registerEvent/', {'event_id': second, 'user_id': user_id}, self.token(user_id))
+        self.assertEqual(status, 200)
+        event_id = body['event_id']
+        status, body = self.send('post', '/registerEvent/', {'event_id': second, 'user_id': user_id}, self.token(user_id))
+        self.assertEqual((status, body['event_id']), (200, event_id))
+        self.assertEqual(event_collection.count_documents({'series_id': series_id}), 1)
+        status, body = self.send('get', '/?status=upcoming&limit=10')
+        self.assertEqual([event['_id'] for event in body['upcoming_events']][1], event_id)
+
+
+    def test_deleting_a_series_drops_its_cached_occurrences(self):
+        # The shared store keeps single-event keys across generations.
+        store = DjangoCache()
+        store.backend.clear()
+        with patch.object(event_cache, 'store', store):
+            series_id = self.create(self.first, recurrence={'freq': 'daily', 'count': 3})[1]['series_id']
+            second = occurrence_id(series_id, self.first + timedelta(days=1))
+            self.assertEqual(self.send('get', f'/?id={second}')[1]['event']['title'], 'Weekly')
+
+            self.send('delete', '/event/', {'event_id': series_id}, self.admin())
+            self.assertIsNone(self.send('get', f'/?id={second}')[1]['event'])
+
+
+class CalendarTests(MongoTestCase):
+    def test_buckets_follow_events_and_series(self):
+        first = datetime.utcnow().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        day = lambda n: (first + timedelta(days=n)).strftime('%Y-%m-%d')
+        body = {'title': 'Daily', 'description': 'Test event', 'venue': 'Main Hall', 'date': day(0), 'time': '09:00',
+                'organizer': 'organizer'}
+        series_id = self.send('post', '/event/', {**body, 'recurrence': {'freq': 'daily', 'count': 3}}, self.admin())[1]['series_id']
+        self.send('post', '/event/', {**body, 'title': 'Single', 'venue': 'Side Hall'}, self.admin())
+
+        status, calendar = self.send('get', f'/calendar/?from={day(0)}&to={day(3)}')
+        self.assertEqual([(d['date'], d['count']) for d in calendar['days']], [(day(0), 2), (day(1), 1), (day(2), 1)])
+        self.assertEqual([e['title'] for e in calendar['days'][0]['events']], ['Daily', 'Single'])
+
+        self.send('delete', '/event/', {'event_id': series_id}, self.admin())
+        status, calendar = self.send('get', f'/calendar/?from={day(0)}&to={day(3)}')
+        self.assertEqual([(d['date'], d['count']) for d in calendar['days']], [(day(0), 1)])
+
+
+class ExportTests(MongoTestCase):
+    def test_gzip_export_is_a_gz_file_not_an_encoding(self):
+        starts = datetime.utcnow() + timedelta(days=1)
+        self.add_event('First', starts)
+        self.add_event('Second', starts + timedelta(hours=2))
+
+        response = self.client.get('/export/?gzip=1', HTTP_AUTHORIZATION=self.admin())
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="events.ndjson.gz"')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        lines = gzip.decompress(b''.join(response.streaming_content)).splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['First', 'Second'])
+
+
+class ApprovalQueueTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        # A long interval, so only the tests flush.
+        config = {'ENABLED': True, 'DIRECTORY': self.directory, 'BATCH_SIZE': 100, 'FLUSH_INTERVAL': 60,
+                  'MAX_PENDING': 10000, 'FSYNC': False}
+        queue_settings = override_settings(APPROVAL_QUEUE=config)
+        queue_settings.enable()
+        self.addCleanup(queue_settings.disable)
+
+    def approval(self, title='Queued'):
+        starts = datetime.utcnow() + timedelta(days=7)
+        payload = Event(title=title, description='Test event', venue='Main Hall', date=starts.strftime('%Y-%m-%d'),
+                        time='10:00', organizer='organizer').to_dict()
+        return EventApproval(event_id=str(ObjectId()), user_id='organizer', action='post', payload=payload).to_dict()
+
+    def start(self, queue):
+        self.addCleanup(queue.reset)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_submission_is_acknowledged_then_flushed(self):
+        self.start(approval_queue)
+        user_id = self.add_user('organizer')
+        body = {'title': 'Queued', 'description': 'Test event', 'venue': 'Main Hall', 'organizer': user_id,
+                'date': (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d'), 'time': '10:00'}
+        status, response = self.send('post', f'/userevent/?id={user_id}', body, self.token(user_id))
+        self.assertEqual(status, 202)
+        self.assertEqual(approval_collection.count_documents({}), 0)
+
+        self.assertEqual(approval_queue.flush(), 1)
+        self.assertEqual(approval_collection.find_one({'_id': ObjectId(response['tracking_id'])})['payload']['title'], 'Queued')
+        self.assertEqual(approval_queue.pending(), 0)
+
+    def test_journal_of_a_dead_worker_is_replayed_once(self):
+        # A worker that died after inserting its first approval but before
+        # removing the journal: its lock file is no longer held by anyone.
+        inserted, left = self.approval('Inserted'), self.approval('Left')
+        for doc in (inserted, left):
+            doc['_id'] = ObjectId()
+        approval_collection.insert_one(inserted)
+        (self.directory / '4000000.lock').touch()
+        (self.directory / '4000000-00000001.bson').write_bytes(bson.encode(inserted) + bson.encode(left)
+                                                              + bson.encode(self.approval())[:10])
+
+        queue = self.start(ApprovalQueue())
+        with self.assertLogs('events.approval_queue', 'WARNING'):
+            tracking_id = queue.enqueue(self.approval('New'))
+        queue.flush()
+
+        self.assertEqual(sorted(doc['payload']['title'] for doc in approval_collection.find()), ['Inserted', 'Left', 'New'])
+        self.assertTrue(approval_collection.find_one({'_id': ObjectId(tracking_id)}))
+        self.assertEqual(list(self.directory.glob('4000000*')), [])
+
+    def test_full_queue_falls_back_to_a_synchronous_insert(self):
+        self.start(approval_queue)
+        with self.settings(APPROVAL_QUEUE={**settings.APPROVAL_QUEUE, 'MAX_PENDING': 1}):
+            approval_queue.enqueue(self.approval('First'))
+            with self.assertRaises(QueueFull):
+                approval_queue.enqueue(self.approval('Second'))
+
+            tracking_id, queued = submit(EventApproval(event_id=str(ObjectId()), user_id='organizer', action='delete'))
+        self.assertFalse(queued)
+        self.assertEqual(approval_collection.find_one({'_id': ObjectId(tracking_id)})['action'], 'delete')
+        self.assertEqual(approval_queue.pending(), 1)
+
+
+class BulkApprovalTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d')
+
+    def request(self, title, time, venue='Main Hall', **fields):
+        payload = Event(title=title, description='Test event', venue=venue, date=self.day, time=time,
+                        organizer='organizer').to_dict()
+        approval = EventApproval(event_id=str(ObjectId()), user_id='organizer', action='post', payload=payload).to_dict()
+        approval.update(fields)
+        return str(approval_collection.insert_one(approval).inserted_id)
+
+    def decide(self, *items):
+        status, body = self.send('post', '/adminApproval/bulk/',
+                                 {'items': [{'approval_id': approval_id, 'action': action} for approval_id, action in items]},
+                                 self.admin())
+        self.assertEqual(status, 200)
+        return body
+
+    def test_mixed_batch_reports_each_item(self):
+        first, clashing = self.request('First', '10:00'), self.request('Clashing', '11:00')
+        other = self.request('Other', '11:00', 'Side Hall')
+        rejected, decided = self.request('Rejected', '15:00'), self.request('Decided', '18:00', approved=False)
+        missing = str(ObjectId())
+
+        body = self.decide((first, 'approve'), (clashing, 'approve'), (other, 'approve'), (rejected, 'reject'),
+                           (decided, 'approve'), (missing, 'approve'), (first, 'reject'), ('not-an-id', 'approve'),
+                           (other, 'maybe'))
+
+        outcomes = [(result['approval_id'], result['status'], result.get('code')) for result in body['results']]
+        self.assertEqual(outcomes, [
+            (first, 'approved', None), (clashing, 'error', 409), (other, 'approved', None),
+            (rejected, 'rejected', None), (decided, 'error', 409), (missing, 'error', 404),
+            (first, 'error', 400), ('not-an-id', 'error', 400), (other, 'error', 400),
+        ])
+        self.assertEqual((body['processed'], body['failed']), (3, 6))
+        self.assertEqual(sorted(event['title'] for event in event_collection.find()), ['First', 'Other'])
+
+    def test_failed_item_is_released(self):
+        first, clashing = self.request('First', '10:00'), self.request('Clashing', '11:00')
+
+        self.decide((first, 'approve'), (clashing, 'approve'))
+
+        approval = approval_collection.find_one({'_id': ObjectId(clashing)})
+        self.assertIsNone(approval['approved'])
+        self.assertNotIn('claimed_by', approval)
+        # Released, so it can be decided again straight away.
+        self.assertEqual(self.decide((clashing, 'reject'))['results'][0]['status'], 'rejected')
+
+
+class AsyncViewTests(MongoTestCase):
+    """The ASGI mirrors under /async/, one request path each."""
+
+    def setUp(self):
+        super().setUp()
+        self.starts = datetime.utcnow().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=7)
+        self.event_id = self.add_event('Workshop', self.starts, capacity=1)
+        self.user_id = self.add_user('attendee')
+
+    def new_event(self, title, venue):
+        return {'title': title, 'description': 'Test event', 'venue': venue, 'date': self.starts.strftime('%Y-%m-%d'),
+                'time': '10:00', 'organizer': self.user_id}
+
+    async def test_display_events(self):
+        status, body = await self.asend('get', '/async/?status=upcoming&limit=5')
+        self.assertEqual((status, [event['_id'] for event in body['upcoming_events']]), (200, [self.event_id]))
+
+    async def test_event_conflict_and_create(self):
+        status, body = await self.asend('post', '/async/event/', self.new_event('Clash', 'Main Hall'), self.admin())
+        self.assertEqual((status, body['conflicts'][0]['_id']), (409, self.event_id))
+        status, body = await self.asend('post', '/async/event/', self.new_event('Created', 'Side Hall'), self.admin())
+        self.assertEqual(status, 201)
+        self.assertEqual(event_collection.count_documents({'title': 'Created'}), 1)
+
+    async def test_calendar(self):
+        day = self.starts.strftime('%Y-%m-%d')
+        status, _ = await self.asend('post', '/async/event/', self.new_event('Listed', 'Side Hall'), self.admin())
+        self.assertEqual(status, 201)
+        status, body = await self.asend('get', f'/async/calendar/?from={day}&to={day}')
+        self.assertEqual((status, [(d['date'], d['count']) for d in body['days']]), (200, [(day, 2)]))
+
+    async def test_register_and_my_events(self):
+        token = self.token(self.user_id)
+        body = {'event_id': self.event_id, 'user_id': self.user_id}
+        self.assertEqual((await self.asend('post', '/async/registerEvent/', body, token))[1]['status'], 'registered')
+        status, listing = await self.asend('get', '/async/myEvents/', token=token)
+        self.assertEqual((status, [event['_id'] for event in listing['upcoming_events']]), (200, [self.event_id]))
+        self.assertEqual((await self.asend('delete', '/async/registerEvent/', body, token))[0], 200)
+        status, listing = await self.asend('get', '/async/myEvents/', token=token)
+        self.assertEqual(listing['upcoming_events'], [])
+
+    async def test_userevent_request_and_admin_approval(self):
+        request = self.new_event('Requested', 'Side Hall')
+        status, body = await self.asend('post', f'/async/userevent/?id={self.user_id}', request, self.token(self.user_id))
+        self.assertEqual(status, 201)
+        status, listing = await self.asend('get', '/async/adminApproval/?action=post', token=self.admin())
+        self.assertEqual((status, [approval['_id'] for approval in listing['approvals']]), (200, [body['tracking_id']]))
+
+        decision = {'approval_id': body['tracking_id'], 'action': 'approve'}
+        self.assertEqual((await self.asend('post', '/async/adminApproval/', decision, self.admin()))[0], 200)
+        self.assertEqual((await self.asend('post', '/async/adminApproval/', decision, self.admin()))[0], 409)
+        self.assertEqual(event_collection.count_documents({'title': 'Requested'}), 1)
+
+    @override_settings(EVENTS_LIVE={**settings.EVENTS_LIVE, 'MODE': 'poll', 'POLL_INTERVAL': 0.01, 'HEARTBEAT': 1})
+    async def test_live_feed_reports_inserts(self):
+        response = await self.async_client.get('/async/live/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        try:
+            # Let the first poll take its snapshot, then add an event.
+            await asyncio.sleep(0.05)
+            self.add_event('Announced', self.starts, venue='Side Hall')
+            chunk = await asyncio.wait_for(anext(stream), 5)
+            self.assertIn(b'event: insert', chunk)
+            self.assertIn(b'Announced', chunk)
+        finally:
+            await stream.aclose()
+            get_feed()._task.cancel()
@@ -1,10 +1,16 @@
 from django.urls import path
-from .views import event,display_events,userevent,admin_approve_event,register_event
+from .views import event,display_events,my_events,calendar,search,export_events,userevent,admin_approve_event,admin_bulk_approve_events,admin_venue_conflicts,register_event
 
 urlpatterns = [
     path('event/', event, name='event'),
     path('',display_events,name='display_events'),
+    path('myEvents/',my_events,name='my_events'),
+    path('calendar/',calendar,name='calendar'),
+    path('search/',search,name='search_events'),
+    path('export/',export_events,name='export_events'),
     path('userevent/',userevent,name='userevent'),
     path('adminApproval/',admin_approve_event,name='admin_approve_event'),
+    path('adminApproval/bulk/',admin_bulk_approve_events,name='admin_bulk_approve_events'),
+    path('adminConflicts/',admin_venue_conflicts,name='admin_venue_conflicts'),
     path('registerEvent/',register_event,name="register_event")
 ]
\ No newline at end of file
@@ -1,71 +1,205 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponseNotAllowed
-from .models import event_collection, Event , approval_collection , EventApproval, pending_events_collection
+from django.http import HttpResponseNotAllowed, StreamingHttpResponse
+from EventEase.responses import JsonResponse
+from django.conf import settings
+from .models import event_collection, EventApproval, series_collection, WAITLISTED
+from .approvals import ApprovalError, ACTIONS as APPROVAL_ACTIONS, decide as decide_approval, decide_many as decide_approvals, pending_page as pending_approvals_page, submit as submit_approval
+from .cache import event_cache
+from .changes import PROTECTED_FIELDS, SCHEDULE_PROJECTION, EventChangeError, needs_schedule, new_event, reschedule, update_fields
+from .conflicts import CONFLICT_MESSAGE, VenueConflict, conflict_report, find_booked, find_conflicts, series_slots
+from .calendar import CalendarError, bucket_horizon, load_calendar, parse_range, refresh_days, series_days, touched_days
+from .recurrence import RecurrenceError, expand_page, find_occurrence, materialize, new_series, parse_occurrence_id
+from .export import buffered, gzipped, iter_events, json_array_chunks, ndjson_chunks
+from .search import SearchError, parse_day, search_events
+from .registrations import RegistrationError, cancel as cancel_registration, register as register_attendee, user_registrations
+from .pagination import fetch_page, get_page_size, InvalidCursor, UPCOMING, PAST
 import json
 from bson import ObjectId
-import jwt
-import os 
-from dotenv import load_dotenv
-from authentication.models import user_collection
-from datetime import datetime
+from datetime import datetime, timedelta
 
-load_dotenv()
+# Fields of each event in a display_events listing; full documents only come
+# back from the ?id= lookup. Clients may ask for more with ?fields=, limited
+# to LISTING_FIELDS.
+SUMMARY_FIELDS = ('title', 'venue', 'starts_at', 'organizer', 'attendee_count')
+LISTING_FIELDS = SUMMARY_FIELDS + ('description', 'date', 'time', 'capacity', 'waitlist_count', 'approved', 'created_at')
 
-def get_user_role_from_jwt(request):
-    token = request.headers.get('Authorization')
-    if not token:
-        return None
-    try:
-        token = token.split(" ")[1]
-        decoded_token = jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=[os.getenv('SECRET_ALGORITHM')])
-        return decoded_token.get('role')
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
+def get_user_role(request):
+    claims = getattr(request, 'user_claims', None)
+    return claims.get('role') if claims else None
     
-def categorize_events(events):
-    upcoming_events = []
-    past_events = []
-    current_time = datetime.utcnow()
+def conflict_response(conflicts):
+    return JsonResponse({'error': CONFLICT_MESSAGE, 'conflicts': conflicts}, status=409)
 
-    for event in events:
-        event_date = datetime.strptime(event['date'], '%Y-%m-%d')
-        event_time = datetime.strptime(event['time'], '%H:%M:%S').time()
-        event_datetime = datetime.combine(event_date, event_time)
-        
-        if event_datetime > current_time:
-            upcoming_events.append(event)
-        else:
-            past_events.append(event)
+def listing_fields(raw):
+    """Return the sorted tuple of extra listing fields asked for in ?fields=."""
+    requested = {field.strip() for field in (raw or '').split(',') if field.strip()}
+    unknown = requested - set(LISTING_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(LISTING_FIELDS)}")
+    return tuple(sorted(requested - set(SUMMARY_FIELDS)))
 
-    return upcoming_events, past_events
+def listing_projection(fields=()):
+    return {field: 1 for field in SUMMARY_FIELDS + tuple(fields)}
 
+def load_listing(status, cursor, limit, fields=()):
+    now = datetime.utcnow()
+    response = {'next_cursor': {}}
+    for page in ([status] if status else [UPCOMING, PAST]):
+        events, next_cursor = fetch_page(event_collection, page, now, limit, cursor, listing_projection(fields))
+        events, next_cursor = expand_page(page, now, limit, cursor, events, next_cursor, listing_projection(fields))
+        response[f'{page}_events'] = events
+        response['next_cursor'][page] = next_cursor
+    return response
+
+def load_user_events(user_id, status, cursor, limit):
+    """Pages of the events a user registered for, resolved with one $in query per page."""
+    registrations = user_registrations(user_id)
+    in_user_events = {'_id': {'$in': [ObjectId(event_id) for event_id in registrations]}}
+    now = datetime.utcnow()
+    response = {'next_cursor': {}}
+    for page in ([status] if status else [UPCOMING, PAST]):
+        events, next_cursor = fetch_page(event_collection, page, now, limit, cursor, listing_projection(), in_user_events)
+        for event in events:
+            event['registration_status'] = registrations.get(event['_id'])
+        response[f'{page}_events'] = events
+        response['next_cursor'][page] = next_cursor
+    return response
 
-    
 def display_events(request):
     if request.method=='GET':
         id=request.GET.get('id', '')
         if(id==''):
             try:
-                events = list(event_collection.find({}, {'_id': 0}))
-                upcoming_events, past_events = categorize_events(events)
-                upcoming_events, past_events = categorize_events(events)
-                return JsonResponse({'upcoming_events': upcoming_events, 'past_events': past_events}, status=200)
+                limit = get_page_size(request.GET.get('limit'))
+            except ValueError:
+                return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+            status = request.GET.get('status', '')
+            if status not in ('', UPCOMING, PAST):
+                return JsonResponse({'error': "status must be 'upcoming' or 'past'"}, status=400)
+            cursor = request.GET.get('cursor') or None
+            if cursor and not status:
+                return JsonResponse({'error': 'status is required when paginating with a cursor'}, status=400)
+            try:
+                fields = listing_fields(request.GET.get('fields'))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            try:
+                response = event_cache.get_listing(
+                    (status, cursor, limit, fields),
+                    lambda: load_listing(status, cursor, limit, fields)
+                )
+                return JsonResponse(response, status=200)
+            except InvalidCursor:
+                return JsonResponse({'error': 'Invalid cursor'}, status=400)
             except Exception as e:
-                return JsonResponse({'error': 'Internal Server Error, Failed to fetch the event with this id'}, status=500)
+                return JsonResponse({'error': 'Internal Server Error, Failed to fetch events'}, status=500)
         else:
             try:
-                event = event_collection.find_one({'_id': ObjectId(id)}, {'_id': 0})
+                event = event_cache.get_event(
+                    id,
+                    lambda: find_occurrence(id) if parse_occurrence_id(id) else event_collection.find_one({'_id': ObjectId(id)}, {'_id': 0})
+                )
                 return JsonResponse({'event': event}, status=200)
             except Exception as e:
-                return JsonResponse({'error': 'Internal Server Error, Failed to fetch events'}, status=500)
+                return JsonResponse({'error': 'Internal Server Error, Failed to fetch the event with this id'}, status=500)
     else:
         return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
     
+def my_events(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    claims = getattr(request, 'user_claims', None)
+    if get_user_role(request) != 'USER' or not claims.get('user_id'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    user_id = claims['user_id']
+    try:
+        limit = get_page_size(request.GET.get('limit'))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+    status = request.GET.get('status', '')
+    if status not in ('', UPCOMING, PAST):
+        return JsonResponse({'error': "status must be 'upcoming' or 'past'"}, status=400)
+    cursor = request.GET.get('cursor') or None
+    if cursor and not status:
+        return JsonResponse({'error': 'status is required when paginating with a cursor'}, status=400)
+    try:
+        response = event_cache.get_user_events(
+            user_id,
+            (status, cursor, limit),
+            lambda: load_user_events(user_id, status, cursor, limit)
+        )
+        return JsonResponse(response, status=200)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': 'Internal Server Error, Failed to fetch events'}, status=500)
+
+def search(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'error': 'q is required'}, status=400)
+    try:
+        limit = get_page_size(request.GET.get('limit'))
+        page = int(request.GET.get('page') or 1)
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'page and limit must be positive integers'}, status=400)
+    try:
+        date_from = parse_day(request.GET.get('from'), 'from')
+        date_to = parse_day(request.GET.get('to'), 'to')
+        # Searches stored events only: unmaterialized series occurrences are excluded.
+        response = search_events(q, date_from, date_to, request.GET.get('venue') or None, page, limit)
+        return JsonResponse(response, status=200)
+    except SearchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': 'Internal Server Error, Failed to search events'}, status=500)
+
+def calendar(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        first, last, top = parse_range(request.GET.get('from'), request.GET.get('to'), request.GET.get('top'))
+    except CalendarError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        return JsonResponse(load_calendar(first, last, top), status=200)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error, Failed to load the calendar'}, status=500)
+
+def export_events(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if get_user_role(request) != "ADMIN":
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'json'):
+        return JsonResponse({'error': "format must be 'ndjson' or 'json'"}, status=400)
+    use_gzip = request.GET.get('gzip', '').lower() in ('1', 'true')
+
+    # Exports the events collection: series are excluded, occurrences only once materialized.
+    docs = iter_events(getattr(settings, 'EVENTS_EXPORT_BATCH_SIZE', 500))
+    chunks = ndjson_chunks(docs) if export_format == 'ndjson' else json_array_chunks(docs)
+    body = buffered(chunks)
+    content_type = 'application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+    filename = f'events.{export_format}'
+    if use_gzip:
+        # A .gz file to download, not a transfer encoding: with
+        # Content-Encoding, clients would unpack it into a misnamed file.
+        body = gzipped(body)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 def event(request):
     try:
-        user_role = get_user_role_from_jwt(request)
+        user_role = get_user_role(request)
         
         if request.method == "POST":
             if user_role != "ADMIN":
@@ -74,18 +208,34 @@ def event(request):
             try:
                 data = json.loads(request.body)
                 
-                current_time = datetime.utcnow()
-                event_time = datetime.strptime(data['time'], '%H:%M:%S').time()
-                if event_time <= current_time:
-                    return JsonResponse({'error': 'Please provide appropriate time'}, status=400)
+                nevent = new_event(data, allow_recurrence=True)
+                if nevent.recurrence:
+                    try:
+                        series = new_series(nevent)
+                    except RecurrenceError as e:
+                        return JsonResponse({'error': str(e)}, status=400)
+                    conflicts = find_booked(series['venue'], series_slots(series))
+                    if conflicts:
+                        return conflict_response(conflicts)
+                    series['bucketed_until'] = bucket_horizon()
+                    result = series_collection.insert_one(series)
+                    event_cache.invalidate(str(result.inserted_id))
+                    refresh_days(series_days(series))
+                    return JsonResponse({'message': 'Event series registered successfully', 'series_id': str(result.inserted_id)}, status=201)
+                conflicts = find_conflicts(nevent.venue, nevent.starts_at, nevent.ends_at)
+                if conflicts:
+                    return conflict_response(conflicts)
                 
-                nevent=Event(title=data['title'],description=data['description'],venue=data['venue'],date=data['date'],time=data['time'],organizer=data['organizer'])
                 nevent=nevent.to_dict()
                 result = event_collection.insert_one(nevent)
                 if result.inserted_id:
+                    event_cache.invalidate(str(result.inserted_id))
+                    refresh_days(touched_days(nevent['starts_at']))
                     return JsonResponse({'message': 'Event registered successfully'}, status=201)
                 else:
                     return JsonResponse({'error': 'Failed to register event'}, status=500)
+            except EventChangeError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
             except Exception as e:
                 return JsonResponse({'error': 'Internal Sever Error'}, status=500)
             
@@ -95,28 +245,35 @@ def event(request):
             
             try:
                 data = json.loads(request.body)
-                
-                if 'time' in data:
-                    current_time = datetime.utcnow()
-                    event_time = datetime.strptime(data['time'], '%H:%M:%S').time()
-                    if event_time <= current_time:
-                        return JsonResponse({'error': 'Please provide appropriate time'}, status=400)
                     
                 event_id = data.get('event_id')
                 if not event_id:
                     return JsonResponse({'error': 'Event ID is required'}, status=400)
 
-                update_data = {k: v for k, v in data.items() if k != 'event_id'}
-                updated_event = event_collection.find_one_and_update(
+                update_data = update_fields(data)
+                if needs_schedule(data, update_data):
+                    current = event_collection.find_one({'_id': ObjectId(event_id)}, SCHEDULE_PROJECTION)
+                    if not current:
+                        return JsonResponse({'error': 'Event not found'}, status=404)
+                    slot = reschedule(data, update_data, current)
+                    if slot:
+                        conflicts = find_conflicts(*slot, exclude_id=current['_id'])
+                        if conflicts:
+                            return conflict_response(conflicts)
+                previous = event_collection.find_one_and_update(
                     {'_id': ObjectId(event_id)},
                     {'$set': update_data},
-                    return_document=True
+                    {'starts_at': 1}
                 )
 
-                if updated_event:
+                if previous:
+                    event_cache.invalidate(event_id)
+                    refresh_days(touched_days(previous.get('starts_at'), update_data.get('starts_at')))
                     return JsonResponse({'message': 'Event updated successfully'}, status=200)
                 else:
                     return JsonResponse({'error': 'Event not found'}, status=404)
+            except EventChangeError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
             except Exception as e:
                 return JsonResponse({'error': 'Internal Server Error'}, status=500)
         
@@ -129,11 +286,19 @@ def event(request):
                 if not event_id:
                     return JsonResponse({'error': 'Event ID is required'}, status=400)
 
-                result = event_collection.delete_one({'_id': ObjectId(event_id)})
-                if result.deleted_count == 1:
+                deleted = event_collection.find_one_and_delete({'_id': ObjectId(event_id)}, {'starts_at': 1})
+                if deleted:
+                    event_cache.invalidate(event_id)
+                    refresh_days(touched_days(deleted.get('starts_at')))
                     return JsonResponse({'message': 'Event deleted successfully'}, status=200)
-                else:
-                    return JsonResponse({'error': 'Event not found'}, status=404)
+                # Deleting a series stops its future occurrences; materialized
+                # ones have registrations and stay.
+                deleted = series_collection.find_one_and_delete({'_id': ObjectId(event_id)})
+                if deleted:
+                    event_cache.invalidate(event_id)
+                    refresh_days(series_days(deleted))
+                    return JsonResponse({'message': 'Event series deleted successfully'}, status=200)
+                return JsonResponse({'error': 'Event not found'}, status=404)
             except Exception as e:
                 return JsonResponse({'error': 'Internal Server Error'}, status=500)
         
@@ -144,7 +309,7 @@ def event(request):
 
 def userevent(request):
     try:
-        user_role = get_user_role_from_jwt(request)
+        user_role = get_user_role(request)
         
         if request.method == 'POST':
             if user_role != "USER":
@@ -157,24 +322,24 @@ def userevent(request):
             
             data = json.loads(request.body)
             
-            current_time = datetime.utcnow()
-            event_time = datetime.strptime(data['time'], '%H:%M:%S').time()
-            if event_time <= current_time:
-                return JsonResponse({'error': 'Please provide appropriate time'}, status=400)
+            try:
+                nevent = new_event(data)
+            except EventChangeError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
+            conflicts = find_conflicts(nevent.venue, nevent.starts_at, nevent.ends_at)
+            if conflicts:
+                return conflict_response(conflicts)
             
-            nevent=Event(title=data['title'],description=data['description'],venue=data['venue'],date=data['date'],time=data['time'],organizer=data['organizer'])
             nevent=nevent.to_dict()
             
             approval_request = EventApproval(
-                event_id=str(pending_events_collection.insert_one(nevent).inserted_id),
+                event_id=str(ObjectId()),
                 user_id=user_id,
-                action='post'
+                action='post',
+                payload=nevent
             )
-            result=approval_collection.insert_one(approval_request.to_dict())
-            if result.inserted_id:
-                return JsonResponse({'message': 'Event posted successfully. Awaiting admin approval.'}, status=201)
-            else:
-                return JsonResponse({'error': 'Failed to register event, Please try again'}, status=500)
+            tracking_id, queued = submit_approval(approval_request)
+            return JsonResponse({'message': 'Event posted successfully. Awaiting admin approval.', 'tracking_id': tracking_id}, status=202 if queued else 201)
             
         elif request.method=='PUT':
             if user_role != "USER":
@@ -182,12 +347,6 @@ def userevent(request):
             
             try:
                 data = json.loads(request.body)
-                
-                if 'time' in data:
-                    current_time = datetime.utcnow()
-                    event_time = datetime.strptime(data['time'], '%H:%M:%S').time()
-                    if event_time <= current_time:
-                        return JsonResponse({'error': 'Please provide appropriate time'}, status=400)
                     
                 event_id = data.get('event_id')
                 user_id=data.get('user_id')
@@ -200,30 +359,27 @@ def userevent(request):
                 event=event_collection.find_one({'_id': ObjectId(event_id)})
                 
                 if event and event['organizer']==user_id:
-                    newevent=event.copy()
-                    update_data = {k: v for k, v in data.items() if (k!='user_id' and k!='event_id')}
-                    pending_events_collection.insert_one(newevent)
-                    updated_event = pending_events_collection.find_one_and_update(
-                        {'_id': ObjectId(event_id)},
-                        {'$set': update_data},
-                        return_document=True
-                    )
+                    update_data = update_fields(data, PROTECTED_FIELDS + ('user_id',))
+                    slot = reschedule(data, update_data, event)
+                    if slot:
+                        conflicts = find_conflicts(*slot, exclude_id=event['_id'])
+                        if conflicts:
+                            return conflict_response(conflicts)
                     approval_request = EventApproval(
                         event_id=event_id,
                         user_id=user_id,
-                        action='put'
+                        action='put',
+                        payload=update_data
                     )
-                    result=approval_collection.insert_one(approval_request.to_dict())
-                    if updated_event and result.inserted_id:
-                        return JsonResponse({'message': 'Update request submitted. Awaiting admin approval.'}, status=200)
-                    else:
-                        return JsonResponse({'error': 'Event not found'}, status=404)
+                    tracking_id, queued = submit_approval(approval_request)
+                    return JsonResponse({'message': 'Update request submitted. Awaiting admin approval.', 'tracking_id': tracking_id}, status=202 if queued else 200)
                 else: return JsonResponse({'error': 'Event not found or unauthorized.'}, status=403)
+            except EventChangeError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
             except Exception as e:
                 return JsonResponse({'error': 'Internal Server Error'}, status=500)
             
         elif request.method == 'DELETE':
-            user_role=get_user_role_from_jwt(request)
             if user_role!='USER': return JsonResponse({'error': 'Permission denied'}, status=403)
             
             try:
@@ -243,11 +399,8 @@ def userevent(request):
                         user_id=user_id,
                         action='delete'
                     )
-                    result=approval_collection.insert_one(approval_request.to_dict())
-                    if result.inserted_id:
-                        return JsonResponse({'message': 'Delete request submitted. Awaiting admin approval.'}, status=200)
-                    else:
-                        return JsonResponse({'error': 'Failed to put request, Please try again'},status=400)
+                    tracking_id, queued = submit_approval(approval_request)
+                    return JsonResponse({'message': 'Delete request submitted. Awaiting admin approval.', 'tracking_id': tracking_id}, status=202 if queued else 200)
                 else:
                     return JsonResponse({'error': 'Event not found or unauthorized.'}, status=403)
             except:
@@ -255,12 +408,40 @@ def userevent(request):
     except:
         return JsonResponse({'error': 'Internal Server error'},status=500)
         
+def approval_listing(params):
+    """pending_page arguments from the adminApproval GET parameters; ValueError names a bad one."""
+    try:
+        limit = get_page_size(params.get('limit'))
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    action = params.get('action') or None
+    if action and action not in ('post', 'put', 'delete'):
+        raise ValueError("action must be one of 'post', 'put' or 'delete'")
+    return {
+        'limit': limit,
+        'cursor': params.get('cursor') or None,
+        'action': action,
+        'user_id': params.get('user_id') or None,
+        'include_event': params.get('include_event', '').lower() in ('1', 'true'),
+    }
+
 def admin_approve_event(request):
     try:
-        user_role=get_user_role_from_jwt(request)
+        user_role=get_user_role(request)
         if user_role != "ADMIN":
             return JsonResponse({'error': 'Permission denied'}, status=403)
         
+        if request.method == 'GET':
+            try:
+                listing = approval_listing(request.GET)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            try:
+                approvals, next_cursor = pending_approvals_page(**listing)
+            except InvalidCursor:
+                return JsonResponse({'error': 'Invalid cursor'}, status=400)
+            return JsonResponse({'approvals': approvals, 'next_cursor': next_cursor}, status=200)
+
         if request.method == 'POST':
             data = json.loads(request.body)
             approval_id = data.get('approval_id')
@@ -270,101 +451,119 @@ def admin_approve_event(request):
                 return JsonResponse({'error': 'approval id is required'},status=400)
             if not action:
                 return JsonResponse({'error': 'Action is required whether to approve or reject'}, status=400)
+            if action not in APPROVAL_ACTIONS:
+                return JsonResponse({'error': "Action must be either 'approve' or 'reject'"}, status=400)
             
-            approval_request = approval_collection.find_one({'_id': ObjectId(approval_id)})
-            if approval_request and approval_request['action']=='post':
-                try:
-                    if action == 'approve':
-                        result=event_collection.insert_one(
-                            pending_events_collection.find_one({'_id': ObjectId(approval_request['event_id'])})
-                        )
-                        if result.inserted_id:
-                            pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                        else:
-                            return JsonResponse({'error': 'Action could not be processed successfully, Try again'}, status=500)
-                    else:
-                        pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                    approval_collection.update_one(
-                        {'_id': ObjectId(approval_id)},
-                        {'$set': {'approved': action == 'approve'}}
-                    )
-                    return JsonResponse({'message': 'Action processed successfully.'}, status=200)
-                except:
-                    return JsonResponse({'error': 'Action could not be processed successfully'}, status=500)
-            
-            elif approval_request and approval_request['action']=='put':
-                try:
-                    if action == 'approve':
-                        filter={'_id': ObjectId(approval_request['event_id'])}
-                        result = event_collection.replace_one(filter, pending_events_collection.find_one({'_id': ObjectId(approval_request['event_id'])}))
-                        if result.modified_count>0:
-                            pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                        else:
-                            return JsonResponse({'error': 'Action could not be processed successfully, Try again'}, status=500)
-                    else:
-                        pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                    approval_collection.update_one(
-                        {'_id': ObjectId(approval_id)},
-                        {'$set': {'approved': action == 'approve'}}
-                    )
-                    return JsonResponse({'message': 'Action processed successfully.'}, status=200)
-                except:
-                    return JsonResponse({'error': 'Action could not be processed successfully'}, status=500)
-
-            elif approval_request and approval_request['action']=='delete':
-                try:
-                    if action == 'approve':
-                        result=event_collection.delete_one(
-                            {'_id': ObjectId(approval_request['event_id'])}
-                        )
-                        if result.deleted_count>0:
-                            pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                        else:
-                            return JsonResponse({'error': 'Action could not be processed successfully, Try again'}, status=500)
-                    else:
-                        pending_events_collection.delete_one({'_id': ObjectId(approval_request['event_id'])})
-                    approval_collection.update_one(
-                        {'_id': ObjectId(approval_id)},
-                        {'$set': {'approved': action == 'approve'}}
-                    )
-                    return JsonResponse({'message': 'Action processed successfully.'}, status=200)
-                except:
-                    return JsonResponse({'error': 'Action could not be processed successfully'}, status=500)
-            else:
-                return JsonResponse({'error': 'Approval request not found.'}, status=404)
+            try:
+                approval_request = decide_approval(approval_id, action)
+            except ApprovalError as e:
+                return JsonResponse({'error': e.message}, status=e.status)
+            except VenueConflict as e:
+                return conflict_response(e.conflicts)
+            except:
+                return JsonResponse({'error': 'Action could not be processed successfully'}, status=500)
+            if action == 'approve':
+                event_cache.invalidate(approval_request['event_id'])
+            return JsonResponse({'message': 'Action processed successfully.'}, status=200)
         return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
     except:
         return JsonResponse({'error': 'Internal Server Error'}, status=500)
 
+def admin_bulk_approve_events(request):
+    try:
+        if get_user_role(request) != "ADMIN":
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+
+        data = json.loads(request.body)
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'error': 'items must be a non-empty list of {approval_id, action}'}, status=400)
+        max_items = getattr(settings, 'ADMIN_BULK_APPROVAL_MAX_ITEMS', 500)
+        if len(items) > max_items:
+            return JsonResponse({'error': f'At most {max_items} items can be processed at once'}, status=400)
+
+        results, changed = decide_approvals(items)
+        for event_id in changed:
+            event_cache.invalidate(event_id)
+        failed = sum(1 for result in results if result['status'] == 'error')
+        return JsonResponse({'results': results, 'processed': len(results) - failed, 'failed': failed}, status=200)
+    except:
+        return JsonResponse({'error': 'Internal Server Error'}, status=500)
+
+def admin_venue_conflicts(request):
+    """Overlapping bookings of one venue among events starting in [from, to]."""
+    if get_user_role(request) != "ADMIN":
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d') if request.GET.get('from') else today
+        date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d') if request.GET.get('to') else date_from + timedelta(days=365)
+    except ValueError:
+        return JsonResponse({'error': 'from and to must be dates in YYYY-MM-DD format'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit') or 100), 1000)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+    try:
+        pairs, truncated = conflict_report(date_from, date_to + timedelta(days=1), request.GET.get('venue') or None, limit)
+        return JsonResponse({'conflicts': pairs, 'truncated': truncated}, status=200)
+    except Exception:
+        return JsonResponse({'error': 'Internal Server Error, Failed to find conflicts'}, status=500)
+
 def register_event(request):
     try:
-        if request.method == 'POST':
+        if request.method in ('POST', 'DELETE'):
             try:  
-                user_role=get_user_role_from_jwt(request)
+                user_role=get_user_role(request)
                 if user_role!='USER': return JsonResponse({'error': 'Permission denied'}, status=403)
                 data=json.loads(request.body)
                 event_id=data['event_id']
                 user_id=data['user_id']
                 if not event_id or not user_id:
                     return JsonResponse({'error': 'Event ID and User ID are required'}, status=400)
-                
-                resultEvent = event_collection.update_one(
-                            {'_id': ObjectId(event_id)},
-                            {'$addToSet': {'attendees': user_id}}
-                        )
-                if resultEvent.modified_count>0:
-                    resultUser = user_collection.update_one({'_id': ObjectId(user_id)},{'$addToSet': {'events':event_id}})
-                else:
-                    return JsonResponse({'error': 'Failed to register, Try again'}, status=500)
-                
-                if resultEvent.modified_count > 0 and resultUser.modified_count>0:
-                    return JsonResponse({'message': 'User registered to event successfully'}, status=200)
-                else:
+                # Series occurrences are stored as events on their first registration.
+                occurrence_id = event_id
+                try:
+                    event_id, materialized_at = materialize(occurrence_id, create=request.method == 'POST')
+                except VenueConflict as e:
+                    return conflict_response(e.conflicts)
+                if event_id is None:
+                    if request.method == 'DELETE':
+                        return JsonResponse({'error': 'Registration not found'}, status=404)
                     return JsonResponse({'error': 'Event not found or user already registered'}, status=404)
+                if materialized_at:
+                    event_cache.invalidate(occurrence_id)
+                    refresh_days(touched_days(materialized_at))
+                
+                if request.method == 'DELETE':
+                    try:
+                        promoted = cancel_registration(event_id, user_id)
+                    except RegistrationError as e:
+                        return JsonResponse({'error': e.message}, status=e.status)
+                    event_cache.invalidate(event_id)
+                    event_cache.invalidate_user(user_id)
+                    if promoted:
+                        event_cache.invalidate_user(promoted)
+                    return JsonResponse({'message': 'Registration cancelled successfully', 'promoted_user_id': promoted}, status=200)
+
+                try:
+                    status = register_attendee(event_id, user_id)
+                except RegistrationError as e:
+                    return JsonResponse({'error': e.message}, status=e.status)
+                event_cache.invalidate(event_id)
+                event_cache.invalidate_user(user_id)
+                if status == WAITLISTED:
+                    return JsonResponse({'message': 'Event is full, user added to the waitlist', 'status': status, 'event_id': event_id}, status=202)
+                return JsonResponse({'message': 'User registered to event successfully', 'status': status, 'event_id': event_id}, status=200)
             except Exception as e:
                 return JsonResponse({'error': 'Internal Server Error'}, status=500)
         return HttpResponseNotAllowed(['GET', 'POST', 'PUT', 'DELETE'])
     except:
         return JsonResponse({'error': 'Internal Server Error'}, status=500)
     
-    
\ No newline at end of file